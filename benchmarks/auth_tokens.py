@@ -0,0 +1,97 @@
+"""
+Benchmark verifying the CHRIS auth cookie.
+
+Every authenticated request verifies the cookie's JWT, so this compares the
+ways of doing it: decoding with `jose` (how every request used to do it), the
+`HMACTokenVerifier` that keeps its key set up between tokens, and
+`AuthService.verify_token`, which answers repeat tokens from the token cache.
+
+The app's settings are loaded as usual, so run it from the repository root with
+a `.env` file in place:
+
+    uv run python -m benchmarks.auth_tokens --iterations 20000
+"""
+
+import argparse
+import timeit
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from jose import jwt
+
+from chris.auth.services import AuthService, token_cache
+from chris.auth.tokens import HMAC_DIGESTS, HMACTokenVerifier
+from chris.core.config import settings
+
+
+def make_token() -> str:
+    """A token shaped like the ones `AuthService.authenticate_user` hands out."""
+    now = datetime.now(timezone.utc)
+    return jwt.encode(
+        {
+            "sub": "5f0c7d0e-7f1b-4c3e-9a59-6a0f2f0d9b11",
+            "username": "benchmark",
+            "discord_id": "100000000000000000",
+            "email": "benchmark@example.com",
+            "name": "Benchmark User",
+            "roles": ["default-roles-chris", "offline_access", "uma_authorization"],
+            "exp": now + timedelta(hours=settings.jwt_expiration_hours),
+            "iat": now,
+            "iss": "chris-backend",
+        },
+        settings.jwt_secret_key,
+        algorithm=settings.jwt_algorithm,
+    )
+
+
+def time_per_call(call: Callable[[], object], iterations: int) -> float:
+    """The best of a few runs, in microseconds per call."""
+    runs = timeit.repeat(call, number=iterations, repeat=5)
+    return min(runs) / iterations * 1_000_000
+
+
+def main(args: argparse.Namespace) -> None:
+    if settings.jwt_algorithm not in HMAC_DIGESTS:
+        raise SystemExit(f"{settings.jwt_algorithm} tokens aren't HMAC signed")
+
+    token = make_token()
+    verifier = HMACTokenVerifier(settings.jwt_secret_key, settings.jwt_algorithm)
+
+    def jose_decode() -> dict:
+        return jwt.decode(
+            token,
+            settings.jwt_secret_key,
+            algorithms=[settings.jwt_algorithm],
+            options={"verify_aud": False},
+        )
+
+    def uncached_verify():
+        token_cache.clear()
+        return AuthService.verify_token(token)
+
+    # Every way of verifying has to agree before their speed means anything
+    assert verifier.decode(token) == jose_decode()
+    assert uncached_verify() == AuthService.verify_token(token)
+
+    cases: dict[str, Callable[[], object]] = {
+        "jose decode": jose_decode,
+        "reused-key decode": lambda: verifier.decode(token),
+        "verify_token, uncached": uncached_verify,
+        "verify_token, cached": lambda: AuthService.verify_token(token),
+    }
+
+    baseline = None
+    print(f"{'verifier':<26}{'us/call':>10}{'speedup':>10}")
+    for name, call in cases.items():
+        micros = time_per_call(call, args.iterations)
+        baseline = baseline or micros
+        print(f"{name:<26}{micros:>10.2f}{baseline / micros:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--iterations", type=int, default=20_000, help="Calls per timing run"
+    )
+
+    main(parser.parse_args())
@@ -0,0 +1,192 @@
+"""
+Benchmark the Discord requester against the fake Discord API.
+
+The fake API is started on a local port, the requester is pointed at it, and
+the Discord client functions are called at a set concurrency. The report shows
+throughput, latency percentiles, and how many 429s the fake API had to send,
+which should be close to zero if the requester is keeping to the ratelimits.
+
+The app's settings are loaded as usual, so run it from the repository root with
+a `.env` file in place:
+
+    uv run python -m benchmarks.discord_requester --concurrency 50 --calls 500
+"""
+
+import argparse
+import asyncio
+import logging
+import random
+import statistics
+import threading
+import time
+from typing import Awaitable, Callable
+
+import httpx
+import uvicorn
+
+from benchmarks.fake_discord import FakeDiscordConfig
+from benchmarks.fake_discord import app as fake_app
+from chris.services.discord import (
+    add_user_to_server,
+    get_discord_member,
+    get_user_profile_from_id,
+    member_cache,
+    profile_cache,
+)
+from chris.services.discord.request import AsyncDiscordRequester
+
+GUILD_ID = "1150133792040824873"
+
+SCENARIOS: dict[str, Callable[[str], Awaitable[object]]] = {
+    "member": lambda user_id: get_discord_member(GUILD_ID, user_id),
+    "join": lambda user_id: add_user_to_server(GUILD_ID, user_id, "fake-token"),
+    "profile": lambda user_id: get_user_profile_from_id(user_id),
+}
+
+
+def start_fake_discord(port: int) -> uvicorn.Server:
+    """Serve the fake API from a background thread, so it has its own event loop."""
+    server = uvicorn.Server(
+        uvicorn.Config(fake_app, host="127.0.0.1", port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+
+    while not server.started:
+        time.sleep(0.01)
+
+    return server
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+async def run_scenario(
+    name: str, calls: int, concurrency: int, id_pool: int | None
+) -> dict:
+    """Make `calls` calls of one scenario with at most `concurrency` in flight."""
+    call = SCENARIOS[name]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    failures = 0
+
+    def user_id(i: int) -> str:
+        # With an id pool, lookups repeat so caching and coalescing kick in
+        if id_pool:
+            return str(100_000 + random.randrange(id_pool))
+        return str(100_000 + i)
+
+    async def one(i: int) -> None:
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await call(user_id(i))
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "scenario": name,
+        "calls": calls,
+        "failures": failures,
+        "seconds": elapsed,
+        "rps": calls / elapsed,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "mean": statistics.fmean(latencies) if latencies else 0.0,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    if not args.verbose:
+        # Every ratelimit is logged as a warning, which drowns out the report
+        logging.getLogger("discord").setLevel(logging.ERROR)
+
+    server = start_fake_discord(args.port)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    # Point the requester at the fake API before its client is created
+    AsyncDiscordRequester.DISCORD_API_BASE = f"{base_url}/api"
+    await AsyncDiscordRequester.aclose()
+
+    config = FakeDiscordConfig(
+        latency=args.latency, resource_429_rate=args.resource_429_rate
+    )
+
+    async with httpx.AsyncClient(base_url=base_url) as control:
+        print(
+            f"{'scenario':<10}{'calls':>7}{'fail':>6}{'rps':>9}{'p50 ms':>9}"
+            f"{'p99 ms':>9}{'429 global':>12}{'endpoint':>10}{'resource':>10}"
+        )
+
+        for name in args.scenarios:
+            member_cache.clear()
+            profile_cache.clear()
+            await control.post("/_reset", json=config.__dict__)
+
+            result = await run_scenario(
+                name, args.calls, args.concurrency, args.id_pool
+            )
+            stats = (await control.get("/_stats")).json()
+            limits = stats["ratelimits"]
+
+            print(
+                f"{result['scenario']:<10}{result['calls']:>7}{result['failures']:>6}"
+                f"{result['rps']:>9.1f}{result['p50'] * 1000:>9.1f}{result['p99'] * 1000:>9.1f}"
+                f"{limits['global']:>12}{limits['endpoint']:>10}{limits['resource']:>10}"
+            )
+
+    requester = AsyncDiscordRequester.stats()
+    print()
+    print(
+        f"requester: {requester['requests']} requests, {requester['retries']} retries, "
+        f"{requester['coalescing']['coalesced']} coalesced, "
+        f"{requester['bucket_locks']} bucket cooldowns"
+    )
+
+    await AsyncDiscordRequester.aclose()
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=list(SCENARIOS),
+        default=list(SCENARIOS),
+        help="Which client functions to benchmark",
+    )
+    parser.add_argument("--calls", type=int, default=300, help="Calls per scenario")
+    parser.add_argument(
+        "--concurrency", type=int, default=50, help="Calls in flight at once"
+    )
+    parser.add_argument(
+        "--id-pool",
+        type=int,
+        default=None,
+        help="Draw user ids from a pool of this size, so lookups repeat",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="Fake API latency in seconds"
+    )
+    parser.add_argument(
+        "--resource-429-rate",
+        type=float,
+        default=0.0,
+        help="Share of requests that get a resource 429",
+    )
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument(
+        "--verbose", action="store_true", help="Show the requester's ratelimit logs"
+    )
+
+    asyncio.run(main(parser.parse_args()))
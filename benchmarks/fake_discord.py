@@ -0,0 +1,245 @@
+"""
+A local stand-in for the parts of the Discord API that CHRIS uses.
+
+It serves the member, join and user endpoints with fake data, and enforces
+ratelimits the way Discord does:
+
+- Every route has a bucket with a limit and a reset window, reported through the
+  `X-RateLimit-*` headers. The member routes of a guild share one bucket hash,
+  like Discord's do.
+- Going over a bucket's limit gets an endpoint 429.
+- Going over the global limit (50 requests a second) gets a global 429.
+- A small, configurable share of requests get a resource 429, which can't be
+  predicted from the headers.
+
+Every 429 is counted and can be read from `GET /_stats`, so benchmarks can
+check how many slipped past the requester.
+
+Run it on its own with:
+
+    uvicorn benchmarks.fake_discord:app --port 8099
+"""
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+
+@dataclass
+class FakeDiscordConfig:
+    """How the fake API behaves. A new config can be posted to `/_reset`."""
+
+    latency: float = 0.02
+    """The base number of seconds each response takes."""
+
+    jitter: float = 0.01
+    """Up to this many seconds are randomly added to each response."""
+
+    global_limit: int = 50
+    """Requests allowed per second across every route."""
+
+    member_limit: int = 10
+    """Requests allowed per window on a guild's member routes."""
+
+    user_limit: int = 30
+    """Requests allowed per window on the user route."""
+
+    window: float = 1.0
+    """Seconds until a route bucket resets."""
+
+    resource_429_rate: float = 0.0
+    """The share of requests (0 to 1) that get a resource 429."""
+
+    missing_member_rate: float = 0.1
+    """The share of member lookups that get a 404, as if the user isn't in the guild."""
+
+
+@dataclass
+class FakeBucket:
+    hash: str
+    limit: int
+    window: float
+    remaining: int = 0
+    reset_at: float = 0.0
+
+    def take(self) -> bool:
+        now = time.time()
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = now + self.window
+
+        if self.remaining <= 0:
+            return False
+
+        self.remaining -= 1
+        return True
+
+    def headers(self) -> dict[str, str]:
+        return {
+            "X-RateLimit-Bucket": self.hash,
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": f"{self.reset_at:.3f}",
+            "X-RateLimit-Reset-After": f"{max(self.reset_at - time.time(), 0):.3f}",
+        }
+
+
+@dataclass
+class FakeDiscordState:
+    config: FakeDiscordConfig = field(default_factory=FakeDiscordConfig)
+    buckets: dict[str, FakeBucket] = field(default_factory=dict)
+    global_window: int = 0
+    global_count: int = 0
+    requests: int = 0
+    ratelimits: dict[str, int] = field(
+        default_factory=lambda: {"global": 0, "resource": 0, "endpoint": 0}
+    )
+
+    def bucket(self, key: str, hash: str, limit: int) -> FakeBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = FakeBucket(hash, limit, self.config.window)
+        return bucket
+
+
+app = FastAPI(title="Fake Discord API")
+app.state.fake = FakeDiscordState()
+
+
+def _state() -> FakeDiscordState:
+    return app.state.fake
+
+
+def _ratelimited(scope: str, retry_after: float, headers: dict[str, str]):
+    state = _state()
+    state.ratelimits[scope] += 1
+
+    if scope == "global":
+        message = "You are being rate limited."
+        headers = {"X-RateLimit-Global": "true", "X-RateLimit-Scope": "global"}
+    elif scope == "resource":
+        message = "The resource is being rate limited."
+        headers = {**headers, "X-RateLimit-Scope": "shared"}
+    else:
+        message = "You are being rate limited."
+        headers = {**headers, "X-RateLimit-Scope": "user"}
+
+    headers["Retry-After"] = str(max(int(retry_after + 0.999), 1))
+
+    return JSONResponse(
+        {
+            "message": message,
+            "retry_after": round(retry_after, 3),
+            "global": scope == "global",
+        },
+        status_code=429,
+        headers=headers,
+    )
+
+
+async def _limit(bucket_key: str, bucket_hash: str, limit: int):
+    """
+    Apply the global and route limits to a request.
+
+    Returns a 429 response if the request is ratelimited, otherwise the
+    ratelimit headers to send with the real response.
+    """
+    state = _state()
+    config = state.config
+    state.requests += 1
+
+    await asyncio.sleep(config.latency + random.random() * config.jitter)
+
+    now = time.time()
+    second = int(now)
+    if second != state.global_window:
+        state.global_window = second
+        state.global_count = 0
+
+    state.global_count += 1
+    if state.global_count > config.global_limit:
+        return _ratelimited("global", second + 1 - now, {})
+
+    bucket = state.bucket(bucket_key, bucket_hash, limit)
+    if not bucket.take():
+        return _ratelimited("endpoint", bucket.reset_at - now, bucket.headers())
+
+    if random.random() < config.resource_429_rate:
+        return _ratelimited("resource", 0.5, bucket.headers())
+
+    return bucket.headers()
+
+
+def _user(user_id: str) -> dict:
+    return {
+        "id": user_id,
+        "username": f"user{user_id}",
+        "avatar": f"{int(user_id):032x}",
+    }
+
+
+def _member(user_id: str) -> dict:
+    return {"user": _user(user_id), "nick": None, "roles": []}
+
+
+@app.get("/api/guilds/{guild_id}/members/{user_id}")
+async def get_member(guild_id: str, user_id: str):
+    limited = await _limit(
+        f"members:{guild_id}", "members", _state().config.member_limit
+    )
+    if isinstance(limited, Response):
+        return limited
+
+    # The same users are always missing, so caching results is still correct
+    if random.Random(user_id).random() < _state().config.missing_member_rate:
+        return JSONResponse(
+            {"message": "Unknown Member", "code": 10007},
+            status_code=404,
+            headers=limited,
+        )
+
+    return JSONResponse(_member(user_id), headers=limited)
+
+
+@app.put("/api/guilds/{guild_id}/members/{user_id}")
+async def add_member(guild_id: str, user_id: str, request: Request):
+    limited = await _limit(
+        f"members:{guild_id}", "members", _state().config.member_limit
+    )
+    if isinstance(limited, Response):
+        return limited
+
+    body = await request.json()
+    if not body.get("access_token"):
+        return JSONResponse(
+            {"message": "Invalid OAuth2 access token", "code": 50025},
+            status_code=403,
+            headers=limited,
+        )
+
+    return JSONResponse(_member(user_id), status_code=201, headers=limited)
+
+
+@app.get("/api/users/{user_id}")
+async def get_user(user_id: str):
+    limited = await _limit("users", "users", _state().config.user_limit)
+    if isinstance(limited, Response):
+        return limited
+
+    return JSONResponse(_user(user_id), headers=limited)
+
+
+@app.get("/_stats")
+async def get_stats():
+    state = _state()
+    return {"requests": state.requests, "ratelimits": state.ratelimits}
+
+
+@app.post("/_reset")
+async def reset(config: FakeDiscordConfig | None = None):
+    app.state.fake = FakeDiscordState(config=config or _state().config)
+    return {"ok": True}
@@ -0,0 +1,108 @@
+"""
+Measure how long importing the app takes.
+
+Every worker process imports `chris.main` before it can serve a request, so a
+slow import slows down every start, restart and scale-up. This imports the app
+in a fresh interpreter with `-X importtime`, and reports the total and the
+modules that took the longest, counting everything each one imported in turn.
+
+The app's settings are loaded as usual, so run it from the repository root with
+a `.env` file in place:
+
+    uv run python -m benchmarks.import_time --budget 1200
+
+With `--budget`, it exits with an error if the import took longer than that
+many milliseconds, so it can be used as a check in CI.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+MODULE = "chris.main"
+
+
+def import_times(module: str) -> dict[str, int]:
+    """
+    Import a module in a fresh interpreter, and return the cumulative import
+    time of every module it imported, in microseconds.
+    """
+    try:
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except subprocess.CalledProcessError as e:
+        raise SystemExit(f"Importing {module} failed:\n{e.stderr}") from e
+
+    return parse_import_times(result.stderr)
+
+
+def parse_import_times(report: str) -> dict[str, int]:
+    """
+    Parse the report `-X importtime` writes to stderr into the cumulative
+    import time of every module, in microseconds.
+    """
+    times = {}
+    for line in report.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+
+    return times
+
+
+def top_level(times: dict[str, int]) -> dict[str, int]:
+    """The time of each top-level package, e.g. `keycloak` for `keycloak.exceptions`."""
+    packages: dict[str, int] = {}
+    for name, micros in times.items():
+        # A package's own line includes its submodules, so it's always the slowest
+        package = name.split(".")[0]
+        packages[package] = max(packages.get(package, 0), micros)
+
+    return packages
+
+
+def main(args: argparse.Namespace) -> None:
+    runs = [import_times(MODULE) for _ in range(args.runs)]
+    total = statistics.median(run[MODULE] for run in runs) / 1000
+
+    # The run whose total was the median, so the breakdown adds up
+    run = sorted(runs, key=lambda run: run[MODULE])[len(runs) // 2]
+    packages = top_level(run)
+    packages.pop("chris", None)
+
+    print(f"importing {MODULE} took {total:.0f}ms (median of {args.runs} runs)\n")
+    print(f"{'package':<30}{'ms':>10}")
+    slowest = sorted(packages.items(), key=lambda item: -item[1])[: args.top]
+    for package, micros in slowest:
+        print(f"{package:<30}{micros / 1000:>10.1f}")
+
+    if args.budget is not None and total > args.budget:
+        raise SystemExit(
+            f"\nImporting {MODULE} took {total:.0f}ms, over the {args.budget:.0f}ms budget"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--runs", type=int, default=5, help="How many fresh imports to time"
+    )
+    parser.add_argument(
+        "--top", type=int, default=15, help="How many of the slowest packages to show"
+    )
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=None,
+        help="Fail if the median import takes longer than this many milliseconds",
+    )
+
+    main(parser.parse_args())
@@ -1,20 +1,31 @@
 import type React from "react";
 import { useEffect, useState } from "react";
 
-import { get } from "@/services/api";
+import { loadStaffAvatar } from "@/services/staffAvatars";
 
 interface StaffAvatarProps {
   userId: string;
+  /** The avatar url stored on the user, if any. Skips the lookup when set. */
+  storedUrl?: string | null;
   className?: string;
 }
 
-const StaffAvatar: React.FC<StaffAvatarProps> = ({ userId, className }) => {
-  const [avatarUrl, setAvatarUrl] = useState<string | null>(null);
+const StaffAvatar: React.FC<StaffAvatarProps> = ({
+  userId,
+  storedUrl,
+  className,
+}) => {
+  const [avatarUrl, setAvatarUrl] = useState<string | null>(storedUrl ?? null);
 
   useEffect(() => {
     const fetchAvatar = async () => {
       if (!userId) return;
 
+      if (storedUrl !== undefined) {
+        setAvatarUrl(storedUrl);
+        return;
+      }
+
       const cacheKey = `staff_avatar_${userId}`;
       const cachedData = localStorage.getItem(cacheKey);
       const now = new Date().getTime();
@@ -35,19 +46,17 @@ const StaffAvatar: React.FC<StaffAvatarProps> = ({ userId, className }) => {
       }
 
       try {
-        const response = await get<{ url: string }>(
-          `/staff/users/${userId}/discord_profile`,
-        );
-        const dataToCache = { url: response.url, timestamp: now };
+        const url = await loadStaffAvatar(userId);
+        const dataToCache = { url, timestamp: now };
         localStorage.setItem(cacheKey, JSON.stringify(dataToCache));
-        setAvatarUrl(response.url);
+        setAvatarUrl(url);
       } catch (error) {
         console.error(`Failed to fetch avatar for user ${userId}:`, error);
       }
     };
 
     fetchAvatar();
-  }, [userId]);
+  }, [userId, storedUrl]);
 
   if (!avatarUrl) {
     return (
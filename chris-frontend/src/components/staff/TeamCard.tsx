@@ -40,7 +40,13 @@ const TeamCard: React.FC<TeamCardProps> = ({
             className="flex items-center justify-between rounded-md border border-stone-800/70 bg-stone-900/60 px-3 py-2"
           >
             <div className="flex items-center gap-3 min-w-0">
-              <StaffAvatar userId={user.discord_id} className="w-10 h-10" />
+              <StaffAvatar
+                userId={user.discord_id}
+                storedUrl={
+                  user.avatar_refreshed_at ? user.avatar_url : undefined
+                }
+                className="w-10 h-10"
+              />
               <div className="min-w-0">
                 <div className="text-white truncate">{user.username}</div>
                 <div className="text-xs text-stone-400 truncate">
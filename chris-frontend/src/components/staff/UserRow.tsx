@@ -90,7 +90,11 @@ const UserRow: React.FC<UserRowProps> = ({
   return (
     <tr className="bg-stone-900/50 hover:bg-stone-900/70 transition-colors align-top">
       <td className="px-4 py-3 flex flex-row items-center gap-3">
-        <StaffAvatar userId={user.discord_id} className="w-10 h-10" />
+        <StaffAvatar
+          userId={user.discord_id}
+          storedUrl={user.avatar_refreshed_at ? user.avatar_url : undefined}
+          className="w-10 h-10"
+        />
         <div className="flex flex-col mr-16">
           <span className="font-medium text-white truncate">
             {user.username || "—"}
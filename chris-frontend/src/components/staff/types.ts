@@ -14,6 +14,8 @@ export type ApiUser = {
   dietary_restrictions: string | null;
   notes: string | null;
   can_take_photos: boolean;
+  avatar_url: string | null;
+  avatar_refreshed_at: string | null;
 };
 
 export type Tab = "users" | "teams";
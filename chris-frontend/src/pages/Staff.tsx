@@ -3,6 +3,7 @@ import { toast } from "sonner";
 
 import type { ApiUser, Tab } from "@/components/staff/types";
 import { del, get, patch } from "@/services/api";
+import { streamStaffUsers } from "@/services/staffUsers";
 import { adminUserUpdateSchema } from "@/schemas/adminUserUpdateSchema";
 import StaffHeader from "@/components/staff/StaffHeader";
 import SearchAndTabs from "@/components/staff/SearchAndTabs";
@@ -30,8 +31,13 @@ const Staff: React.FC = () => {
       ? toast.loading("Loading users…", { duration: Infinity })
       : undefined;
     try {
-      const list = await get<ApiUser[]>("/staff/users");
-      setUsers(Array.isArray(list) ? list : []);
+      // Show users as they stream in rather than once they've all loaded
+      let first = true;
+      await streamStaffUsers((batch) => {
+        setUsers((prev) => (first ? batch : [...prev, ...batch]));
+        first = false;
+      });
+      if (first) setUsers([]);
       if (withToast) toast.success("Users loaded", { id: p });
     } catch (e: any) {
       const msg = e?.message || "Failed to load users";
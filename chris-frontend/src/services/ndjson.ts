@@ -0,0 +1,36 @@
+/**
+ * Read a newline-delimited JSON response as it arrives.
+ *
+ * `onItems` is called with the objects from each chunk of the body as soon as
+ * it's read, so a long response can be shown while it's still streaming.
+ */
+export async function readNdjson<T>(
+  response: Response,
+  onItems: (items: T[]) => void,
+): Promise<void> {
+  if (!response.body) {
+    throw new Error("The response has no body to read");
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = "";
+
+  const parse = (lines: string[]) => {
+    const items = lines
+      .filter((line) => line.trim())
+      .map((line) => JSON.parse(line) as T);
+    if (items.length) onItems(items);
+  };
+
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+
+    buffered += decoder.decode(value, { stream: true });
+    const lines = buffered.split("\n");
+    buffered = lines.pop() ?? "";
+    parse(lines);
+  }
+  parse([buffered + decoder.decode()]);
+}
@@ -0,0 +1,82 @@
+import apiFetch from "@/services/api";
+import { readNdjson } from "@/services/ndjson";
+
+/** The most ids the batch endpoint accepts in one request. */
+const MAX_BATCH_SIZE = 1000;
+
+interface PendingAvatar {
+  resolve: (url: string | null) => void;
+  reject: (error: unknown) => void;
+}
+
+const pending = new Map<string, PendingAvatar[]>();
+let flushScheduled = false;
+
+async function fetchBatch(
+  discordIds: string[],
+  waiting: Map<string, PendingAvatar[]>,
+): Promise<void> {
+  const response = await apiFetch("/staff/discord_profiles", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ discord_ids: discordIds }),
+  });
+
+  if (!response.ok) {
+    throw new Error(`Avatar batch failed with status: ${response.status}`);
+  }
+
+  // The response is one JSON object per line, sent as each avatar is found
+  await readNdjson<{ discord_id: string; url: string | null }>(
+    response,
+    (avatars) =>
+      avatars.forEach(({ discord_id, url }) => {
+        waiting.get(discord_id)?.forEach(({ resolve }) => resolve(url));
+        waiting.delete(discord_id);
+      }),
+  );
+}
+
+async function flush(): Promise<void> {
+  flushScheduled = false;
+
+  const waiting = new Map(pending);
+  pending.clear();
+
+  const discordIds = [...waiting.keys()];
+  for (let i = 0; i < discordIds.length; i += MAX_BATCH_SIZE) {
+    const batch = discordIds.slice(i, i + MAX_BATCH_SIZE);
+    try {
+      await fetchBatch(batch, waiting);
+    } catch (error) {
+      batch.forEach((id) =>
+        waiting.get(id)?.forEach(({ reject }) => reject(error)),
+      );
+      batch.forEach((id) => waiting.delete(id));
+    }
+  }
+
+  // Anything the server didn't answer for has no avatar
+  waiting.forEach((callbacks) =>
+    callbacks.forEach(({ resolve }) => resolve(null)),
+  );
+}
+
+/**
+ * Load a user's avatar url for the staff pages.
+ *
+ * Lookups made while a page renders are collected and sent as one batch, and
+ * each one resolves as soon as its avatar is streamed back.
+ */
+export function loadStaffAvatar(discordId: string): Promise<string | null> {
+  return new Promise((resolve, reject) => {
+    const callbacks = pending.get(discordId) ?? [];
+    callbacks.push({ resolve, reject });
+    pending.set(discordId, callbacks);
+
+    if (!flushScheduled) {
+      flushScheduled = true;
+      setTimeout(flush, 0);
+    }
+  });
+}
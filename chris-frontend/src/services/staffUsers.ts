@@ -0,0 +1,20 @@
+import type { ApiUser } from "@/components/staff/types";
+import apiFetch from "@/services/api";
+import { readNdjson } from "@/services/ndjson";
+
+/**
+ * Load every user for the staff pages.
+ *
+ * Users are streamed back in order of id, and `onUsers` is called with each
+ * batch as it arrives so the table can fill in while the rest load.
+ */
+export async function streamStaffUsers(
+  onUsers: (users: ApiUser[]) => void,
+): Promise<void> {
+  const response = await apiFetch("/staff/users?stream=true");
+  if (!response.ok) {
+    throw new Error(`Loading users failed with status: ${response.status}`);
+  }
+
+  await readNdjson<ApiUser>(response, onUsers);
+}
@@ -6,14 +6,11 @@ from fastapi.responses import RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from chris.api.controllers.auth import AuthController
-from chris.auth.services import AuthService
 from chris.core.config import get_openid, settings
 from chris.database.db import get_async_session
-from chris.services.discord import get_discord_member
-from chris.services.user import get_or_create_user
+from chris.services.login import complete_login
 
 router = APIRouter()
-keycloak_openid_client = get_openid()
 
 
 @router.get("/health", tags=["Authentication"])
@@ -30,7 +27,7 @@ async def login_redirect_to_keycloak(request: Request) -> RedirectResponse:
     Redirects the user to Keycloak for authentication.
     """
     redirect_uri = str(request.url_for("handle_keycloak_callback"))
-    auth_url = keycloak_openid_client.auth_url(
+    auth_url = get_openid().auth_url(
         redirect_uri=redirect_uri, scope="openid profile email roles"
     )
     return RedirectResponse(auth_url + "&kc_idp_hint=discord")
@@ -63,32 +60,28 @@ async def handle_keycloak_callback(
         return RedirectResponse(url=error_redirect_url)
 
     try:
-        # Authenticate with Keycloak, get JWT token and user info
-        chris_access_token, expires_in_seconds, user_info = (
-            AuthService.authenticate_user(str(authorization_code), request)
-        )
-
-        # Get or create the user in the database after successful authentication
-        db_user = await get_or_create_user(session=session, user_info=user_info)
+        # Authenticate with Keycloak, then save the user and check if they're
+        # in the server at the same time
+        login = await complete_login(str(authorization_code), request, session)
 
-        # Check if we need to join them to the server
-        member = get_discord_member(settings.discord_server_id, db_user.discord_id)
-
-        if member is not None:
+        if login.in_server:
             # Set the JWT as an HttpOnly cookie and redirect to the frontend
-            return AuthController.login(
-                chris_access_token, expires_in_seconds, response
+            redirect_response = AuthController.login(
+                login.access_token, login.expires_in, response
             )
 
         else:
             # Set the cookie and get them to join the server
-            return AuthController.login(
-                chris_access_token,
-                expires_in_seconds,
+            redirect_response = AuthController.login(
+                login.access_token,
+                login.expires_in,
                 response,
                 redirect_url=str(request.url_for("discord_oauth")),
             )
 
+        redirect_response.headers["Server-Timing"] = login.server_timing()
+        return redirect_response
+
     except Exception as e:
         # Log the error and redirect to error page
         print(f"Error in callback handler: {e}")
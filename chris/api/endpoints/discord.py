@@ -1,10 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import RedirectResponse
 from requests_oauthlib import OAuth2Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
 from chris.core.config import settings
+from chris.database.db import get_async_session
 from chris.models.user import User
-from chris.services.discord import add_user_to_server
+from chris.services.discord import JOIN_GUILD_JOB
+from chris.services.jobs import enqueue_job
 from chris.services.user import get_current_user
 
 router = APIRouter()
@@ -26,10 +30,11 @@ def get_discord_token(
 
 
 @router.get("/discord/callback", name="handle_discord_callback")
-def join_server(
+async def join_server(
     request: Request,
     code: str | None = None,
     user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session),
 ) -> RedirectResponse:
     if not code:
         raise HTTPException(status_code=500, detail="The Discord OAuth did not work!")
@@ -41,17 +46,25 @@ def join_server(
         redirect_uri=f"{settings.api_base_url}/discord/callback",
     )
 
-    token = oauth.fetch_token(
+    # requests-oauthlib is blocking, so keep it off the event loop
+    token = await run_in_threadpool(
+        oauth.fetch_token,
         "https://discord.com/api/oauth2/token",
         auth=(settings.discord_client_id, settings.discord_client_secret),
         code=code,
     )
 
-    # Ask discord to join the server
-    add_user_to_server(
-        server_id=settings.discord_server_id,
-        user_id=user.discord_id,
-        access_token=token["access_token"],
+    # Joining can be ratelimited, so it's done by a job instead of holding up the redirect.
+    # The frontend can follow its progress through `/jobs/{job_id}`
+    job = await enqueue_job(
+        session,
+        JOIN_GUILD_JOB,
+        {
+            "server_id": settings.discord_server_id,
+            "user_id": user.discord_id,
+            "access_token": token["access_token"],
+        },
+        user_id=user.id,
     )
 
-    return RedirectResponse(url=settings.frontend_base_url)
+    return RedirectResponse(url=f"{settings.frontend_base_url}?join_job={job.id}")
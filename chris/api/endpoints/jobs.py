@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from chris.database.db import get_async_session
+from chris.models.job import Job
+from chris.models.user import User
+from chris.schemas.job import JobRead
+from chris.services.user import get_current_user
+
+router = APIRouter()
+
+
+@router.get("/{job_id}", response_model=JobRead)
+async def get_job(
+    job_id: int,
+    *,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
+) -> Job:
+    """
+    Get the status of a background job. Users can only see their own jobs,
+    staff can see every job.
+    """
+    job = await session.get(Job, job_id)
+
+    # Don't tell users whether other people's jobs exist
+    if job is None or (
+        job.user_id != current_user.id and "staff" not in (current_user.roles or [])
+    ):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
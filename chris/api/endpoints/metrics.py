@@ -0,0 +1,68 @@
+import hmac
+from dataclasses import asdict
+
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from chris.core.config import settings
+from chris.database.db import get_async_session
+from chris.services.discord import member_cache, profile_cache
+from chris.services.discord.metrics import render_metric
+from chris.services.discord.request import AsyncDiscordRequester
+from chris.services.login import render_login_metrics
+from chris.services.user import get_current_user
+
+
+async def can_read_metrics(
+    request: Request, session: AsyncSession = Depends(get_async_session)
+) -> None:
+    """
+    Let in scrapers that send the metrics token, and staff with their auth
+    cookie. The metrics show internal state, like Discord ratelimits and how
+    full the queues are, so nobody else can read them.
+    """
+    if settings.metrics_token:
+        expected = f"Bearer {settings.metrics_token}"
+        authorization = request.headers.get("Authorization", "")
+        if hmac.compare_digest(authorization.encode(), expected.encode()):
+            return
+
+    user = await get_current_user(request, session)
+    if "staff" not in (user.roles or []):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Staff access required"
+        )
+
+
+router = APIRouter(dependencies=[Depends(can_read_metrics)])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, tags=["Metrics"])
+async def get_metrics() -> str:
+    """
+    Metrics for this process in the Prometheus text format.
+    Only staff, or scrapers with the metrics token, can read them.
+    """
+    caches = (member_cache, profile_cache)
+    lines = AsyncDiscordRequester.render_metrics()
+
+    lines += render_metric(
+        "discord_cache_size",
+        "Entries held by each Discord lookup cache.",
+        "gauge",
+        {cache.name: len(cache) for cache in caches},
+        label="cache",
+    )
+    for stat in ("hits", "misses", "evictions", "expirations"):
+        lines += render_metric(
+            f"discord_cache_{stat}_total",
+            f"Discord lookup cache {stat}.",
+            "counter",
+            {cache.name: asdict(cache.stats)[stat] for cache in caches},
+            label="cache",
+        )
+
+    lines += render_login_metrics()
+
+    return "\n".join(lines) + "\n"
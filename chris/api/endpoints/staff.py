@@ -1,16 +1,31 @@
-from typing import Dict, List, Optional
+import base64
+import json
+from collections import defaultdict
+from dataclasses import asdict
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+import httpx
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy import func, or_
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 from sqlmodel import select
 
-from chris.database.db import get_async_session
+from chris.database.db import get_async_engine, get_async_session
 from chris.models.team import Team
 from chris.models.user import User
-from chris.schemas.team import AdminTeam, TeamMember
-from chris.schemas.user import UserUpdate
-from chris.services.discord import get_user_profile_from_id
+from chris.schemas.team import AdminTeam, TeamMember, TeamUpdate
+from chris.schemas.user import DiscordProfileBatch, UserUpdate
+from chris.services.discord import (
+    enqueue_role_sync,
+    fetch_avatar_urls,
+    get_user_profile_from_id,
+    lookup_avatar_urls,
+    member_cache,
+    profile_cache,
+)
+from chris.services.discord.request import AsyncDiscordRequester
 from chris.services.user import get_current_user, update_user
 from chris.types import SHIRT_SIZES
 
@@ -23,15 +38,53 @@ async def user_is_staff(user: User = Depends(get_current_user)) -> None:
 router = APIRouter(dependencies=[Depends(user_is_staff)])
 
 
+USERS_STREAM_BATCH_SIZE = 500
+"""How many users are fetched from the database cursor at a time when streaming."""
+
+
+def _encode_cursor(user_id: int) -> str:
+    """An opaque cursor for the page of users after this id."""
+    return base64.urlsafe_b64encode(f"user:{user_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> int:
+    """The id a cursor from `_encode_cursor` continues after."""
+    try:
+        kind, user_id = base64.urlsafe_b64decode(cursor).decode().split(":")
+        if kind != "user":
+            raise ValueError(kind)
+        return int(user_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/users", response_model=List[User], tags=["Staff"])
 async def admin_list_users(
     *,
     session: AsyncSession = Depends(get_async_session),
+    response: Response,
     q: Optional[str] = Query(None, description="Search text"),
     limit: int = Query(500, ge=1, le=5000),
-    offset: int = Query(0, ge=0),
-) -> List[User]:
-    query = select(User)
+    cursor: Optional[str] = Query(
+        None, description="The `X-Next-Cursor` of the previous page"
+    ),
+    stream: bool = Query(
+        False, description="Send every user after the cursor as newline-delimited JSON"
+    ),
+) -> List[User] | StreamingResponse:
+    """
+    List users in order of id, a page at a time.
+
+    When there are more users after the page, the `X-Next-Cursor` header has
+    the cursor to pass to get the next one. Pages are found by id rather than
+    by offset, so deep pages are as fast as the first and users created while
+    paging don't shift the pages after them.
+
+    With `stream`, the limit is ignored and every user after the cursor is
+    sent as newline-delimited JSON, one user per line, as they're read from
+    the database.
+    """
+    query = select(User).order_by(User.id)  # type: ignore[arg-type]
     if q:
         like = f"%{q}%"
         like_lower = f"%{q.lower()}%"
@@ -44,9 +97,31 @@ async def admin_list_users(
         # Case-insensitive team_name search when present
         conditions.append(func.lower(User.team_name).like(like_lower))
         query = query.where(or_(*conditions))
-    query = query.offset(offset).limit(limit)
-    result = await session.execute(query)
-    return list(result.scalars().all())
+    if cursor:
+        query = query.where(User.id > _decode_cursor(cursor))  # type: ignore[operator]
+
+    if stream:
+
+        async def stream_users() -> AsyncIterator[str]:
+            # The request's session is closed once the response starts
+            # streaming, so this reads through its own
+            async with AsyncSession(get_async_engine()) as stream_session:
+                result = await stream_session.stream_scalars(
+                    query.execution_options(yield_per=USERS_STREAM_BATCH_SIZE)
+                )
+                async for users in result.partitions():
+                    yield "".join(user.model_dump_json() + "\n" for user in users)
+
+        return StreamingResponse(stream_users(), media_type="application/x-ndjson")
+
+    # One extra row says whether there's another page
+    result = await session.execute(query.limit(limit + 1))
+    users = list(result.scalars().all())
+    if len(users) > limit:
+        users = users[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(users[-1].id)  # type: ignore[arg-type]
+
+    return users
 
 
 @router.patch("/users/{user_id}", response_model=User, tags=["Staff"])
@@ -67,8 +142,11 @@ async def admin_update_user(
 
     if user_in.team_name and user_in.team_name != db_user.team_name:
         desired_name = user_in.team_name.strip()
-        query = select(func.count()).where(
-            func.lower(User.team_name) == desired_name.lower()
+        query = (
+            select(func.count())
+            .select_from(User)
+            .join(Team, Team.id == User.team_id)  # type: ignore[arg-type]
+            .where(Team.name == desired_name.lower())
         )
         result = await session.execute(query)
         team_count = result.scalar_one()
@@ -103,55 +181,67 @@ async def admin_delete_user(
     db_user = await session.get(User, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
+    discord_id = db_user.discord_id
     await session.delete(db_user)
     await session.commit()
 
+    # Deleted users shouldn't keep the roles CHRIS gave them
+    await enqueue_role_sync(session, [discord_id])
+
 
 @router.get("/teams", response_model=list[AdminTeam], tags=["Staff"])
 async def get_all_teams(
     *,
     session: AsyncSession = Depends(get_async_session),
 ) -> list[AdminTeam]:
-    """Get all teams with their members (staff only)."""
-    teams_result = await session.execute(select(Team))
-    teams = teams_result.scalars().all()
-
-    admin_teams = []
-    for team in teams:
-        if team.id is not None:
-            users_result = await session.execute(
-                select(User).where(func.lower(User.team_name) == team.name.lower())
-            )
-            users = users_result.scalars().all()
+    """
+    Get all teams with their members (staff only).
 
-            # Get creator discord_id
-            creator_discord_id = "Unknown"
-            if team.created_by_id:
-                creator_result = await session.execute(
-                    select(User).where(User.id == team.created_by_id)
-                )
-                creator = creator_result.scalar_one_or_none()
-                if creator:
-                    creator_discord_id = creator.discord_id
-
-            admin_teams.append(
-                AdminTeam(
-                    id=team.id,
-                    name=team.name,
-                    created_by=creator_discord_id,
-                    members=[
-                        TeamMember(
-                            id=user.id,
-                            username=user.username,
-                            discord_id=user.discord_id,
-                            name=user.name or user.username,
-                        )
-                        for user in users
-                        if user.id is not None
-                    ],
-                )
+    This is two queries however many teams there are: one for the teams and
+    their creators, and one for every team's members.
+    """
+    creator = aliased(User)
+    teams_result = await session.execute(
+        select(Team, creator.discord_id)
+        .outerjoin(creator, creator.id == Team.created_by_id)  # type: ignore[arg-type]
+        .order_by(Team.id)  # type: ignore[arg-type]
+    )
+
+    members_result = await session.execute(
+        select(  # type: ignore[call-overload]
+            User.team_id,
+            User.id,
+            User.username,
+            User.discord_id,
+            User.name,
+            User.avatar_url,
+        )
+        .where(User.team_id.is_not(None))  # type: ignore[union-attr]
+        .order_by(User.id)
+    )
+    members_by_team: dict[int, list[TeamMember]] = defaultdict(list)
+    for member in members_result.all():
+        members_by_team[member.team_id].append(
+            TeamMember(
+                id=member.id,
+                username=member.username,
+                discord_id=member.discord_id,
+                name=member.name or member.username,
+                avatar_url=member.avatar_url,
             )
-    return admin_teams
+        )
+
+    return [
+        AdminTeam(
+            id=team.id,
+            name=team.name,
+            discord_role_id=team.discord_role_id,
+            created_by=creator_discord_id or "Unknown",
+            members=members_by_team.get(team.id, []),
+        )
+        for team, creator_discord_id in teams_result.all()
+        if team.id is not None
+    ]
 
 
 @router.delete("/teams/{team_id}", status_code=204, tags=["Staff"])
@@ -167,24 +257,144 @@ async def delete_team_by_id(
 
     # Remove all users from the team
     users_in_team_result = await session.execute(
-        select(User).where(func.lower(User.team_name) == team_to_delete.name.lower())
+        select(User).where(User.team_id == team_to_delete.id)
     )
-    for user in users_in_team_result.scalars().all():
+    members = users_in_team_result.scalars().all()
+    for user in members:
+        user.team_id = None
         user.team_name = None
         session.add(user)
 
+    stale_role_id = team_to_delete.discord_role_id
     await session.delete(team_to_delete)
     await session.commit()
+
+    await enqueue_role_sync(
+        session, [user.discord_id for user in members], stale_roles=[stale_role_id]
+    )
     return None
 
 
+@router.patch("/teams/{team_id}", response_model=AdminTeam, tags=["Staff"])
+async def update_team(
+    team_id: int,
+    team_in: TeamUpdate,
+    *,
+    session: AsyncSession = Depends(get_async_session),
+) -> AdminTeam:
+    """Set the Discord role given to a team's members (staff only)."""
+    team = await session.get(Team, team_id)
+    if not team or team.id is None:
+        raise HTTPException(status_code=404, detail="Team not found")
+
+    old_role_id = team.discord_role_id
+    team.discord_role_id = team_in.discord_role_id or None
+    session.add(team)
+    await session.commit()
+
+    members_result = await session.execute(select(User).where(User.team_id == team.id))
+    members = members_result.scalars().all()
+
+    creator = (
+        await session.get(User, team.created_by_id) if team.created_by_id else None
+    )
+
+    if old_role_id != team.discord_role_id:
+        await enqueue_role_sync(
+            session, [user.discord_id for user in members], stale_roles=[old_role_id]
+        )
+
+    return AdminTeam(
+        id=team.id,
+        name=team.name,
+        discord_role_id=team.discord_role_id,
+        created_by=creator.discord_id if creator else "Unknown",
+        members=[
+            TeamMember(
+                id=user.id,
+                username=user.username,
+                discord_id=user.discord_id,
+                name=user.name or user.username,
+                avatar_url=user.avatar_url,
+            )
+            for user in members
+            if user.id is not None
+        ],
+    )
+
+
 @router.get("/users/{discord_id}/discord_profile")
-def get_staff_discord_profile(
-    discord_id: str, current_user: User = Depends(get_current_user)
+async def get_staff_discord_profile(
+    discord_id: str,
+    *,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user),
 ) -> Dict[str, str | None]:
     """
     Get a user's discord profile picture by their discord ID.
     This is an admin-only endpoint.
     """
-    url = get_user_profile_from_id(discord_id)
+    result = await session.execute(
+        select(User.avatar_url).where(
+            User.discord_id == discord_id,
+            User.avatar_refreshed_at.is_not(None),  # type: ignore[union-attr]
+        )
+    )
+    stored = result.first()
+    if stored is not None:
+        return {"url": stored.avatar_url}
+
+    try:
+        url = await get_user_profile_from_id(discord_id)
+    except httpx.HTTPStatusError:
+        # The lookup is logged, the frontend can show the default pfp
+        url = None
     return {"url": url}
+
+
+@router.post("/discord_profiles", tags=["Staff"])
+async def get_staff_discord_profiles(
+    batch: DiscordProfileBatch,
+    *,
+    session: AsyncSession = Depends(get_async_session),
+) -> StreamingResponse:
+    """
+    Get the discord profile pictures of many users at once.
+    This is an admin-only endpoint.
+
+    The response is newline-delimited JSON, one `{"discord_id": ..., "url": ...}`
+    object per user. Urls we already know are sent straight away, the rest are
+    sent as Discord returns them.
+    """
+    discord_ids = list(dict.fromkeys(batch.discord_ids))
+
+    # The session is only used here, before the response starts streaming
+    known = await lookup_avatar_urls(session, discord_ids)
+    missing = [discord_id for discord_id in discord_ids if discord_id not in known]
+
+    async def stream() -> AsyncIterator[str]:
+        if known:
+            yield "".join(
+                json.dumps({"discord_id": discord_id, "url": url}) + "\n"
+                for discord_id, url in known.items()
+            )
+
+        async for discord_id, url in fetch_avatar_urls(missing):
+            yield json.dumps({"discord_id": discord_id, "url": url}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.get("/discord/stats", tags=["Staff"])
+async def get_discord_stats() -> Dict[str, Any]:
+    """
+    Get the Discord client's request counters, ratelimit timings and bucket
+    states, and how much traffic caching is saving.
+    """
+    return {
+        **AsyncDiscordRequester.stats(),
+        "caches": {
+            cache.name: {"size": len(cache), **asdict(cache.stats)}
+            for cache in (member_cache, profile_cache)
+        },
+    }
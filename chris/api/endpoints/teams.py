@@ -13,6 +13,7 @@ from chris.schemas.team import (
     TeamMember,
     TeamMembers,
 )
+from chris.services.discord import enqueue_role_sync
 from chris.services.user import get_current_user
 from chris.utils.security import hash_password, verify_password
 
@@ -26,7 +27,7 @@ async def check_team_exists(
     session: AsyncSession = Depends(get_async_session),
 ) -> TeamCheck:
     """Check if a team exists."""
-    query = select(Team).where(func.lower(Team.name) == team_name.lower())
+    query = select(Team).where(Team.name == team_name.strip().lower())
     result = await session.execute(query)
     team = result.scalar_one_or_none()
 
@@ -41,12 +42,12 @@ async def create_team(
     current_user: User = Depends(get_current_user),
 ) -> dict[str, str]:
     """Create a new team with password protection."""
-    if current_user.team_name:
+    if current_user.team_id:
         raise HTTPException(status_code=400, detail="You are already in a team")
 
     # Check if team exists
     desired_name = team_data.name.strip()
-    existing_query = select(Team).where(func.lower(Team.name) == desired_name.lower())
+    existing_query = select(Team).where(Team.name == desired_name.lower())
     existing_result = await session.execute(existing_query)
     if existing_result.scalar_one_or_none():
         raise HTTPException(status_code=409, detail="Team already exists")
@@ -60,12 +61,15 @@ async def create_team(
         created_by_id=current_user.id,
     )
     session.add(team)
+    await session.flush()
 
+    current_user.team_id = team.id
     current_user.team_name = team.name
     session.add(current_user)
 
     await session.commit()
     await session.refresh(team)
+    await enqueue_role_sync(session, [current_user.discord_id])
 
     return {"message": "Team created successfully", "team_name": team.name}
 
@@ -78,12 +82,12 @@ async def join_team(
     current_user: User = Depends(get_current_user),
 ) -> dict[str, str]:
     """Join an existing team with password."""
-    if current_user.team_name:
+    if current_user.team_id:
         raise HTTPException(status_code=400, detail="You are already in a team")
 
     # Get team and member count
     desired_name = team_data.name.strip()
-    team_query = select(Team).where(func.lower(Team.name) == desired_name.lower())
+    team_query = select(Team).where(Team.name == desired_name.lower())
     team_result = await session.execute(team_query)
     team = team_result.scalar_one_or_none()
 
@@ -95,17 +99,17 @@ async def join_team(
         raise HTTPException(status_code=401, detail="Invalid team password")
 
     # Check member count
-    member_count_query = select(func.count()).where(
-        func.lower(User.team_name) == team.name.lower()
-    )
+    member_count_query = select(func.count()).where(User.team_id == team.id)
     member_count = (await session.execute(member_count_query)).scalar_one()
 
     if member_count >= 4:
         raise HTTPException(status_code=409, detail=f"Team '{team.name}' is full")
 
+    current_user.team_id = team.id
     current_user.team_name = team.name
     session.add(current_user)
     await session.commit()
+    await enqueue_role_sync(session, [current_user.discord_id])
 
     return {"message": "Joined team successfully", "team_name": team.name}
 
@@ -119,7 +123,8 @@ async def get_team_members(
 ) -> TeamMembers:
     """Get team members with Discord info."""
     if (
-        not current_user.team_name
+        not current_user.team_id
+        or not current_user.team_name
         or current_user.team_name.lower() != team_name.lower()
     ):
         raise HTTPException(
@@ -128,8 +133,8 @@ async def get_team_members(
 
     query = (
         select(Team, User)
-        .join(User, func.lower(User.team_name) == func.lower(Team.name))
-        .where(func.lower(Team.name) == team_name.lower())
+        .join(User, User.team_id == Team.id)  # type: ignore[arg-type]
+        .where(Team.id == current_user.team_id)
     )
     result = await session.execute(query)
     team_members_data = result.all()
@@ -155,6 +160,7 @@ async def get_team_members(
                     username=member.username,
                     discord_id=member.discord_id,
                     name=member.name or member.username,
+                    avatar_url=member.avatar_url,
                 )
             )
 
@@ -170,19 +176,17 @@ async def leave_team(
     current_user: User = Depends(get_current_user),
 ) -> dict[str, str]:
     """Leave the current team."""
-    team_name = current_user.team_name
-    if not team_name:
+    if not current_user.team_id:
         raise HTTPException(status_code=400, detail="You are not in a team")
 
-    team_query = select(Team).where(func.lower(Team.name) == team_name.lower())
-    team_result = await session.execute(team_query)
-    team = team_result.scalar_one_or_none()
+    team = await session.get(Team, current_user.team_id)
+    stale_roles = []
 
     # Check if user is the team leader
     if team and team.created_by_id == current_user.id:
         # Check if there are other team members to transfer leadership to
         other_members_query = select(User).where(
-            func.lower(User.team_name) == team_name.lower(),
+            User.team_id == team.id,
             User.id != current_user.id,
         )
         other_members_result = await session.execute(other_members_query)
@@ -194,10 +198,15 @@ async def leave_team(
             team.created_by_id = new_leader.id
             session.add(team)
         else:
+            # Nobody is left to be given the deleted team's role, so it
+            # has to be removed from the user explicitly
+            stale_roles.append(team.discord_role_id)
             await session.delete(team)
 
+    current_user.team_id = None
     current_user.team_name = None
     session.add(current_user)
     await session.commit()
+    await enqueue_role_sync(session, [current_user.discord_id], stale_roles=stale_roles)
 
     return {"message": "You have left the team"}
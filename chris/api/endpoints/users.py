@@ -1,3 +1,4 @@
+import httpx
 from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -21,10 +22,17 @@ async def protected_resource(current_user: User = Depends(get_current_user)) ->
 
 
 @router.get("/discord_profile")
-def get_discord_profile(
+async def get_discord_profile(
     current_user: User = Depends(get_current_user),
 ) -> dict[str, str | None]:
-    return {"url": get_user_profile_from_id(current_user.discord_id)}
+    if current_user.avatar_refreshed_at is not None:
+        return {"url": current_user.avatar_url}
+
+    try:
+        return {"url": await get_user_profile_from_id(current_user.discord_id)}
+    except httpx.HTTPStatusError:
+        # The lookup is logged, the frontend can show the default pfp
+        return {"url": None}
 
 
 @router.patch("/edit_user", response_model=User)
@@ -0,0 +1,171 @@
+"""
+Validating Keycloak id_tokens locally.
+
+The code exchange already returns a signed id_token with the user's claims, so
+instead of asking Keycloak for them again with a `userinfo` request, the token
+is checked against the realm's signing keys. The realm's discovery document
+and keys are fetched once and cached, and the keys are fetched again when a
+token is signed with one we don't know, e.g. after Keycloak rotates its keys.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any
+
+import httpx
+from jose import JWTError, jwk, jwt
+from jose.backends.base import Key
+from jose.exceptions import JWKError
+
+from chris.core.config import get_openid, settings
+
+logger = logging.getLogger("auth")
+
+DISCOVERY_TTL = 24 * 60 * 60
+"""How many seconds to keep the realm's discovery document for."""
+
+JWKS_TTL = 60 * 60
+"""How many seconds to keep the realm's signing keys for."""
+
+JWKS_MIN_REFRESH = 30
+"""The fewest seconds between fetching the keys because a token used one we don't know."""
+
+REQUIRED_CLAIMS = ("sub", "preferred_username", "discord_id", "roles")
+"""
+Claims the id_token must have to be used instead of `userinfo`. These only
+appear in the id_token if their Keycloak mappers have "Add to ID token" on.
+"""
+
+
+class OIDCKeyCache:
+    """The realm's discovery document and signing keys, fetched when first needed."""
+
+    def __init__(self) -> None:
+        self._well_known: dict[str, Any] | None = None
+        self._well_known_at = 0.0
+
+        self._keys: dict[str, tuple[str, Key]] = {}
+        """Each signing key's algorithm and key, by key id."""
+
+        self._keys_at = 0.0
+        """The monotonic time the keys were last fetched."""
+
+        self._lock = asyncio.Lock()
+        """Held while fetching, so a burst of logins only fetches once."""
+
+    async def well_known(self) -> dict[str, Any]:
+        """The realm's OpenID discovery document."""
+        if (
+            self._well_known is None
+            or time.monotonic() - self._well_known_at > DISCOVERY_TTL
+        ):
+            async with self._lock:
+                # Another login may have fetched it while we waited
+                if (
+                    self._well_known is None
+                    or time.monotonic() - self._well_known_at > DISCOVERY_TTL
+                ):
+                    self._well_known = await get_openid().a_well_known()
+                    self._well_known_at = time.monotonic()
+
+        return self._well_known  # type: ignore[return-value]
+
+    async def signing_key(self, kid: str) -> tuple[str, Key]:
+        """
+        The algorithm and key for a key id. Unknown ids cause the keys to be
+        fetched again, at most every `JWKS_MIN_REFRESH` seconds.
+        """
+        if kid not in self._keys or time.monotonic() - self._keys_at > JWKS_TTL:
+            async with self._lock:
+                age = time.monotonic() - self._keys_at
+                if age > JWKS_TTL or (kid not in self._keys and age > JWKS_MIN_REFRESH):
+                    await self._fetch_keys()
+
+        key = self._keys.get(kid)
+        if key is None:
+            raise JWTError(f"Unknown signing key `{kid}`")
+
+        return key
+
+    async def _fetch_keys(self) -> None:
+        jwks = await get_openid().a_certs()
+
+        keys = {}
+        for key in jwks.get("keys", []):
+            # Keycloak also publishes encryption keys, which can't sign anything
+            if key.get("use", "sig") != "sig" or "kid" not in key or "alg" not in key:
+                continue
+
+            try:
+                keys[key["kid"]] = (key["alg"], jwk.construct(key, key["alg"]))
+            except (JWKError, ValueError) as exc:
+                logger.warning(f"Skipping Keycloak signing key `{key['kid']}`: {exc}")
+
+        if self._keys and keys.keys() != self._keys.keys():
+            logger.info(f"Keycloak's signing keys changed, now using {sorted(keys)}")
+
+        self._keys = keys
+        self._keys_at = time.monotonic()
+
+    def clear(self) -> None:
+        self._well_known = None
+        self._keys = {}
+        self._keys_at = 0.0
+
+
+oidc_keys = OIDCKeyCache()
+
+
+async def validate_id_token(
+    id_token: str, access_token: str | None = None
+) -> dict[str, Any]:
+    """
+    Check an id_token's signature, issuer, audience and expiry, and return its claims.
+    If the access token it was issued with is given, its `at_hash` is checked too.
+
+    Raises a `JWTError` if the token isn't valid.
+    """
+    kid = jwt.get_unverified_header(id_token).get("kid")
+    if not kid:
+        raise JWTError("The id_token has no key id")
+
+    algorithm, key = await oidc_keys.signing_key(kid)
+    well_known = await oidc_keys.well_known()
+
+    return jwt.decode(
+        id_token,
+        key,
+        algorithms=[algorithm],
+        audience=settings.keycloak_client_id,
+        issuer=well_known["issuer"],
+        access_token=access_token,
+    )
+
+
+async def id_token_claims(token_response: dict[str, Any]) -> dict[str, Any] | None:
+    """
+    Get the user's claims from the id_token of a Keycloak token response.
+
+    Returns None if there's no id_token, it isn't valid, its signing keys couldn't
+    be fetched, or it's missing any of the `REQUIRED_CLAIMS`, in which case
+    `userinfo` should be asked instead.
+    """
+    from keycloak.exceptions import KeycloakError
+
+    id_token = token_response.get("id_token")
+    if not id_token:
+        return None
+
+    try:
+        claims = await validate_id_token(id_token, token_response.get("access_token"))
+    except (httpx.HTTPError, KeycloakError, JWTError, JWKError) as exc:
+        logger.warning(f"Couldn't validate the id_token, using userinfo instead: {exc}")
+        return None
+
+    missing = [claim for claim in REQUIRED_CLAIMS if claim not in claims]
+    if missing:
+        logger.debug(f"The id_token is missing {missing}, using userinfo instead")
+        return None
+
+    return claims
@@ -1,12 +1,48 @@
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
-from typing import cast
+from typing import Iterator, cast
 
 from fastapi import HTTPException, Request, status
 from jose import JWTError, jwt
-from keycloak.exceptions import KeycloakAuthenticationError, KeycloakPostError
 
+from chris.auth.oidc import id_token_claims
 from chris.auth.schemas import UserInfo
-from chris.core.config import keycloak_openid, settings
+from chris.auth.tokens import HMAC_DIGESTS, HMACTokenVerifier, TokenCache
+from chris.core.config import get_openid, settings
+
+token_cache = TokenCache(maxsize=4096)
+"""Verified CHRIS JWTs, so repeat requests with the same cookie skip verification."""
+
+token_verifier = (
+    HMACTokenVerifier(settings.jwt_secret_key, settings.jwt_algorithm)
+    if settings.jwt_algorithm in HMAC_DIGESTS
+    else None
+)
+"""The fast verifier for our signing algorithm, or None to verify with `jose`."""
+
+
+@contextmanager
+def _keycloak_errors() -> Iterator[None]:
+    """Turn anything that goes wrong while authenticating with Keycloak into an HTTPException."""
+    from keycloak.exceptions import KeycloakAuthenticationError, KeycloakPostError
+
+    try:
+        yield
+    except KeycloakAuthenticationError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Keycloak authentication error: {exc}",
+        ) from exc
+    except KeycloakPostError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Keycloak post error (e.g., invalid grant): {exc}",
+        ) from exc
+    except Exception as exc:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"An unexpected error occurred during authentication: {exc}",
+        ) from exc
 
 
 class AuthService:
@@ -17,10 +53,12 @@ class AuthService:
         2. Fetch user info from Keycloak.
         3. Create CHRIS JWT token.
         4. Return tuple of (chris_jwt_token, expires_in_seconds, user_info).
+
+        This blocks on both Keycloak requests, so use `a_authenticate_user` from async code.
         """
-        try:
+        with _keycloak_errors():
             # Exchange authorization code for Keycloak token
-            keycloak_token_response = keycloak_openid.token(
+            keycloak_token_response = get_openid().token(
                 grant_type="authorization_code",
                 code=keycode,
                 redirect_uri=str(request.url_for("handle_keycloak_callback")),
@@ -29,85 +67,105 @@ class AuthService:
             keycloak_access_token = keycloak_token_response["access_token"]
 
             # Fetch user info from Keycloak using the Keycloak access token
-            kc_user_info = keycloak_openid.userinfo(keycloak_access_token)
-            if not kc_user_info:
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="Failed to fetch user info from Keycloak.",
-                )
+            kc_user_info = get_openid().userinfo(keycloak_access_token)
 
-            # Check that we have the discord id
-            # Keycloak should provice it as long as the user authed with discord
-            if (
-                not kc_user_info.get("discord_id")
-                or kc_user_info.get("discord_id") == "0"
-            ):
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail="User did not authenticate with Discord.",
-                )
+            return AuthService.issue_chris_jwt(cast(dict, kc_user_info))
 
-            # Generate a CHRIS JWT
-            jwt_expiration_delta = timedelta(hours=settings.jwt_expiration_hours)
-            expires_at = datetime.now(timezone.utc) + jwt_expiration_delta
-
-            user_roles = kc_user_info.get("roles", [])
-
-            if "groups" in kc_user_info:
-                user_roles.extend(kc_user_info.get("groups", []))
-
-            chris_jwt_claims = {
-                "sub": kc_user_info.get("sub"),  # Subject - Keycloak user ID
-                "username": kc_user_info.get("preferred_username"),
-                "discord_id": kc_user_info.get("discord_id"),
-                "email": kc_user_info.get("email"),
-                "name": kc_user_info.get("name"),
-                "roles": list(set(user_roles)),
-                "exp": expires_at,
-                "iat": datetime.now(timezone.utc),
-                "iss": "chris-backend",
-            }
-
-            # Remove None values from claims to keep JWT clean
-            chris_jwt_claims = {
-                k: v for k, v in chris_jwt_claims.items() if v is not None
-            }
-
-            # Create CHRIS JWT token
-            encoded_chris_jwt = jwt.encode(
-                chris_jwt_claims,
-                settings.jwt_secret_key,
-                algorithm=settings.jwt_algorithm,
-            )
+    @staticmethod
+    async def a_authenticate_user(
+        keycode: str, request: Request
+    ) -> tuple[str, int, UserInfo]:
+        """
+        The same as `authenticate_user`, but Keycloak is called through its pooled
+        async client, so a burst of logins doesn't block other requests.
 
-            # Create UserInfo object and return both token and user info
-            user_info = UserInfo(
-                sub=cast(str, chris_jwt_claims["sub"]),
-                username=cast(str, chris_jwt_claims["username"]),
-                discord_id=cast(str, chris_jwt_claims["discord_id"]),
-                email=cast(str, chris_jwt_claims.get("email")),
-                name=cast(str, chris_jwt_claims.get("name")),
-                roles=cast(list[str], chris_jwt_claims.get("roles", [])),
+        The user's claims are taken from the id_token when it's valid and has
+        all of them, saving a `userinfo` round trip.
+        """
+        with _keycloak_errors():
+            # Exchange authorization code for Keycloak token
+            keycloak_token_response = await get_openid().a_token(
+                grant_type="authorization_code",
+                code=keycode,
+                redirect_uri=str(request.url_for("handle_keycloak_callback")),
+                scope="openid profile email roles",
             )
-            expires_in_seconds = int(jwt_expiration_delta.total_seconds())
+            keycloak_access_token = keycloak_token_response["access_token"]
 
-            return encoded_chris_jwt, expires_in_seconds, user_info
+            # The signed id_token usually has everything we need, so only
+            # ask Keycloak for the user info if it doesn't
+            kc_user_info = await id_token_claims(keycloak_token_response)
+            if kc_user_info is None:
+                kc_user_info = cast(
+                    dict, await get_openid().a_userinfo(keycloak_access_token)
+                )
 
-        except KeycloakAuthenticationError as exc:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail=f"Keycloak authentication error: {exc}",
-            ) from exc
-        except KeycloakPostError as exc:
+            return AuthService.issue_chris_jwt(kc_user_info)
+
+    @staticmethod
+    def issue_chris_jwt(kc_user_info: dict | None) -> tuple[str, int, UserInfo]:
+        """
+        Create a CHRIS JWT from the user info Keycloak gave us.
+        Returns a tuple of (chris_jwt_token, expires_in_seconds, user_info).
+        """
+        if not kc_user_info:
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Keycloak post error (e.g., invalid grant): {exc}",
-            ) from exc
-        except Exception as exc:
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to fetch user info from Keycloak.",
+            )
+
+        # Check that we have the discord id
+        # Keycloak should provice it as long as the user authed with discord
+        if not kc_user_info.get("discord_id") or kc_user_info.get("discord_id") == "0":
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"An unexpected error occurred during authentication: {exc}",
-            ) from exc
+                detail="User did not authenticate with Discord.",
+            )
+
+        # Generate a CHRIS JWT
+        jwt_expiration_delta = timedelta(hours=settings.jwt_expiration_hours)
+        expires_at = datetime.now(timezone.utc) + jwt_expiration_delta
+
+        user_roles = kc_user_info.get("roles", [])
+
+        if "groups" in kc_user_info:
+            user_roles.extend(kc_user_info.get("groups", []))
+
+        chris_jwt_claims = {
+            "sub": kc_user_info.get("sub"),  # Subject - Keycloak user ID
+            "username": kc_user_info.get("preferred_username"),
+            "discord_id": kc_user_info.get("discord_id"),
+            "email": kc_user_info.get("email"),
+            "name": kc_user_info.get("name"),
+            # Sorted so the same roles always give the same claim
+            "roles": sorted(set(user_roles)),
+            "exp": expires_at,
+            "iat": datetime.now(timezone.utc),
+            "iss": "chris-backend",
+        }
+
+        # Remove None values from claims to keep JWT clean
+        chris_jwt_claims = {k: v for k, v in chris_jwt_claims.items() if v is not None}
+
+        # Create CHRIS JWT token
+        encoded_chris_jwt = jwt.encode(
+            chris_jwt_claims,
+            settings.jwt_secret_key,
+            algorithm=settings.jwt_algorithm,
+        )
+
+        # Create UserInfo object and return both token and user info
+        user_info = UserInfo(
+            sub=cast(str, chris_jwt_claims["sub"]),
+            username=cast(str, chris_jwt_claims["username"]),
+            discord_id=cast(str, chris_jwt_claims["discord_id"]),
+            email=cast(str, chris_jwt_claims.get("email")),
+            name=cast(str, chris_jwt_claims.get("name")),
+            roles=cast(list[str], chris_jwt_claims.get("roles", [])),
+        )
+        expires_in_seconds = int(jwt_expiration_delta.total_seconds())
+
+        return encoded_chris_jwt, expires_in_seconds, user_info
 
     @staticmethod
     def create_chris_jwt(sub: str) -> tuple[str, int]:
@@ -136,19 +194,29 @@ class AuthService:
     def verify_token(token: str) -> UserInfo:
         """
         Verify the CHRIS JWT and return user information.
+
+        Verified tokens are cached until they expire, so a token is only
+        verified once no matter how many requests it's sent with.
         """
+        cached = token_cache.get(token)
+        if cached is not None:
+            return cached
+
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
         try:
-            payload = jwt.decode(
-                token,
-                settings.jwt_secret_key,
-                algorithms=[settings.jwt_algorithm],
-                options={"verify_aud": False},  # No specific audience for now
-            )
+            if token_verifier is not None:
+                payload = token_verifier.decode(token)
+            else:
+                payload = jwt.decode(
+                    token,
+                    settings.jwt_secret_key,
+                    algorithms=[settings.jwt_algorithm],
+                    options={"verify_aud": False},  # No specific audience for now
+                )
 
             # Basic check for required fields from the CHRIS JWT
             username: str | None = payload.get("username")
@@ -159,7 +227,7 @@ class AuthService:
                 raise credentials_exception
 
             # Construct UserInfo from the CHRIS JWT payload
-            return UserInfo(
+            user_info = UserInfo(
                 sub=sub,
                 username=username,
                 discord_id=discord_id,
@@ -167,5 +235,10 @@ class AuthService:
                 name=payload.get("name"),
                 roles=payload.get("roles", []),
             )
+
+            if "exp" in payload:
+                token_cache.set(token, user_info, payload["exp"])
+
+            return user_info
         except JWTError as exc:
             raise credentials_exception from exc
@@ -1,9 +1,12 @@
-from typing import Optional
+from functools import cache
+from typing import TYPE_CHECKING, Optional
 
-from keycloak import KeycloakOpenID
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
+if TYPE_CHECKING:
+    from keycloak import KeycloakOpenID
+
 
 class Settings(BaseSettings):
     model_config = {
@@ -48,22 +51,53 @@ class Settings(BaseSettings):
         default="1150133792040824873",
         env="DISCORD_SERVER_ID",  # type: ignore[call-overload]
     )
+    discord_member_sync_minutes: int = Field(
+        default=15,
+        env="DISCORD_MEMBER_SYNC_MINUTES",  # type: ignore[call-overload]
+    )
+    discord_avatar_refresh_minutes: int = Field(
+        default=5,
+        env="DISCORD_AVATAR_REFRESH_MINUTES",  # type: ignore[call-overload]
+    )
+    # How often each process shares its ratelimit state with the others, 0 to not share it
+    discord_ratelimit_sync_seconds: float = Field(
+        default=5.0,
+        env="DISCORD_RATELIMIT_SYNC_SECONDS",  # type: ignore[call-overload]
+    )
+    # CHRIS role names to the Discord role ids they give, as JSON, e.g. {"staff": "1234"}
+    discord_role_map: dict[str, str] = Field(
+        default_factory=dict,
+        env="DISCORD_ROLE_MAP",  # type: ignore[call-overload]
+    )
 
+    # A token Prometheus can send as `Authorization: Bearer <token>` to read
+    # /metrics. Without one, only staff can read it
+    metrics_token: Optional[str] = Field(default=None, env="METRICS_TOKEN")  # type: ignore[call-overload]
 
-settings = Settings()  # type: ignore[call-arg]
+    # Job queue settings
+    job_workers: int = Field(default=2, env="JOB_WORKERS")  # type: ignore[call-overload]
+    job_poll_seconds: float = Field(default=1.0, env="JOB_POLL_SECONDS")  # type: ignore[call-overload]
 
-keycloak_openid = KeycloakOpenID(
-    server_url=settings.keycloak_internal_url,
-    realm_name=settings.keycloak_realm,
-    client_id=settings.keycloak_client_id,
-    client_secret_key=settings.keycloak_client_secret,
-    verify=False,
-)
 
+settings = Settings()  # type: ignore[call-arg]
 
-def get_openid_config() -> dict:
-    return keycloak_openid.well_known()
 
+@cache
+def get_openid() -> "KeycloakOpenID":
+    """
+    The Keycloak client, created on first use. Importing python-keycloak is
+    slow, so it's left until the app actually needs to talk to Keycloak.
+    """
+    from keycloak import KeycloakOpenID
+
+    return KeycloakOpenID(
+        server_url=settings.keycloak_internal_url,
+        realm_name=settings.keycloak_realm,
+        client_id=settings.keycloak_client_id,
+        client_secret_key=settings.keycloak_client_secret,
+        verify=False,
+    )
 
-def get_openid() -> KeycloakOpenID:
-    return keycloak_openid
+
+def get_openid_config() -> dict:
+    return get_openid().well_known()
@@ -1,6 +1,7 @@
+from functools import cache
+
 from sqlalchemy.engine import URL
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlmodel import create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 
 # The database URL is created using the settings from the config file.
 from chris.core.config import settings
@@ -24,33 +25,23 @@ def build_db_url() -> URL:
     )
 
 
-def build_sync_db_url() -> URL:
+@cache
+def get_async_engine() -> AsyncEngine:
     """
-    Build a synchronous SQLAlchemy URL for table creation.
+    The async engine for every database operation. It's created on first use,
+    so importing the app doesn't load the database driver or build a pool.
     """
-    return URL.create(
-        drivername="postgresql+psycopg2",
-        username=settings.db_user,
-        password=settings.db_password,
-        host=settings.db_host,
-        port=settings.db_port,
-        database=settings.db_name,
-    )
-
-
-# Async engine for runtime operations
-async_engine = create_async_engine(
-    build_db_url(), echo=True, pool_size=20, max_overflow=0
-)
-
-# Sync engine for table creation
-sync_engine = create_engine(build_sync_db_url(), echo=True)
+    return create_async_engine(build_db_url(), echo=True, pool_size=20, max_overflow=0)
 
 
 async def get_async_session():
     """
     Dependency that provides an async database session for each request.
     It ensures that the session is always closed after the request is finished.
+
+    Objects aren't expired on commit, since reloading them would need IO that
+    can't happen implicitly with an async session. Handlers can keep using the
+    objects they loaded after committing, e.g. to queue jobs, which commit too.
     """
-    async with AsyncSession(async_engine) as session:
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
         yield session
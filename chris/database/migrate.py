@@ -0,0 +1,177 @@
+"""
+Applying the migrations in `chris.database.migrations`.
+
+Migrations are run by this module's command, once per deploy, before the app
+starts. The app itself never changes the schema: on startup it only checks
+that the database is at the version it expects.
+
+    uv run python -m chris.database.migrate           # apply pending migrations
+    uv run python -m chris.database.migrate --check   # fail if any are pending
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from chris.database.db import get_async_engine
+from chris.database.migrations import (
+    MigrationError,
+    latest_version,
+    load_migrations,
+)
+
+logger = logging.getLogger("migrations")
+
+MIGRATION_LOCK = 4_352_616_001
+"""
+The advisory lock held while migrating, so two deploys starting at once
+don't both apply the same migration.
+"""
+
+CREATE_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER NOT NULL,
+    name VARCHAR(255) NOT NULL,
+    applied_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+    PRIMARY KEY (version)
+)
+"""
+
+
+class SchemaVersionError(RuntimeError):
+    """Raised on startup when the database hasn't been migrated to the version the app needs."""
+
+
+async def current_version(connection: AsyncConnection) -> int:
+    """The latest migration applied to the database, 0 if there are none."""
+    result = await connection.execute(
+        text("SELECT coalesce(max(version), 0) FROM schema_version")
+    )
+    return result.scalar_one()
+
+
+async def migrate() -> list[int]:
+    """
+    Apply every migration the database doesn't have yet, each in its own
+    transaction.
+
+    Returns the versions that were applied.
+    """
+    applied = []
+
+    async with get_async_engine().connect() as connection:
+        await connection.execute(
+            text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK}
+        )
+        await connection.commit()
+
+        try:
+            async with connection.begin():
+                await connection.execute(text(CREATE_VERSION_TABLE))
+                version = await current_version(connection)
+
+            for migration in load_migrations():
+                if migration.version <= version:
+                    continue
+
+                logger.info(
+                    f"Applying migration {migration.version} ({migration.name})"
+                )
+                async with connection.begin():
+                    await migration.upgrade(connection)
+                    await connection.execute(
+                        text(
+                            "INSERT INTO schema_version (version, name) VALUES (:version, :name)"
+                        ),
+                        {"version": migration.version, "name": migration.name},
+                    )
+
+                applied.append(migration.version)
+        finally:
+            await connection.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK}
+            )
+            await connection.commit()
+
+    return applied
+
+
+async def check_schema_version() -> int:
+    """
+    Check the database has every migration this version of the app needs.
+    This is a single query, so it's cheap enough to run on every startup.
+
+    A database that is ahead is allowed, since a deploy migrates before the
+    old processes are replaced. Migrations have to keep working with the
+    previous version of the app for that reason.
+
+    Raises a `SchemaVersionError` if migrations are missing.
+    Returns the database's version.
+    """
+    expected = latest_version()
+
+    async with get_async_engine().connect() as connection:
+        try:
+            version = await current_version(connection)
+        except ProgrammingError as e:
+            raise SchemaVersionError(
+                "The database has never been migrated, run `python -m chris.database.migrate`"
+            ) from e
+
+    if version < expected:
+        raise SchemaVersionError(
+            f"The database is at version {version} but version {expected} is needed, "
+            "run `python -m chris.database.migrate`"
+        )
+
+    if version > expected:
+        logger.warning(
+            f"The database is at version {version}, ahead of this app's {expected}"
+        )
+
+    return version
+
+
+async def main(args: argparse.Namespace) -> int:
+    try:
+        if args.check:
+            try:
+                version = await check_schema_version()
+            except SchemaVersionError as e:
+                logger.error(str(e))
+                return 1
+
+            logger.info(f"The database is up to date at version {version}")
+            return 0
+
+        try:
+            applied = await migrate()
+        except MigrationError as e:
+            logger.error(str(e))
+            return 1
+
+        if applied:
+            logger.info(f"Applied migrations {applied}, now at version {applied[-1]}")
+        else:
+            logger.info(f"Nothing to apply, already at version {latest_version()}")
+
+        return 0
+    finally:
+        await get_async_engine().dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Only check the database is up to date, exiting with 1 if it isn't",
+    )
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,110 @@
+"""
+The schema as it was when migrations were introduced.
+
+Databases from before then were set up by `create_all` and a list of patches at
+startup, so every statement here has to be safe to run against one of those
+too. Whatever they already have is left alone, and anything missing is added.
+"""
+
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import execute_all
+
+STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS "user" (
+        id SERIAL NOT NULL,
+        sub VARCHAR(255) NOT NULL,
+        username VARCHAR(255) NOT NULL,
+        discord_id VARCHAR(255) NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        name VARCHAR(255) NOT NULL,
+        roles JSONB,
+        team_name VARCHAR(255),
+        availability JSONB,
+        shirt_size VARCHAR(10),
+        dietary_restrictions TEXT,
+        notes TEXT,
+        can_take_photos BOOLEAN NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    'CREATE UNIQUE INDEX IF NOT EXISTS ix_user_sub ON "user" (sub)',
+    'CREATE INDEX IF NOT EXISTS ix_user_discord_id ON "user" (discord_id)',
+    'CREATE INDEX IF NOT EXISTS ix_user_email ON "user" (email)',
+    'CREATE INDEX IF NOT EXISTS ix_user_team_name ON "user" (team_name)',
+    'ALTER TABLE "user" ADD COLUMN IF NOT EXISTS avatar_url VARCHAR(255)',
+    'ALTER TABLE "user" ADD COLUMN IF NOT EXISTS avatar_refreshed_at TIMESTAMP WITH TIME ZONE',
+    'CREATE INDEX IF NOT EXISTS ix_user_avatar_refreshed_at ON "user" (avatar_refreshed_at)',
+    """
+    CREATE TABLE IF NOT EXISTS team (
+        id SERIAL NOT NULL,
+        name VARCHAR(64) NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        created_by_id INTEGER,
+        PRIMARY KEY (id),
+        FOREIGN KEY (created_by_id) REFERENCES "user" (id)
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_team_name ON team (name)",
+    "CREATE INDEX IF NOT EXISTS ix_team_created_by_id ON team (created_by_id)",
+    "ALTER TABLE team ADD COLUMN IF NOT EXISTS discord_role_id VARCHAR(255)",
+    """
+    CREATE TABLE IF NOT EXISTS job (
+        id SERIAL NOT NULL,
+        kind VARCHAR(64) NOT NULL,
+        payload JSONB NOT NULL,
+        status VARCHAR(16) NOT NULL,
+        attempts INTEGER NOT NULL,
+        max_attempts INTEGER NOT NULL,
+        run_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        locked_at TIMESTAMP WITH TIME ZONE,
+        last_error TEXT,
+        result JSONB,
+        user_id INTEGER,
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY (user_id) REFERENCES "user" (id) ON DELETE SET NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_job_status_run_at ON job (status, run_at)",
+    "CREATE INDEX IF NOT EXISTS ix_job_kind ON job (kind)",
+    "CREATE INDEX IF NOT EXISTS ix_job_user_id ON job (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS guild_member (
+        guild_id VARCHAR(255) NOT NULL,
+        discord_id VARCHAR(255) NOT NULL,
+        username VARCHAR(255),
+        nick VARCHAR(255),
+        avatar VARCHAR(255),
+        roles JSONB,
+        synced_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        PRIMARY KEY (guild_id, discord_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS discord_worker (
+        worker_id VARCHAR(255) NOT NULL,
+        heartbeat_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        global_blocked_until TIMESTAMP WITH TIME ZONE,
+        PRIMARY KEY (worker_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_discord_worker_heartbeat_at ON discord_worker (heartbeat_at)",
+    """
+    CREATE TABLE IF NOT EXISTS discord_bucket (
+        route VARCHAR(512) NOT NULL,
+        bucket_hash VARCHAR(255) NOT NULL,
+        "limit" INTEGER NOT NULL,
+        remaining INTEGER NOT NULL,
+        resets_at FLOAT NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE NOT NULL,
+        PRIMARY KEY (route)
+    )
+    """,
+]
+
+
+async def upgrade(connection: AsyncConnection) -> None:
+    await execute_all(connection, STATEMENTS)
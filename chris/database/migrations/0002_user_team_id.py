@@ -0,0 +1,48 @@
+"""
+Link users to their team by id instead of by name.
+
+Team names are compared as they're stored, so any that aren't lowercase yet
+are lowercased, then each user's `team_id` is filled in from their team name.
+Users whose team name matches no team are left without one.
+
+Teams whose names only differ by case can't all be lowercased, since names are
+unique. They have different passwords, creators and roles, so they aren't
+merged automatically: the migration stops and lists them, to be renamed or
+merged by hand first.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from . import MigrationError, execute_all
+
+FIND_CASE_DUPLICATES = """
+SELECT lower(name), array_agg(name ORDER BY id)
+FROM team
+GROUP BY lower(name)
+HAVING count(*) > 1
+"""
+
+STATEMENTS = [
+    'ALTER TABLE "user" ADD COLUMN IF NOT EXISTS team_id INTEGER REFERENCES team (id) ON DELETE SET NULL',
+    'CREATE INDEX IF NOT EXISTS ix_user_team_id ON "user" (team_id)',
+    "UPDATE team SET name = lower(name) WHERE name <> lower(name)",
+    """
+    UPDATE "user" SET team_id = team.id, team_name = team.name
+    FROM team
+    WHERE "user".team_id IS NULL AND lower("user".team_name) = team.name
+    """,
+]
+
+
+async def upgrade(connection: AsyncConnection) -> None:
+    result = await connection.execute(text(FIND_CASE_DUPLICATES))
+    duplicates = result.all()
+    if duplicates:
+        conflicts = "; ".join(", ".join(names) for _, names in duplicates)
+        raise MigrationError(
+            "These teams' names only differ by case, so they can't be lowercased. "
+            f"Rename or merge them, then migrate again: {conflicts}"
+        )
+
+    await execute_all(connection, STATEMENTS)
@@ -0,0 +1,79 @@
+"""
+Versioned database migrations.
+
+Each migration is a module in this package named `<version>_<name>.py`, e.g.
+`0002_user_team_id.py`, with an `upgrade` coroutine that is given a connection
+with a transaction open. They're run in version order by
+`python -m chris.database.migrate`, each in its own transaction, and every
+version that was applied is recorded in the `schema_version` table.
+
+A migration that has been released is never edited. Changes to the schema go
+in a new migration with the next version.
+"""
+
+import importlib
+import pkgutil
+import re
+from dataclasses import dataclass
+from functools import cache
+from typing import Awaitable, Callable, Iterable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+MODULE_NAME = re.compile(r"^(\d+)_(\w+)$")
+
+
+class MigrationError(RuntimeError):
+    """Raised by a migration that can't be applied to the data in the database."""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    """Migrations are applied in order of version, starting at 1."""
+
+    name: str
+    """What the migration does, from its module name."""
+
+    upgrade: Callable[[AsyncConnection], Awaitable[None]]
+    """Applies the migration. It's run inside a transaction."""
+
+
+@cache
+def load_migrations() -> tuple[Migration, ...]:
+    """Every migration in this package, in version order."""
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = MODULE_NAME.match(module_info.name)
+        if match is None:
+            continue
+
+        module = importlib.import_module(f"{__name__}.{module_info.name}")
+        migrations.append(
+            Migration(
+                version=int(match.group(1)),
+                name=match.group(2),
+                upgrade=module.upgrade,
+            )
+        )
+
+    migrations.sort(key=lambda migration: migration.version)
+
+    versions = [migration.version for migration in migrations]
+    if versions != list(range(1, len(versions) + 1)):
+        raise RuntimeError(f"Migration versions must count up from 1, got {versions}")
+
+    return tuple(migrations)
+
+
+def latest_version() -> int:
+    """The version the schema is at once every migration has been applied."""
+    migrations = load_migrations()
+    return migrations[-1].version if migrations else 0
+
+
+async def execute_all(connection: AsyncConnection, statements: Iterable[str]) -> None:
+    """Run SQL statements one after the other."""
+    for statement in statements:
+        await connection.execute(text(statement))
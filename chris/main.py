@@ -1,24 +1,64 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 from typing import AsyncGenerator
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import SQLModel
 
 from chris.api.router import router as api_router
-from chris.database.db import sync_engine
-
-
-def create_db_and_tables() -> None:
-    SQLModel.metadata.create_all(sync_engine)
+from chris.core.config import settings
+from chris.database.migrate import check_schema_version
+from chris.services.discord import (
+    REFRESH_AVATARS_JOB,
+    SYNC_MEMBERS_JOB,
+)
+from chris.services.discord.request import AsyncDiscordRequester
+from chris.services.discord.shared_state import run_ratelimit_sync
+from chris.services.jobs import run_job_worker, run_periodic_job
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
-    # on startup
-    create_db_and_tables()
+    # on startup, the schema is migrated separately with `python -m chris.database.migrate`
+    await check_schema_version()
+
+    background_tasks: list[asyncio.Task] = [
+        asyncio.create_task(run_job_worker(settings.job_poll_seconds))
+        for _ in range(settings.job_workers)
+    ]
+    if settings.discord_ratelimit_sync_seconds > 0:
+        background_tasks.append(
+            asyncio.create_task(
+                run_ratelimit_sync(settings.discord_ratelimit_sync_seconds)
+            )
+        )
+    if settings.discord_member_sync_minutes > 0:
+        background_tasks.append(
+            asyncio.create_task(
+                run_periodic_job(
+                    SYNC_MEMBERS_JOB,
+                    {"guild_id": settings.discord_server_id},
+                    settings.discord_member_sync_minutes,
+                )
+            )
+        )
+    if settings.discord_avatar_refresh_minutes > 0:
+        background_tasks.append(
+            asyncio.create_task(
+                run_periodic_job(
+                    REFRESH_AVATARS_JOB, {}, settings.discord_avatar_refresh_minutes
+                )
+            )
+        )
+
     yield
-    # on shutdown - can add cleanup logic here
+    # on shutdown
+    for task in background_tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+    await AsyncDiscordRequester.aclose()
 
 
 app = FastAPI(
@@ -41,6 +81,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(api_router)
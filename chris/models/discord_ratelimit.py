@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import Column, DateTime
+from sqlmodel import Field, SQLModel
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class DiscordWorker(SQLModel, table=True):
+    """
+    A process sending Discord requests. Live processes heartbeat regularly,
+    and the ratelimits are split between everyone that has heartbeat recently.
+    """
+
+    __tablename__ = "discord_worker"
+
+    worker_id: str = Field(primary_key=True, max_length=255)
+    heartbeat_at: datetime = Field(
+        default_factory=_now,
+        sa_column=Column(DateTime(timezone=True), nullable=False, index=True),
+    )
+    global_blocked_until: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime(timezone=True))
+    )
+
+
+class DiscordBucket(SQLModel, table=True):
+    """The last known ratelimit bucket of a route, shared between processes."""
+
+    __tablename__ = "discord_bucket"
+
+    route: str = Field(primary_key=True, max_length=512)
+    bucket_hash: str = Field(max_length=255)
+    limit: int
+    remaining: int
+    resets_at: float
+    """The Unix timestamp when the bucket's window resets, as reported by Discord."""
+    updated_at: datetime = Field(
+        default_factory=_now,
+        sa_column=Column(DateTime(timezone=True), nullable=False),
+    )
@@ -0,0 +1,26 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import Column, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import Field, SQLModel
+
+
+class GuildMember(SQLModel, table=True):
+    """
+    A local copy of a Discord guild member, kept up to date by the member sync.
+    This lets us answer "is this user in the server?" without asking Discord.
+    """
+
+    __tablename__ = "guild_member"
+
+    guild_id: str = Field(primary_key=True, max_length=255)
+    discord_id: str = Field(primary_key=True, max_length=255)
+    username: Optional[str] = Field(default=None, max_length=255)
+    nick: Optional[str] = Field(default=None, max_length=255)
+    avatar: Optional[str] = Field(default=None, max_length=255)
+    roles: list[str] = Field(default_factory=list, sa_column=Column(JSONB))
+    synced_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_column=Column(DateTime(timezone=True), nullable=False),
+    )
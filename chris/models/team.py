@@ -14,4 +14,8 @@ class Team(SQLModel, table=True):
     created_by_id: Optional[int] = Field(
         default=None, foreign_key="user.id", index=True
     )
-    created_by: Optional["User"] = Relationship(back_populates="created_teams")
+    created_by: Optional["User"] = Relationship(
+        back_populates="created_teams",
+        sa_relationship_kwargs={"foreign_keys": "[Team.created_by_id]"},
+    )
+    discord_role_id: Optional[str] = Field(default=None, max_length=255)
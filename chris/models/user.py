@@ -1,6 +1,7 @@
+from datetime import datetime
 from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import Column, Text
+from sqlalchemy import Column, DateTime, Text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlmodel import Field, Relationship, SQLModel
 
@@ -16,6 +17,10 @@ class User(SQLModel, table=True):
     email: str = Field(max_length=255, index=True)
     name: str = Field(max_length=255)
     roles: list[str] = Field(default_factory=list, sa_column=Column(JSONB))
+    team_id: Optional[int] = Field(
+        default=None, foreign_key="team.id", ondelete="SET NULL", index=True
+    )
+    # The team's name, kept alongside `team_id` for display
     team_name: Optional[str] = Field(default=None, index=True, max_length=255)
     availability: Optional[list[str]] = Field(
         default_factory=list, sa_column=Column(JSONB)
@@ -24,6 +29,13 @@ class User(SQLModel, table=True):
     dietary_restrictions: Optional[str] = Field(default=None, sa_column=Column(Text))
     notes: Optional[str] = Field(default=None, sa_column=Column(Text))
     can_take_photos: bool = Field(default=True)
+    avatar_url: Optional[str] = Field(default=None, max_length=255)
+    avatar_refreshed_at: Optional[datetime] = Field(
+        default=None, sa_column=Column(DateTime(timezone=True), index=True)
+    )
 
     # Relationship to teams created by this user
-    created_teams: list["Team"] = Relationship(back_populates="created_by")
+    created_teams: list["Team"] = Relationship(
+        back_populates="created_by",
+        sa_relationship_kwargs={"foreign_keys": "[Team.created_by_id]"},
+    )
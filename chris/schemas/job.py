@@ -0,0 +1,17 @@
+from datetime import datetime
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+
+class JobRead(BaseModel):
+    id: int
+    kind: str
+    status: str
+    attempts: int
+    max_attempts: int
+    run_at: datetime
+    last_error: Optional[str] = None
+    result: Optional[dict[str, Any]] = None
+    created_at: datetime
+    updated_at: datetime
@@ -1,4 +1,5 @@
 import re
+from typing import Optional
 
 from pydantic import BaseModel, Field, validator
 
@@ -46,6 +47,7 @@ class TeamMember(BaseModel):
     username: str
     discord_id: str
     name: str
+    avatar_url: Optional[str] = None
 
 
 class TeamMembers(BaseModel):
@@ -59,3 +61,10 @@ class AdminTeam(BaseModel):
     name: str
     created_by: str
     members: list[TeamMember]
+    discord_role_id: Optional[str] = None
+
+
+class TeamUpdate(BaseModel):
+    discord_role_id: Optional[str] = Field(
+        None, max_length=255, description="The Discord role given to team members"
+    )
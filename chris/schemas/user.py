@@ -1,6 +1,6 @@
 from typing import Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
 from chris.types import AvailabilityOption, ShirtSize
 
@@ -14,3 +14,7 @@ class UserUpdate(BaseModel):
     dietary_restrictions: Optional[str] = None
     notes: Optional[str] = None
     can_take_photos: Optional[bool] = None
+
+
+class DiscordProfileBatch(BaseModel):
+    discord_ids: list[str] = Field(..., max_length=1000)
@@ -1 +1,6 @@
+from .avatars import *  # noqa F403
 from .client import *  # noqa F403
+from .members import *  # noqa F403
+from .roles import *  # noqa F403
+from .shared_state import *  # noqa F403
+from .tasks import *  # noqa F403
@@ -0,0 +1,220 @@
+"""
+Avatar urls stored on the user row.
+
+The frontend shows an avatar for the current user, every team member and every
+user on the staff roster. Rather than asking Discord for each one on every page
+load, avatar urls are saved on `User` and refreshed in the background, a batch
+of the stalest users at a time.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator
+
+from sqlalchemy import or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from chris.core.config import settings
+from chris.models.guild_member import GuildMember
+from chris.models.user import User
+
+from .cache import MISSING
+from .client import get_user_profile, get_user_profile_from_id, profile_cache
+from .request import Priority
+
+__all__ = [
+    "AVATAR_MAX_AGE",
+    "fetch_avatar_urls",
+    "lookup_avatar_urls",
+    "refresh_avatars",
+    "resolve_avatar_urls",
+]
+
+logger = logging.getLogger("discord")
+
+AVATAR_REFRESH_BATCH_SIZE = 50
+"""How many users are refreshed at a time."""
+
+AVATAR_MAX_AGE = timedelta(hours=12)
+"""How long a stored avatar url is trusted before it is refreshed."""
+
+AVATAR_CLAIM_TIMEOUT = timedelta(minutes=5)
+"""
+How long a batch claimed by `refresh_avatars` is left to its worker. If the
+urls haven't been written by then, the batch can be claimed again.
+"""
+
+AVATAR_FETCH_CONCURRENCY = 10
+"""How many avatars are looked up through Discord at once by `fetch_avatar_urls`."""
+
+
+async def _member_avatar_urls(
+    session: AsyncSession, discord_ids: list[str]
+) -> dict[str, str | None]:
+    """Avatar urls for the users in the local member table."""
+    result = await session.execute(
+        select(GuildMember.discord_id, GuildMember.avatar).where(
+            GuildMember.guild_id == settings.discord_server_id,
+            GuildMember.discord_id.in_(discord_ids),  # type: ignore[attr-defined]
+        )
+    )
+
+    return {
+        discord_id: get_user_profile({"id": discord_id, "avatar": avatar})
+        for discord_id, avatar in result.all()
+    }
+
+
+async def lookup_avatar_urls(
+    session: AsyncSession, discord_ids: list[str]
+) -> dict[str, str | None]:
+    """
+    Get the avatar urls we already know for a list of users, without asking Discord.
+    Urls stored on users are used first, then cached profiles, then the local member table.
+
+    Users that couldn't be resolved are left out.
+    """
+    result = await session.execute(
+        select(User.discord_id, User.avatar_url).where(
+            User.discord_id.in_(discord_ids),  # type: ignore[attr-defined]
+            User.avatar_refreshed_at.is_not(None),  # type: ignore[union-attr]
+        )
+    )
+    urls: dict[str, str | None] = dict(result.tuples().all())
+
+    for discord_id in discord_ids:
+        if discord_id not in urls:
+            cached = profile_cache.get(discord_id)
+            if cached is not MISSING:
+                urls[discord_id] = cached
+
+    missing = [discord_id for discord_id in discord_ids if discord_id not in urls]
+    if missing:
+        urls.update(await _member_avatar_urls(session, missing))
+
+    return urls
+
+
+async def fetch_avatar_urls(
+    discord_ids: list[str],
+    concurrency: int = AVATAR_FETCH_CONCURRENCY,
+    priority: Priority = Priority.NORMAL,
+) -> AsyncIterator[tuple[str, str | None]]:
+    """
+    Look up avatar urls through Discord, yielding each one as soon as it arrives.
+    Duplicate ids are only looked up once, and at most `concurrency` lookups run at a time.
+
+    Lookups that fail are logged and left out, so a missing id means we don't
+    know the user's avatar, while `None` means they don't have a custom one.
+
+    The default priority suits a staff member waiting on the results: ahead of
+    background work, but behind logins, which check membership at interactive
+    priority.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(discord_id: str) -> tuple[str, str | None] | None:
+        async with semaphore:
+            try:
+                url = await get_user_profile_from_id(discord_id, priority=priority)
+                return discord_id, url
+            except Exception:
+                logger.exception(f"Failed to fetch the avatar of user `{discord_id}`")
+                return None
+
+    tasks = [
+        asyncio.create_task(fetch(discord_id))
+        for discord_id in dict.fromkeys(discord_ids)
+    ]
+
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            fetched = await next_done
+            if fetched is not None:
+                yield fetched
+    finally:
+        # If the consumer stops early, don't leave lookups running for nobody
+        for task in tasks:
+            task.cancel()
+
+
+async def resolve_avatar_urls(
+    session: AsyncSession, discord_ids: list[str]
+) -> dict[str, str | None]:
+    """
+    Get the avatar urls for a list of users.
+
+    Users in the local member table are resolved from their stored avatar hash,
+    and only the rest are looked up through Discord at background priority.
+    Users whose lookup failed are left out.
+    """
+    urls = await _member_avatar_urls(session, discord_ids)
+
+    missing = [discord_id for discord_id in discord_ids if discord_id not in urls]
+    async for discord_id, url in fetch_avatar_urls(
+        missing, priority=Priority.BACKGROUND
+    ):
+        urls[discord_id] = url
+
+    return urls
+
+
+async def refresh_avatars(
+    session: AsyncSession, batch_size: int = AVATAR_REFRESH_BATCH_SIZE
+) -> int:
+    """
+    Refresh the stored avatar urls of the users that were refreshed longest ago.
+    Users that were never refreshed go first.
+
+    Returns how many users were claimed, including any whose lookup failed.
+    """
+    now = datetime.now(timezone.utc)
+
+    # Rows being claimed by another worker are skipped instead of waited on
+    stale = (
+        select(User.id)  # type: ignore[call-overload]
+        .where(
+            or_(
+                User.avatar_refreshed_at.is_(None),  # type: ignore[union-attr]
+                User.avatar_refreshed_at < now - AVATAR_MAX_AGE,  # type: ignore[operator, arg-type]
+            )
+        )
+        .order_by(User.avatar_refreshed_at.asc().nulls_first())  # type: ignore[union-attr]
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+
+    # Claim the batch by making it look fresh until the claim times out, and
+    # commit before asking Discord so the rows aren't locked while we wait
+    result = await session.execute(
+        update(User)
+        .where(User.id.in_(stale.scalar_subquery()))  # type: ignore[union-attr]
+        .values(avatar_refreshed_at=now - AVATAR_MAX_AGE + AVATAR_CLAIM_TIMEOUT)
+        .returning(User.id, User.discord_id)  # type: ignore[call-overload]
+    )
+    claimed = result.tuples().all()
+    await session.commit()
+    if not claimed:
+        return 0
+
+    urls = await resolve_avatar_urls(session, [discord_id for _, discord_id in claimed])
+
+    # Users whose lookup failed keep their old url, and are claimed again once
+    # their claim times out
+    refreshed_at = datetime.now(timezone.utc)
+    rows = [
+        {
+            "id": user_id,
+            "avatar_url": urls[discord_id],
+            "avatar_refreshed_at": refreshed_at,
+        }
+        for user_id, discord_id in claimed
+        if discord_id in urls
+    ]
+    if rows:
+        await session.execute(update(User), rows)
+        await session.commit()
+
+    return len(claimed)
@@ -0,0 +1,128 @@
+"""
+A small in-process cache for Discord lookups.
+
+Every lookup we answer locally is one less request against Discord's ratelimits,
+so the results of hot lookups (members during login, avatars on the staff page)
+are kept for a short time. Entries expire individually and the least recently
+used entry is evicted once the cache is full.
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+MISSING: Any = object()
+"""Returned by `TTLCache.get` when a key isn't cached. `None` is a valid cached value."""
+
+
+@dataclass
+class CacheStats:
+    """Counters for how well a cache is doing."""
+
+    hits: int = 0
+    """Lookups answered from the cache, including negative entries."""
+
+    misses: int = 0
+    """Lookups that weren't cached or had expired."""
+
+    evictions: int = 0
+    """Entries dropped because the cache was full."""
+
+    expirations: int = 0
+    """Entries dropped because their TTL ran out."""
+
+
+class TTLCache(Generic[K, V]):
+    """
+    A bounded LRU cache where every entry has its own time to live.
+
+    `None` values are treated as negative results (e.g. a 404 from Discord) and
+    are kept for `negative_ttl` instead of `ttl` unless told otherwise.
+    """
+
+    name: str
+    """A name for the cache, used when reporting stats."""
+
+    maxsize: int
+    """The most entries the cache will hold before evicting the least recently used one."""
+
+    ttl: float
+    """The default number of seconds an entry is kept."""
+
+    negative_ttl: float
+    """The default number of seconds a `None` entry is kept."""
+
+    stats: CacheStats
+    """Hit, miss and eviction counts for this cache."""
+
+    def __init__(
+        self, name: str, maxsize: int, ttl: float, negative_ttl: float | None = None
+    ) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.stats = CacheStats()
+
+        self._entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        """Each key's expiry time (monotonic) and value, in least to most recently used order."""
+
+    def get(self, key: K, default: Any = MISSING) -> V | Any:
+        """Get a cached value, or `default` if it isn't cached or has expired."""
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.stats.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        """
+        Cache a value.
+
+        Args:
+            key: The key to cache the value under.
+            value: The value to cache. `None` is cached as a negative result.
+            ttl (float): How many seconds to keep the value for, overriding the default.
+        """
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def invalidate(self, key: K) -> None:
+        """Drop a key from the cache so the next lookup goes to Discord."""
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Drop every entry from the cache."""
+        self._entries.clear()
+
+    def __contains__(self, key: K) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}(name={self.name}, size={len(self)}/{self.maxsize}, stats={self.stats})>"
@@ -1,12 +1,33 @@
 import logging
 from typing import Any
 
-from .request import DiscordRequester
+import httpx
+
+from .cache import MISSING, TTLCache
+from .request import AsyncDiscordRequester, Priority
 
 logger = logging.getLogger("discord")
 
+member_cache: TTLCache[tuple[str, str], dict[str, Any] | None] = TTLCache(
+    "members", maxsize=4096, ttl=300, negative_ttl=30
+)
+"""
+Guild members by (server id, user id). Users who aren't in the server are only
+cached briefly, since they are usually about to join.
+"""
+
+profile_cache: TTLCache[str, str | None] = TTLCache(
+    "profiles", maxsize=8192, ttl=900, negative_ttl=300
+)
+"""Avatar urls by user id. `None` means the user has the default avatar or doesn't exist."""
 
-def get_discord_member(server_id: str, user_id: str) -> dict[str, Any] | None:
+
+async def get_discord_member(
+    server_id: str,
+    user_id: str,
+    priority: Priority = Priority.INTERACTIVE,
+    timeout: float | None = AsyncDiscordRequester.DEFAULT_TIMEOUT,
+) -> dict[str, Any] | None:
     """
     Gets a user's data through the discord API.
 
@@ -14,20 +35,84 @@ def get_discord_member(server_id: str, user_id: str) -> dict[str, Any] | None:
     https://discord.com/developers/docs/resources/guild#guild-member-object
 
     If the user does not exist, then `None` is returned
+
+    If Discord doesn't answer within `timeout` seconds, a `DiscordUnavailableError` is raised.
+
+    Results are cached in `member_cache`, including users that aren't in the server.
     """
 
-    response = DiscordRequester.request(
-        "/guilds/{guild_id}/members/{user_id}", guild_id=server_id, user_id=user_id
+    cached = member_cache.get((server_id, user_id))
+    if cached is not MISSING:
+        return cached
+
+    response = await AsyncDiscordRequester.request(
+        "/guilds/{guild_id}/members/{user_id}",
+        guild_id=server_id,
+        user_id=user_id,
+        priority=priority,
+        timeout=timeout,
     )
 
     if response.status_code == 200:
-        return response.json()
+        member = response.json()
+        member_cache.set((server_id, user_id), member)
+
+        # The member includes the user, so we get their avatar for free
+        if member.get("user"):
+            profile_cache.set(user_id, get_user_profile(member["user"]))
+
+        return member
+    elif response.status_code == 404:
+        member_cache.set((server_id, user_id), None)
+        return None
     else:
         return None
 
 
-def add_user_to_server(
-    server_id: str, user_id: str, access_token: str, roles: list[str] | None = None
+async def list_guild_members(
+    server_id: str,
+    after: str = "0",
+    limit: int = 1000,
+    priority: Priority = Priority.BACKGROUND,
+) -> list[dict[str, Any]]:
+    """
+    Gets a page of a server's members, sorted by user id.
+
+    This needs the privileged GUILD_MEMBERS intent to be enabled for the bot.
+
+    Args:
+        server_id (str): The server to list the members of
+        after (str): Only return members with a user id above this one
+        limit (int): The max amount of members to return, up to 1000
+        priority (Priority): The ratelimit lane to wait in
+
+    Returns a list of Member objects, which is empty once there are no more pages.
+    """
+
+    response = await AsyncDiscordRequester.request(
+        "/guilds/{guild_id}/members",
+        params={"after": after, "limit": limit},
+        guild_id=server_id,
+        priority=priority,
+    )
+
+    if response.status_code == 200:
+        return response.json()
+    else:
+        logger.warning(
+            f"Invalid response code {response.status_code} when listing the members of server `{server_id}`"
+        )
+        response.raise_for_status()
+        return []
+
+
+async def add_user_to_server(
+    server_id: str,
+    user_id: str,
+    access_token: str,
+    roles: list[str] | None = None,
+    priority: Priority = Priority.INTERACTIVE,
+    retry_ratelimits: bool = True,
 ) -> dict[str, Any] | None:
     """
     Joins a user to a discord server. This requires an OAuth access token to work.
@@ -37,19 +122,30 @@ def add_user_to_server(
         user_id (str): The id of the user to add
         access_token (str): The OAuth token from Discord
         roles (list[str]): A list of role ids to give the user on joining
+        priority (Priority): The ratelimit lane to wait in
+        retry_ratelimits (bool): Whether to wait out ratelimits, or raise a
+                                 `DiscordRateLimitError` so the caller can retry later
 
 
-    If the user is new, then the Member data is returned, otherwise None.
+    If the user is new, then the Member data is returned. If they were already
+    in the server, None is returned. Any other response raises an
+    `httpx.HTTPStatusError`, e.g. a 403 when the access token is invalid.
+
+    Any cached membership for the user is dropped, since it's now out of date.
     """
 
-    response = DiscordRequester.request(
+    response = await AsyncDiscordRequester.request(
         "/guilds/{guild_id}/members/{user_id}",
         method="PUT",
         json={"access_token": access_token, "roles": roles or []},
         guild_id=server_id,
         user_id=user_id,
+        priority=priority,
+        retry_ratelimits=retry_ratelimits,
     )
 
+    member_cache.invalidate((server_id, user_id))
+
     if response.status_code == 201:
         # A new member  was created
         return response.json()
@@ -61,7 +157,62 @@ def add_user_to_server(
         logger.warning(
             f"Invalid response code {response.status_code} when joining user `{user_id}` to server `{server_id}` with roles `{roles}`"
         )
-        return None
+        response.raise_for_status()
+        # Any other 2xx isn't an answer we understand either
+        raise httpx.HTTPStatusError(
+            f"Unexpected response code {response.status_code}",
+            request=response.request,
+            response=response,
+        )
+
+
+async def set_member_role(
+    server_id: str,
+    user_id: str,
+    role_id: str,
+    add: bool,
+    priority: Priority = Priority.BACKGROUND,
+    retry_ratelimits: bool = True,
+) -> bool:
+    """
+    Give a role to a server member, or take it away.
+
+    Args:
+        server_id (str): The server the user is in
+        user_id (str): The id of the user
+        role_id (str): The id of the role
+        add (bool): Whether to add the role, otherwise it's removed
+        priority (Priority): The ratelimit lane to wait in
+        retry_ratelimits (bool): Whether to wait out ratelimits, or raise a
+                                 `DiscordRateLimitError` so the caller can retry later
+
+
+    Returns whether the change was made. Server errors raise an `httpx.HTTPStatusError`.
+
+    Any cached membership for the user is dropped, since it's now out of date.
+    """
+
+    response = await AsyncDiscordRequester.request(
+        "/guilds/{guild_id}/members/{user_id}/roles/{role_id}",
+        method="PUT" if add else "DELETE",
+        guild_id=server_id,
+        user_id=user_id,
+        role_id=role_id,
+        priority=priority,
+        retry_ratelimits=retry_ratelimits,
+    )
+
+    member_cache.invalidate((server_id, user_id))
+
+    if response.status_code == 204:
+        return True
+    else:
+        logger.warning(
+            f"Invalid response code {response.status_code} when {'adding' if add else 'removing'} role `{role_id}` for user `{user_id}` in server `{server_id}`"
+        )
+        if response.is_server_error:
+            response.raise_for_status()
+        return False
 
 
 def get_user_profile(user: dict[str, str]) -> str | None:
@@ -85,26 +236,55 @@ def get_user_profile(user: dict[str, str]) -> str | None:
     is_animated = avatar_hash.startswith("a_")
     extension = "gif" if is_animated else "png"
 
-    return f"{DiscordRequester.DISCORD_CDN_BASE}/avatars/{user_id}/{avatar_hash}.{extension}"
+    return f"{AsyncDiscordRequester.DISCORD_CDN_BASE}/avatars/{user_id}/{avatar_hash}.{extension}"
 
 
-def get_user_profile_from_id(user_id: str):
+async def get_user_profile_from_id(
+    user_id: str, priority: Priority = Priority.INTERACTIVE
+) -> str | None:
     """
     Get a user's profile picture from just the id.
     Using the function with the full user object is preferred if possible.
 
     Args:
         user_id (str): The id of the user to get the pfp of.
+        priority (Priority): The ratelimit lane to wait in, e.g. `Priority.BACKGROUND`
+                             for bulk lookups.
 
 
     If the user has a custom pfp, returns the full url.
     If the user has the default discord pfp or is not visible to
     the bot, return None.
+
+    Any other response raises an `httpx.HTTPStatusError`, so a failed lookup
+    isn't mistaken for the user having no pfp.
+
+    Results are cached in `profile_cache`.
     """
 
-    response = DiscordRequester.request("/users/{user_id}", user_id=user_id)
+    cached = profile_cache.get(user_id)
+    if cached is not MISSING:
+        return cached
+
+    response = await AsyncDiscordRequester.request(
+        "/users/{user_id}", user_id=user_id, priority=priority
+    )
 
     if response.status_code == 200:
-        return get_user_profile(response.json())
-    else:
+        url = get_user_profile(response.json())
+        profile_cache.set(user_id, url)
+        return url
+    elif response.status_code == 404:
+        profile_cache.set(user_id, None)
         return None
+    else:
+        logger.warning(
+            f"Invalid response code {response.status_code} when getting the profile of user `{user_id}`"
+        )
+        response.raise_for_status()
+        # Any other 2xx isn't an answer we understand either
+        raise httpx.HTTPStatusError(
+            f"Unexpected response code {response.status_code}",
+            request=response.request,
+            response=response,
+        )
@@ -0,0 +1,187 @@
+"""
+A local copy of the Discord server's member list.
+
+During registration hundreds of people log in within minutes, and every login
+needs to know whether the user is already in the server. Instead of asking
+Discord each time, the member list is paged into the `guild_member` table and
+logins are answered from there. Only users we don't know about yet are looked
+up live, and what we learn is written back.
+"""
+
+import logging
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Iterable
+
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from chris.database.db import get_async_engine
+from chris.models.guild_member import GuildMember
+
+from .client import get_discord_member, list_guild_members
+from .request import AsyncDiscordRequester
+
+__all__ = [
+    "is_guild_member",
+    "sync_guild_members",
+    "upsert_guild_members",
+]
+
+logger = logging.getLogger("discord")
+
+MEMBER_PAGE_SIZE = 1000
+"""The most members Discord will return per page."""
+
+
+def _member_row(guild_id: str, member: dict[str, Any], synced_at: datetime):
+    user = member.get("user") or {}
+
+    return {
+        "guild_id": guild_id,
+        "discord_id": user["id"],
+        "username": user.get("username"),
+        "nick": member.get("nick"),
+        "avatar": user.get("avatar"),
+        "roles": member.get("roles", []),
+        "synced_at": synced_at,
+    }
+
+
+async def upsert_guild_members(
+    session: AsyncSession,
+    guild_id: str,
+    members: Iterable[dict[str, Any]],
+    synced_at: datetime | None = None,
+) -> None:
+    """
+    Write Discord member objects to the local member table.
+    Rows are only rewritten if the member's name, avatar or roles changed.
+
+    Args:
+        session (AsyncSession): The session to write with. It isn't committed
+        guild_id (str): The id of the server the members are in
+        members (Iterable[dict]): Discord member objects
+        synced_at (datetime): When the member sync that saw these members started.
+                              Rows synced before then are stamped with it even if
+                              nothing else changed, so the sync can tell which
+                              members it didn't see
+    """
+    stamp = synced_at or datetime.now(timezone.utc)
+    rows = [_member_row(guild_id, member, stamp) for member in members]
+    if not rows:
+        return
+
+    statement = insert(GuildMember).values(rows)
+    excluded = statement.excluded
+    changed = [
+        GuildMember.username.is_distinct_from(excluded.username),  # type: ignore[union-attr]
+        GuildMember.nick.is_distinct_from(excluded.nick),  # type: ignore[union-attr]
+        GuildMember.avatar.is_distinct_from(excluded.avatar),  # type: ignore[union-attr]
+        GuildMember.roles.is_distinct_from(excluded.roles),  # type: ignore[attr-defined]
+    ]
+    if synced_at is not None:
+        changed.append(GuildMember.synced_at < synced_at)  # type: ignore[arg-type, operator]
+
+    statement = statement.on_conflict_do_update(
+        index_elements=[GuildMember.guild_id, GuildMember.discord_id],
+        set_={
+            "username": excluded.username,
+            "nick": excluded.nick,
+            "avatar": excluded.avatar,
+            "roles": excluded.roles,
+            "synced_at": excluded.synced_at,
+        },
+        where=or_(*changed),
+    )
+    await session.execute(statement)
+
+
+async def _sync_pages(session: AsyncSession, guild_id: str) -> int:
+    run_started = datetime.now(timezone.utc)
+    count = 0
+    after = "0"
+
+    while True:
+        page = await list_guild_members(guild_id, after=after, limit=MEMBER_PAGE_SIZE)
+        if not page:
+            break
+
+        # Each page is committed on its own, so logins can see it straight away
+        # and nothing is left locked while the next page is fetched
+        await upsert_guild_members(session, guild_id, page, synced_at=run_started)
+        await session.commit()
+        count += len(page)
+
+        if len(page) < MEMBER_PAGE_SIZE:
+            break
+
+        # Members are sorted by user id, so the last one is our cursor
+        after = page[-1]["user"]["id"]
+
+    if count:
+        # Every member this run saw was stamped with its start time, and members
+        # found by logins during it were stamped later, so the rest have left
+        await session.execute(
+            delete(GuildMember).where(
+                GuildMember.guild_id == guild_id,  # type: ignore[arg-type]
+                GuildMember.synced_at < run_started,  # type: ignore[arg-type]
+            )
+        )
+        await session.commit()
+
+    return count
+
+
+async def sync_guild_members(session: AsyncSession, guild_id: str) -> int | None:
+    """
+    Page through every member of a server and bring the local table up to date.
+    Members that left the server since the last sync are removed.
+
+    Only one process syncs at a time. If another one already is, nothing is done
+    and `None` is returned, otherwise the number of members seen is returned.
+    """
+    lock_key = zlib.crc32(f"guild_member_sync:{guild_id}".encode())
+
+    # The lock is held on its own connection for the whole sync, since the
+    # session gives its connection back to the pool every time it commits
+    async with get_async_engine().connect() as lock_connection:
+        got_lock = await lock_connection.scalar(
+            select(func.pg_try_advisory_lock(lock_key))
+        )
+        await lock_connection.commit()
+        if not got_lock:
+            return None
+
+        try:
+            return await _sync_pages(session, guild_id)
+        finally:
+            await lock_connection.execute(select(func.pg_advisory_unlock(lock_key)))
+            await lock_connection.commit()
+
+
+async def is_guild_member(
+    session: AsyncSession,
+    guild_id: str,
+    discord_id: str,
+    timeout: float | None = AsyncDiscordRequester.DEFAULT_TIMEOUT,
+) -> bool:
+    """
+    Check if a user is in a server, using the local member table when possible.
+
+    Users that aren't in the table may have joined since the last sync, so they
+    are looked up live and added to the table if they turn out to be members.
+    The live lookup raises a `DiscordUnavailableError` if Discord doesn't
+    answer within `timeout` seconds.
+    """
+    if await session.get(GuildMember, (guild_id, discord_id)) is not None:
+        return True
+
+    member = await get_discord_member(guild_id, discord_id, timeout=timeout)
+    if member is None:
+        return False
+
+    await upsert_guild_members(session, guild_id, [member])
+    await session.commit()
+    return True
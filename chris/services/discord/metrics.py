@@ -0,0 +1,231 @@
+"""
+In-process metrics for the Discord client.
+
+Counters and histograms are plain Python objects updated inline as requests
+are made, so they cost next to nothing to keep. They can be read as dicts for
+the staff API, or rendered in the Prometheus text format for scraping.
+"""
+
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Mapping
+
+DEFAULT_BOUNDS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+"""Histogram bucket bounds in seconds, from fast responses to long ratelimit waits."""
+
+RATELIMIT_SCOPES = ("global", "resource", "endpoint")
+
+
+class Histogram:
+    """A fixed-bucket histogram of durations in seconds."""
+
+    bounds: tuple[float, ...]
+    """The upper bound of each bucket. Values above the last bound are only counted in `count`."""
+
+    counts: list[int]
+    """How many observations fell into each bucket (not cumulative)."""
+
+    count: int
+    """How many values were observed."""
+
+    sum: float
+    """The total of every observed value."""
+
+    def __init__(self, bounds: Iterable[float] = DEFAULT_BOUNDS) -> None:
+        self.bounds = tuple(sorted(bounds))
+        self.counts = [0] * len(self.bounds)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record a value."""
+        index = bisect_left(self.bounds, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> dict[str, Any]:
+        """The histogram as a dict, with cumulative bucket counts like Prometheus."""
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+
+        return {"count": self.count, "sum": self.sum, "buckets": buckets}
+
+    def render(self, name: str, help: str) -> list[str]:
+        """The histogram in the Prometheus text format."""
+        lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+
+        lines.append(f'{name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum {self.sum}")
+        lines.append(f"{name}_count {self.count}")
+        return lines
+
+
+def render_metric(
+    name: str,
+    help: str,
+    kind: str,
+    values: Mapping[str, float] | float,
+    label: str | None = None,
+) -> list[str]:
+    """
+    A counter or gauge in the Prometheus text format.
+
+    Args:
+        name (str): The metric name
+        help (str): A description of the metric
+        kind (str): `counter` or `gauge`
+        values (Mapping[str, float] | float): A single value, or a value per label value
+        label (str): The label name, if `values` is a mapping
+    """
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+
+    if isinstance(values, Mapping):
+        for label_value, value in values.items():
+            lines.append(f'{name}{{{label}="{label_value}"}} {value}')
+    else:
+        lines.append(f"{name} {values}")
+
+    return lines
+
+
+@dataclass
+class RequestMetrics:
+    """Counters and timings for requests made to Discord."""
+
+    requests: int = 0
+    """Requests sent to Discord, including retries."""
+
+    retries: int = 0
+    """Requests that were sent again after a 429."""
+
+    errors: int = 0
+    """Requests that failed without a response, e.g. timeouts and connection errors."""
+
+    ratelimits: dict[str, int] = field(
+        default_factory=lambda: dict.fromkeys(RATELIMIT_SCOPES, 0)
+    )
+    """429s received, by which limit was hit."""
+
+    bucket_locks: int = 0
+    """How many times a bucket was put on cooldown, either pre-emptively or after a 429."""
+
+    deadlines: int = 0
+    """Calls that ran out of time, whether waiting on ratelimits or on Discord."""
+
+    short_circuited: int = 0
+    """Calls refused without being sent, because the circuit breaker was open."""
+
+    statuses: dict[str, int] = field(default_factory=dict)
+    """Responses received, by status class (`2xx`, `4xx`, ...)."""
+
+    queue_wait: Histogram = field(default_factory=Histogram)
+    """Seconds spent waiting on bucket and global ratelimits before each request was sent."""
+
+    upstream_latency: Histogram = field(default_factory=Histogram)
+    """Seconds Discord took to respond to each request."""
+
+    def observe_status(self, status_code: int) -> None:
+        key = f"{status_code // 100}xx"
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "errors": self.errors,
+            "ratelimits": dict(self.ratelimits),
+            "bucket_locks": self.bucket_locks,
+            "deadlines": self.deadlines,
+            "short_circuited": self.short_circuited,
+            "statuses": dict(self.statuses),
+            "queue_wait": self.queue_wait.snapshot(),
+            "upstream_latency": self.upstream_latency.snapshot(),
+        }
+
+    def render(self, prefix: str = "discord") -> list[str]:
+        """Every metric in the Prometheus text format."""
+        return [
+            *render_metric(
+                f"{prefix}_requests_total",
+                "Requests sent to Discord, including retries.",
+                "counter",
+                self.requests,
+            ),
+            *render_metric(
+                f"{prefix}_retries_total",
+                "Requests sent again after a 429.",
+                "counter",
+                self.retries,
+            ),
+            *render_metric(
+                f"{prefix}_errors_total",
+                "Requests that failed without a response.",
+                "counter",
+                self.errors,
+            ),
+            *render_metric(
+                f"{prefix}_ratelimits_total",
+                "429 responses, by the limit that was hit.",
+                "counter",
+                self.ratelimits,
+                label="scope",
+            ),
+            *render_metric(
+                f"{prefix}_bucket_locks_total",
+                "Times a ratelimit bucket was put on cooldown.",
+                "counter",
+                self.bucket_locks,
+            ),
+            *render_metric(
+                f"{prefix}_deadlines_exceeded_total",
+                "Calls that ran out of time before Discord answered.",
+                "counter",
+                self.deadlines,
+            ),
+            *render_metric(
+                f"{prefix}_short_circuited_total",
+                "Calls refused because the circuit breaker was open.",
+                "counter",
+                self.short_circuited,
+            ),
+            *render_metric(
+                f"{prefix}_responses_total",
+                "Responses received, by status class.",
+                "counter",
+                self.statuses,
+                label="status",
+            ),
+            *self.queue_wait.render(
+                f"{prefix}_queue_wait_seconds",
+                "Time spent waiting on ratelimits before a request was sent.",
+            ),
+            *self.upstream_latency.render(
+                f"{prefix}_upstream_latency_seconds",
+                "Time Discord took to respond.",
+            ),
+        ]
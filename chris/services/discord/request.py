@@ -21,36 +21,99 @@ Rate limit code from `interactions.py` was used as a reference:
 https://github.com/interactions-py/interactions.py/blob/stable/interactions/api/http/http_client.py
 """
 
+import asyncio
+import heapq
+import itertools
 import logging
+import math
 import threading
 import time
-from typing import ClassVar, Mapping
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, ClassVar, Hashable, Mapping
 
-import requests
+import httpx
 
 from chris.core.config import settings
 
+from .metrics import RequestMetrics, render_metric
+
 logger = logging.getLogger("discord")
 
 
-class GlobalLock:
+class Priority(IntEnum):
     """
-    A global lock for the total amount of Discord requests per second.
-    Discord enforces a limit of 50/second, but our limit should be just
-    underneath that to avoid accidentally hitting it when possible.
+    Lanes for requests waiting on a ratelimit. When requests are queued,
+    lower values are always let through first.
     """
 
-    available_requests: int
-    """The number of requests that can be made before the next reset period."""
+    INTERACTIVE = 0
+    """A user is waiting on the response, e.g. the membership check during login."""
 
-    reset_at: float
-    """The Unix timestamp when the requests per second refreshes."""
+    NORMAL = 1
+    """The default for requests that don't say otherwise."""
 
-    _lock: threading.Lock
+    BACKGROUND = 2
+    """Bulk work nobody is waiting on, e.g. profile prefetches and role syncs."""
+
+
+class PriorityWaiters:
+    """A queue of waiting requests, ordered by priority and then by arrival."""
+
+    def __init__(self) -> None:
+        self._heap: list[tuple[int, int, asyncio.Future[None]]] = []
+        self._counter = itertools.count()
+
+    def push(self, priority: Priority) -> asyncio.Future[None]:
+        """Queue a new waiter. The returned future is resolved when it's let through."""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._counter), future))
+        return future
+
+    def pop(self) -> asyncio.Future[None] | None:
+        """Take the next waiter that is still waiting, if there is one."""
+        while self._heap:
+            _, _, future = heapq.heappop(self._heap)
+            if not future.done():
+                return future
+
+        return None
+
+    def __bool__(self) -> bool:
+        # Waiters that were cancelled are dropped lazily
+        while self._heap and self._heap[0][2].done():
+            heapq.heappop(self._heap)
+
+        return bool(self._heap)
+
+    def __len__(self) -> int:
+        return sum(1 for _, _, future in self._heap if not future.done())
+
+
+class GlobalRateLimiter:
     """
-    A lock to keep the available requests consistent across threads.
+    A token bucket for the total amount of Discord requests per second.
+    Discord enforces a limit of 50/second, but our limit should be just
+    underneath that to avoid accidentally hitting it when possible.
+
+    Tokens refill continuously, so requests are spread out instead of bursting
+    at the start of every second. Waiting requests are parked on the event loop
+    and let through in priority order as tokens become available.
     """
 
+    rate: float
+    """How many tokens are added per second."""
+
+    capacity: float
+    """The most tokens that can be saved up for a burst."""
+
+    tokens: float
+    """The number of requests that can be made right now."""
+
+    blocked_until: float
+    """The monotonic time until which no requests may be made, set by a global 429."""
+
     MAX_REQUESTS: ClassVar[int] = 45
     """
     The maximum amount of requests that can be made per second.
@@ -58,15 +121,53 @@ class GlobalLock:
     will be very frequent.
     """
 
-    def __init__(self) -> None:
-        self.available_requests = self.MAX_REQUESTS
-        self.reset_at = time.time()
-        self._lock = threading.Lock()
+    def __init__(self, rate: float = MAX_REQUESTS, capacity: float = MAX_REQUESTS):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.blocked_until = 0.0
+
+        self._refilled_at = time.monotonic()
+        self._waiters = PriorityWaiters()
+        self._wakeup: asyncio.TimerHandle | None = None
+
+    def _take(self) -> bool:
+        """Use up a token if one is available."""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return False
+
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._refilled_at) * self.rate
+        )
+        self._refilled_at = now
+
+        if self.tokens < 1:
+            return False
+
+        self.tokens -= 1
+        return True
 
-    def _reset(self):
-        """Restore the available requests for this second."""
-        self.available_requests = self.MAX_REQUESTS
-        self.reset_at = time.time() + 1
+    def _dispatch(self):
+        """Let through as many waiters as we have tokens for."""
+        self._wakeup = None
+
+        while self._waiters and self._take():
+            future = self._waiters.pop()
+            if future is not None:
+                future.set_result(None)
+
+        if self._waiters:
+            self._schedule()
+
+    def _schedule(self):
+        """Wake up once the next token is available."""
+        if self._wakeup is not None:
+            return
+
+        now = time.monotonic()
+        delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0)
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
 
     def set_reset_time(self, delta: float):
         """
@@ -76,24 +177,44 @@ class GlobalLock:
         Args:
             delta (float): The time in seconds to wait.
         """
-        self.reset_at = time.time() + delta
-        self.available_requests = 0
+        self.blocked_until = time.monotonic() + delta
+        self.tokens = 0
 
-    def wait(self):
-        """Check that we have more requests available before sending a new one."""
-        with self._lock:
-            # Enough time has passed to give us more calls
-            if self.reset_at <= time.time():
-                self._reset()
+    def set_rate(self, rate: float):
+        """
+        Change how many requests per second are allowed, e.g. when the global
+        limit is split between several processes.
 
-            # All the available calls have been spent,
-            # so we need to wait for more
-            if self.available_requests <= 0:
-                time.sleep(self.reset_at - time.time())
-                self._reset()
+        Args:
+            rate (float): The new number of requests per second.
+        """
+        self.rate = rate
+        self.capacity = rate
+        self.tokens = min(self.tokens, self.capacity)
+
+    def snapshot(self) -> dict[str, float | int]:
+        """The limiter's current state, for metrics."""
+        return {
+            "tokens": round(self.tokens, 2),
+            "blocked_for": max(self.blocked_until - time.monotonic(), 0),
+            "waiting": len(self._waiters),
+        }
+
+    async def acquire(self, priority: Priority = Priority.NORMAL):
+        """Wait until we're under the global limit before sending a new request."""
+        if not self._waiters and self._take():
+            return
 
-        # Use up a call
-        self.available_requests -= 1
+        future = self._waiters.push(priority)
+        self._schedule()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # We were handed a token but can't use it, so give it back
+                self.tokens = min(self.capacity, self.tokens + 1)
+            raise
 
 
 class Bucket:
@@ -106,13 +227,31 @@ class Bucket:
     """The max amount of requests that the bucket can do before requiring a cooldown."""
 
     remaining: int
-    """The current amount of requests that the bucket can do before requiring a cooldown."""
+    """
+    The current amount of requests that the bucket can do before requiring a cooldown.
+    This is counted down as requests are sent, and corrected by the headers of each response.
+    """
 
-    resets_at: int
+    resets_at: float
     """The Unix timestamp when the bucket will finish cooling down."""
 
-    routes: list[str]
-    """All of the routes that this bucket applies to. This should be empty if a temporary bucket is made."""
+    cooldown_until: float
+    """The monotonic time until which requests for this bucket are held back."""
+
+    routes: set[str]
+    """All of the routes that this bucket applies to."""
+
+    share: int
+    """
+    How many processes are sending requests from this bucket. Each one only
+    uses its part of the limit, so together they stay under it.
+    """
+
+    rank: int
+    """
+    This process's place among the `share` processes. When the limit doesn't
+    split evenly, the processes ranked first get one request more.
+    """
 
     DEFAULT_LIMIT = 1
     DEFAULT_REMAINING = 1
@@ -123,25 +262,34 @@ class Bucket:
         hash: str | None = None,
         limit: int = DEFAULT_LIMIT,
         remaining: int = DEFAULT_REMAINING,
-        resets_at: int = DEFAULT_RESETS_AT,
+        resets_at: float = DEFAULT_RESETS_AT,
     ) -> None:
         self.hash = hash
         self.limit = limit
         self.remaining = remaining
         self.resets_at = resets_at
+        self.cooldown_until = 0.0
 
-        self.routes = []
+        self.routes = set()
+        self.share = 1
+        self.rank = 0
 
-        self._lock = threading.Lock()
-        """A lock to enforce the cooldown for a ratelimit. While it is held, all requests for this route are blocked."""
-
-        self._semaphor = threading.Semaphore(limit) if limit else None
+        self._in_flight = 0
         """
-        A semaphor to prevent having more requests in flight than a bucket can support.
-        Without this, a bucket with a limit of 5 could send 6 requests before recieving a response,
-        which would hit a 429.
+        How many requests are currently in flight. This is kept at or under the limit,
+        since without it a bucket with a limit of 5 could send 6 requests before recieving
+        a response, which would hit a 429.
         """
 
+        self._waiters = PriorityWaiters()
+        """Requests waiting for a free slot in the bucket."""
+
+        self._cooling_down = False
+        """Whether the bucket ran out and is waiting for its window to reset."""
+
+        self._wakeup: asyncio.TimerHandle | None = None
+        """A timer to let waiters through once a cooldown is over."""
+
     @classmethod
     def from_headers(cls, headers: Mapping[str, str], route: str | None = None):
         """
@@ -154,11 +302,11 @@ class Bucket:
             hash=headers.get("X-RateLimit-Bucket"),
             limit=int(headers.get("X-RateLimit-Limit", cls.DEFAULT_LIMIT)),
             remaining=int(headers.get("X-RateLimit-Remaining", cls.DEFAULT_REMAINING)),
-            resets_at=int(headers.get("X-RateLimit-Reset", cls.DEFAULT_RESETS_AT)),
+            resets_at=float(headers.get("X-RateLimit-Reset", cls.DEFAULT_RESETS_AT)),
         )
 
         if route:
-            bucket.routes.append(route)
+            bucket.routes.add(route)
 
         return bucket
 
@@ -172,90 +320,467 @@ class Bucket:
 
         self.hash = headers.get("X-RateLimit-Bucket", self.hash)
 
-        self.remaining = int(headers.get("X-RateLimit-Remaining", self.remaining))
+        resets_at = float(headers.get("X-RateLimit-Reset", self.resets_at))
 
-        self.resets_at = int(headers.get("X-RateLimit-Reset", self.resets_at))
+        if "X-RateLimit-Remaining" in headers:
+            # The other requests in flight will use up some of what Discord says is left
+            remaining = max(
+                self.share_of(int(headers["X-RateLimit-Remaining"]))
+                - max(self._in_flight - 1, 0),
+                0,
+            )
 
-        # Limit is special since we need to update the semaphor
-        limit = int(headers.get("X-RateLimit-Limit", self.limit))
+            # Responses can arrive out of order, so within a window only ever count down
+            if resets_at == self.resets_at:
+                remaining = min(remaining, self.remaining)
+
+            self.remaining = remaining
 
-        if not self._semaphor or limit != self.limit:
-            self._semaphor = threading.Semaphore(limit)
+        self.resets_at = resets_at
+
+        limit = int(headers.get("X-RateLimit-Limit", self.limit))
+        if limit != self.limit:
             self.limit = limit
+            self._admit()
 
-        if route and route not in self.routes:
-            self.routes.append(route)
+        if route:
+            self.routes.add(route)
 
-    def aquire(self):
+    @property
+    def is_split(self) -> bool:
         """
-        Aquire the internal semaphor. This blocks until a request is ready to be made.
-
-        Using `with bucket:` is preferred, as that will guarantee the semaphor is released.
+        Whether every process has a part of the limit to itself. A limit smaller
+        than the number of processes can't be split without leaving some of them
+        unable to send at all, so they all fall back to the count Discord reports.
         """
+        return self.limit >= self.share
 
-        if self._semaphor is None:
-            # We don't have a limit on requests yet
-            return
+    def share_of(self, total: int) -> int:
+        """
+        This process's part of `total` requests. The parts of every process add
+        up to `total`, with the remainder going to the processes ranked first.
+        """
+        if not self.is_split:
+            return total
 
-        # Check if we're on cooldown. If so, wait for it to end
-        if self._lock.locked():
-            with self._lock:
-                pass
+        return total // self.share + (1 if self.rank < total % self.share else 0)
 
-        self._semaphor.acquire()
+    @property
+    def local_limit(self) -> int:
+        """
+        The part of the limit this process may use.
 
-    def release(self):
-        """Release the internal semaphor. This will not affect the cooldown lock."""
+        When the limit isn't split, this process only keeps one request in flight,
+        and relies on the remaining count in Discord's responses, which every
+        process counts down. Processes that send at the same moment can still go
+        over the limit together, but the 429s are retried after the reset.
+        """
+        if not self.is_split:
+            return 1
+
+        return self.share_of(self.limit)
+
+    def _has_capacity(self) -> bool:
+        """Whether another request can be sent without going over the ratelimit."""
+        if self._in_flight >= self.local_limit:
+            return False
+
+        if self.cooldown_until > time.monotonic():
+            return False
+
+        if self._cooling_down:
+            # The cooldown is over, so the window has reset
+            self._cooling_down = False
+            self.remaining = self.local_limit
+
+        # When we're out of requests, the responses still in flight will tell us
+        # when the window resets. With nothing in flight we'd never find out,
+        # so one request is let through to ask
+        return self.remaining > 0 or self._in_flight == 0
+
+    def _reserve(self):
+        """Take a slot and count the request against the window."""
+        self._in_flight += 1
+        self.remaining = max(self.remaining - 1, 0)
+
+    def _admit(self):
+        """Hand out free slots to waiting requests, highest priority first."""
+        while self._waiters and self._has_capacity():
+            future = self._waiters.pop()
+            if future is not None:
+                self._reserve()
+                future.set_result(None)
+
+        # Nothing will release a slot during a cooldown, so wake up once it's over
+        delay = self.cooldown_until - time.monotonic()
+        if self._waiters and delay > 0 and self._wakeup is None:
+            self._wakeup = asyncio.get_running_loop().call_later(delay, self._on_wakeup)
+
+    def _on_wakeup(self):
+        self._wakeup = None
+        self._admit()
+
+    async def acquire(self, priority: Priority = Priority.NORMAL):
+        """
+        Wait until a request is ready to be made, then take a slot in the bucket.
 
-        if self._semaphor is None:
+        Using `async with bucket.slot():` is preferred, as that will guarantee the slot is released.
+        """
+        if not self._waiters and self._has_capacity():
+            self._reserve()
             return
 
-        self._semaphor.release()
+        future = self._waiters.push(priority)
+        self._admit()
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # We were handed a slot but can't use it
+                self.release()
+            raise
+
+    def release(self):
+        """Release a slot in the bucket. This will not affect the cooldown."""
+        self._in_flight -= 1
+        self._admit()
 
-    def lock_for(self, delta: float, block: bool = False):
+    def lock_for(self, delta: float):
         """
         Stop requests made from this bucket until after some seconds have passed.
         This is used when we're out of requests on a ratelimit and need to cool down.
 
+        Waiting requests are let through once the cooldown is over, with the
+        bucket's full limit available again.
+
         Args:
-            delta (int): How many seconds to wait.
-            block (bool): Whether to wait until the lock is released.
+            delta (float): How many seconds to wait.
         """
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + delta)
+        self.remaining = 0
+        self._cooling_down = True
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.NORMAL):
+        await self.acquire(priority)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def snapshot(self) -> dict:
+        """The bucket's current state, for metrics."""
+        return {
+            "hash": self.hash,
+            "limit": self.limit,
+            "local_limit": self.local_limit,
+            "remaining": self.remaining,
+            "in_flight": self._in_flight,
+            "waiting": len(self._waiters),
+            "cooldown": max(self.cooldown_until - time.monotonic(), 0),
+            "routes": sorted(self.routes),
+        }
 
-        if self._lock.locked():
-            # Another thread already started the cooldown
-            if block:
-                # We still want to wait for it to finish
-                with self._lock:
-                    pass
+    def __repr__(self):
+        return f"<{self.__class__.__name__}(hash={self.hash}, limit={self.limit}, remaining={self.remaining})>"
 
-        self._lock.acquire()
 
-        def _unlock():
-            logger.debug(f"Unlocking bucket {self.hash}")
-            self._lock.release()
+class BucketRegistry:
+    """
+    An index of every bucket we've encountered.
 
-        if block:
-            time.sleep(delta)
-            _unlock()
-        else:
-            threading.Timer(delta, _unlock).start()
+    Buckets are looked up by route, and also by the `X-RateLimit-Bucket` hash Discord
+    reports, so every route that shares a hash shares a single `Bucket` object.
+    Lookups and updates are constant time and guarded by a lock.
+    """
 
-    def __enter__(self):
-        self.aquire()
+    _by_route: dict[str, Bucket]
+    """The bucket each route currently belongs to."""
 
-    def __exit__(self, exc_type, exc_value, traceback):
-        self.release()
+    _by_hash: dict[str, Bucket]
+    """The bucket for each hash Discord has reported."""
 
-    def __repr__(self):
-        return f"<{self.__class__.__name__}(hash={self.hash}, limit={self.limit}, remaining={self.remaining})>"
+    _lock: threading.Lock
+    """
+    A lock to keep both indexes consistent. Nothing awaits while holding it,
+    so it is safe to use from both tasks and threads.
+    """
+
+    share: int
+    """How many processes share every bucket's limit, see `Bucket.share`."""
+
+    rank: int
+    """This process's place among the processes, see `Bucket.rank`."""
+
+    def __init__(self) -> None:
+        self._by_route = {}
+        self._by_hash = {}
+        self._lock = threading.Lock()
+        self.share = 1
+        self.rank = 0
+
+    def get(self, route: str) -> Bucket | None:
+        """Get the bucket for a route, if we've seen the route before."""
+        return self._by_route.get(route)
+
+    def get_or_create(self, route: str) -> Bucket:
+        """
+        Get the bucket for a route, or start a temporary one if we haven't seen it.
+
+        The temporary bucket only lets one request through at a time, and is
+        registered so that concurrent first requests to a route queue on it
+        instead of all going out before we know the route's limit.
+        """
+        with self._lock:
+            bucket = self._by_route.get(route)
+            if bucket is None:
+                bucket = self._by_route[route] = Bucket()
+                bucket.routes.add(route)
+                self._split(bucket)
+
+            return bucket
+
+    def update(self, route: str, headers: Mapping[str, str]) -> Bucket:
+        """
+        Update the bucket for a route from discord headers, creating it if needed.
+
+        If Discord reports a hash we already know, the route is moved onto that
+        bucket so the ratelimit is tracked in one place.
+        """
+        bucket_hash = headers.get("X-RateLimit-Bucket")
+
+        with self._lock:
+            bucket = self._by_route.get(route)
+            shared = self._by_hash.get(bucket_hash) if bucket_hash else None
+
+            if shared is not None:
+                # Another route already uses this hash, so join its bucket
+                if bucket is not None and bucket is not shared:
+                    bucket.routes.discard(route)
+                bucket = shared
+
+            elif bucket is None or (
+                bucket_hash and bucket.hash and bucket.hash != bucket_hash
+            ):
+                # A route we haven't seen, or Discord moved it to a new bucket
+                if bucket is not None:
+                    bucket.routes.discard(route)
+                bucket = Bucket.from_headers(headers)
+                self._split(bucket)
+
+            bucket.update_from_headers(headers, route)
+
+            self._by_route[route] = bucket
+            if bucket.hash:
+                self._by_hash[bucket.hash] = bucket
+
+            return bucket
+
+    def restore(
+        self, route: str, bucket_hash: str, limit: int, remaining: int, resets_at: float
+    ) -> Bucket | None:
+        """
+        Learn a route's bucket from somewhere other than a response, e.g. the state
+        another process saved. Routes we already know are left alone, since our
+        own responses are more up to date.
+
+        If the bucket was out of requests and its window hasn't reset yet,
+        it starts out cooling down.
+        """
+        with self._lock:
+            if route in self._by_route:
+                return None
+
+            bucket = self._by_hash.get(bucket_hash)
+            if bucket is None:
+                reset_after = resets_at - time.time()
+                if reset_after <= 0:
+                    # The saved window is over, so the whole limit is available
+                    remaining = limit
+
+                bucket = Bucket(bucket_hash, limit, remaining, resets_at)
+                self._split(bucket)
+                bucket.remaining = bucket.share_of(remaining)
+                self._by_hash[bucket_hash] = bucket
+
+                if remaining <= 0:
+                    bucket.lock_for(reset_after)
+
+            bucket.routes.add(route)
+            self._by_route[route] = bucket
+
+            return bucket
+
+    def _split(self, bucket: Bucket):
+        bucket.share = self.share
+        bucket.rank = self.rank
+
+    def set_share(self, share: int, rank: int = 0):
+        """
+        Split every bucket's limit between `share` processes, see `Bucket.share`.
+
+        Args:
+            share (int): How many processes are sending requests.
+            rank (int): This process's place among them, from 0 to `share - 1`.
+        """
+        with self._lock:
+            self.share = max(share, 1)
+            self.rank = min(max(rank, 0), self.share - 1)
+            for bucket in self._by_route.values():
+                self._split(bucket)
+
+    def __iter__(self):
+        with self._lock:
+            buckets = {id(bucket): bucket for bucket in self._by_route.values()}
+
+        return iter(buckets.values())
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+
+class DiscordRateLimitError(Exception):
+    """
+    Raised when a request is ratelimited and the caller asked not to wait it out,
+    e.g. so a background job can be rescheduled instead of holding a worker.
+    """
+
+    retry_after: float
+    """How many seconds Discord asked us to wait before retrying."""
+
+    scope: str
+    """Which limit was hit: `global`, `resource` or `endpoint`."""
+
+    def __init__(self, retry_after: float, scope: str) -> None:
+        super().__init__(
+            f"Discord {scope} ratelimit reached, retry after {retry_after} seconds"
+        )
+        self.retry_after = retry_after
+        self.scope = scope
+
+
+class DiscordUnavailableError(Exception):
+    """
+    Raised when Discord doesn't answer in time: the request's deadline ran out,
+    or the connection failed or timed out.
+    """
 
 
-class DiscordRequester:
+class DiscordCircuitOpenError(DiscordUnavailableError):
+    """
+    Raised without sending anything while the circuit breaker is open,
+    since Discord has been failing and the request would most likely fail too.
+    """
+
+    retry_after: float
+    """How many seconds until the breaker lets a trial request through."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(
+            f"Discord is unavailable, retry after {retry_after:.1f} seconds"
+        )
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to Discord for a while once it fails repeatedly,
+    so callers fail fast instead of each waiting out their own timeout.
+
+    Timeouts, connection errors and 5xx responses count as failures, while any
+    other response (including a 429) shows Discord is up. After `threshold`
+    failures in a row the circuit opens and requests are refused for `cooldown`
+    seconds. Then one trial request is let through per cooldown, and the first
+    one to succeed closes the circuit again.
+    """
+
+    threshold: int
+    """How many failures in a row open the circuit."""
+
+    cooldown: float
+    """How many seconds to refuse requests for before letting a trial through."""
+
+    failures: int
+    """How many requests have failed in a row."""
+
+    open_until: float
+    """The monotonic time when the next trial request is let through."""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return self.failures >= self.threshold
+
+    @property
+    def retry_after(self) -> float:
+        """How many seconds until a trial request is let through."""
+        return max(self.open_until - time.monotonic(), 0)
+
+    def allow(self) -> bool:
+        """Whether a request may be sent right now."""
+        if not self.is_open:
+            return True
+
+        now = time.monotonic()
+        if now < self.open_until:
+            return False
+
+        # Let this request through as a trial, and hold the rest back for another cooldown
+        self.open_until = now + self.cooldown
+        return True
+
+    def record_success(self):
+        if self.is_open:
+            logger.info("Discord is responding again, closing the circuit breaker.")
+
+        self.failures = 0
+        self.open_until = 0.0
+
+    def record_failure(self):
+        self.failures += 1
+
+        if self.failures == self.threshold:
+            logger.warning(
+                f"Discord failed {self.failures} requests in a row! Refusing requests for {self.cooldown} seconds."
+            )
+
+        if self.is_open:
+            self.open_until = time.monotonic() + self.cooldown
+
+    def snapshot(self) -> dict[str, float | int | bool]:
+        """The breaker's current state, for metrics."""
+        return {
+            "open": self.is_open,
+            "failures": self.failures,
+            "retry_after": self.retry_after,
+        }
+
+
+@dataclass
+class CoalescingStats:
+    """Counters for how many requests were answered by another identical request."""
+
+    upstream: int = 0
+    """GETs that were actually sent to Discord."""
+
+    coalesced: int = 0
+    """GETs that waited on an identical in-flight GET instead of sending their own."""
+
+
+class AsyncDiscordRequester:
     """
     Sending requests to discord requires some hoops for ratelimits,
     so the majority of the logic is done here. This class is effectively
-    a singleton so instances can be made
+    a singleton so instances can be made.
+
+    All requests go through one long-lived HTTP/2 client, so connections to
+    Discord are kept alive and reused instead of being opened per request.
     """
 
     DISCORD_API_BASE = "https://discord.com/api"
@@ -268,50 +793,195 @@ class DiscordRequester:
     The base of the discord CDN path.
     """
 
-    buckets: ClassVar[list[Bucket]] = []
+    USER_AGENT = "DiscordBot (https://github.com/HackUCF/chris-backend v1.0.0)"
+    """
+    The User-Agent Discord requires bots to send.
+    """
+
+    DEFAULT_TIMEOUT: ClassVar[float] = 30.0
     """
-    All of the current buckets that have been encountered.
+    The default deadline in seconds for a whole call to `request`, including
+    waiting on ratelimits and retrying 429s.
+    """
+
+    CONNECT_TIMEOUT: ClassVar[float] = 5.0
+    """
+    How many seconds to wait for a connection to Discord.
+    """
+
+    buckets: ClassVar[BucketRegistry] = BucketRegistry()
+    """
+    All of the current buckets that have been encountered, indexed by route and hash.
     This is a class attribute, since we should be tracking it
-    even across different threads.
+    even across different tasks.
+    """
+
+    _global_limiter: ClassVar[GlobalRateLimiter] = GlobalRateLimiter()
+    """
+    The global limiter to stay within the global ratelimit.
     """
 
-    _global_lock: ClassVar[GlobalLock] = GlobalLock()
+    _client: ClassVar[httpx.AsyncClient | None] = None
     """
-    The global lock to stay within the global ratelimit.
+    The pooled HTTP client shared by every request. It is created on first use
+    and closed with `aclose` when the application shuts down.
     """
 
+    metrics: ClassVar[RequestMetrics] = RequestMetrics()
+    """
+    Counters and timings for every request sent, see `stats` and `render_metrics`.
+    """
+
+    coalescing: ClassVar[CoalescingStats] = CoalescingStats()
+    """
+    How many GETs shared another request's response. Every coalesced GET is one
+    request that didn't count against a ratelimit.
+    """
+
+    breaker: ClassVar[CircuitBreaker] = CircuitBreaker()
+    """
+    Fails requests fast while Discord is failing, instead of letting them time out.
+    """
+
+    _in_flight: ClassVar[dict[Hashable, tuple[Priority, float, asyncio.Task]]] = {}
+    """
+    The GETs currently being sent, keyed by `_coalescing_key`, with the lane they're
+    waiting in and how many seconds they were given.
+    """
+
+    @classmethod
+    def get_client(cls) -> httpx.AsyncClient:
+        """Get the shared HTTP client, creating it if needed."""
+        if cls._client is None or cls._client.is_closed:
+            cls._client = httpx.AsyncClient(
+                base_url=cls.DISCORD_API_BASE,
+                http2=True,
+                # Every request also gets a deadline, this only bounds each attempt
+                timeout=httpx.Timeout(cls.DEFAULT_TIMEOUT, connect=cls.CONNECT_TIMEOUT),
+                headers={
+                    "Authorization": f"Bot {settings.discord_bot_token}",
+                    "User-Agent": cls.USER_AGENT,
+                },
+                limits=httpx.Limits(
+                    max_connections=50,
+                    max_keepalive_connections=10,
+                    keepalive_expiry=60,
+                ),
+            )
+
+        return cls._client
+
+    @classmethod
+    async def aclose(cls) -> None:
+        """Close the shared HTTP client and its pooled connections."""
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+
+    @classmethod
+    def stats(cls) -> dict:
+        """Every metric, plus the current state of the global limiter and each bucket."""
+        return {
+            **cls.metrics.snapshot(),
+            "coalescing": {
+                "upstream": cls.coalescing.upstream,
+                "coalesced": cls.coalescing.coalesced,
+            },
+            "global": cls._global_limiter.snapshot(),
+            "circuit": cls.breaker.snapshot(),
+            "buckets": [bucket.snapshot() for bucket in cls.buckets],
+        }
+
     @classmethod
-    def get_bucket(cls, route: str):
-        for bucket in cls.buckets:
-            if route in bucket.routes:
-                return bucket
+    def render_metrics(cls) -> list[str]:
+        """Every metric in the Prometheus text format."""
+        buckets = list(cls.buckets)
+        limiter = cls._global_limiter.snapshot()
+
+        return [
+            *cls.metrics.render(),
+            *render_metric(
+                "discord_coalesced_requests_total",
+                "GETs that shared an identical in-flight GET's response.",
+                "counter",
+                cls.coalescing.coalesced,
+            ),
+            *render_metric(
+                "discord_global_tokens",
+                "Requests that can be sent right now under the global limit.",
+                "gauge",
+                limiter["tokens"],
+            ),
+            *render_metric(
+                "discord_global_waiting",
+                "Requests waiting on the global limit.",
+                "gauge",
+                limiter["waiting"],
+            ),
+            *render_metric(
+                "discord_circuit_open",
+                "Whether requests are being refused because Discord is failing.",
+                "gauge",
+                int(cls.breaker.is_open),
+            ),
+            *render_metric(
+                "discord_buckets",
+                "Ratelimit buckets we know about.",
+                "gauge",
+                len(buckets),
+            ),
+            *render_metric(
+                "discord_buckets_cooling_down",
+                "Ratelimit buckets currently on cooldown.",
+                "gauge",
+                sum(
+                    1 for bucket in buckets if bucket.cooldown_until > time.monotonic()
+                ),
+            ),
+            *render_metric(
+                "discord_bucket_waiting",
+                "Requests waiting for a slot in a ratelimit bucket.",
+                "gauge",
+                sum(bucket.snapshot()["waiting"] for bucket in buckets),
+            ),
+        ]
 
-        # If we don't have a bucket for a route, we create a temporary one
-        return Bucket()
+    @classmethod
+    def get_bucket(cls, route: str) -> Bucket:
+        return cls.buckets.get_or_create(route)
 
     @classmethod
     def update_bucket(cls, route: str, headers: Mapping[str, str]) -> Bucket:
-        for bucket in cls.buckets:
-            if route in bucket.routes:
-                # There's an existing bucket we should use
-                bucket.update_from_headers(headers, route)
-                return bucket
-
-        # Otherwise we make a new one
-        bucket = Bucket.from_headers(headers, route)
-        cls.buckets.append(bucket)
-        return bucket
+        return cls.buckets.update(route, headers)
 
     @classmethod
-    def request(
+    def set_process_count(cls, processes: int, rank: int = 0):
+        """
+        Split the global limit and every bucket's limit evenly between `processes`
+        processes sending requests with the same bot token.
+
+        Args:
+            processes (int): How many processes are sending requests.
+            rank (int): This process's place among them, which decides which
+                processes get the remainder of a bucket's limit.
+        """
+        processes = max(processes, 1)
+        cls._global_limiter.set_rate(GlobalRateLimiter.MAX_REQUESTS / processes)
+        cls.buckets.set_share(processes, rank)
+
+    @classmethod
+    async def request(
         cls,
         endpoint: str,
         method: str = "GET",
-        headers={},
+        headers: dict[str, str] | None = None,
         json: dict | None = None,
         params: dict | None = None,
+        priority: Priority = Priority.NORMAL,
+        retry_ratelimits: bool = True,
+        timeout: float | None = DEFAULT_TIMEOUT,
         **kwargs,
-    ):
+    ) -> httpx.Response:
         """
         Make a request to discord.
 
@@ -323,6 +993,12 @@ class DiscordRequester:
                                       User-Agent headers are automatically included on any request.
             json (dict): JSON data to send with the request.
             params (dict): Parameters to send with the request.
+            priority (Priority): The lane to wait in when the request is ratelimited.
+            retry_ratelimits (bool): Whether to wait out a 429 and retry. If this is False,
+                                     a `DiscordRateLimitError` is raised instead.
+            timeout (float | None): The most seconds the whole call may take, including
+                                    waiting on ratelimits and retries. If it runs out, a
+                                    `DiscordUnavailableError` is raised. None means no deadline.
 
             kwargs: The parameters to format the endpoint with. See the note below
 
@@ -332,13 +1008,146 @@ class DiscordRequester:
             any endpoints for guilds and channels MUST use `guild_id` and `channel_id` in
             keyword arguments. Other data contained in the endpoint is recommended to also
             be passed through keyword arguments for style consistency.
+
+            GETs are coalesced: if an identical GET is already in flight in the same
+            or a faster lane, its response is shared instead of sending another request.
+            Callers must treat the response as read-only.
+
+            While the circuit breaker is open, a `DiscordCircuitOpenError` is raised
+            without sending anything.
         """
 
-        headers_with_auth = {
-            "Authorization": f"Bot {settings.discord_bot_token}",
-            "User-Agent": "DiscordBot (https://github.com/HackUCF/chris-backend v1.0.0)",
-            **headers,
-        }
+        budget = math.inf if timeout is None else timeout
+        deadline = asyncio.get_running_loop().time() + budget
+
+        if method.upper() != "GET":
+            return await cls._send(
+                endpoint,
+                method,
+                headers,
+                json,
+                params,
+                priority,
+                retry_ratelimits,
+                deadline,
+                kwargs,
+            )
+
+        # Identical GETs that are already on their way share one request and response
+        key = cls._coalescing_key(endpoint, headers, params, retry_ratelimits, kwargs)
+        in_flight = cls._in_flight.get(key)
+
+        # A request waiting in a slower lane, or that was given less time than we have,
+        # isn't worth joining, so don't
+        if (
+            in_flight is not None
+            and in_flight[0] <= priority
+            and in_flight[1] >= budget
+        ):
+            cls.coalescing.coalesced += 1
+            task = in_flight[2]
+
+            # A caller giving up shouldn't cancel the request for everyone else,
+            # and one with a shorter deadline than the request it joined keeps to its own
+            try:
+                async with asyncio.timeout_at(None if timeout is None else deadline):
+                    return await asyncio.shield(task)
+            except TimeoutError as e:
+                cls.metrics.deadlines += 1
+                raise DiscordUnavailableError(
+                    "No response from Discord before the deadline"
+                ) from e
+
+        cls.coalescing.upstream += 1
+        task = asyncio.create_task(
+            cls._send(
+                endpoint,
+                method,
+                headers,
+                json,
+                params,
+                priority,
+                retry_ratelimits,
+                deadline,
+                kwargs,
+            )
+        )
+        if in_flight is None:
+            cls._in_flight[key] = (priority, budget, task)
+            task.add_done_callback(lambda _: cls._in_flight.pop(key, None))
+
+        # Every caller could give up on a request, so mark its error as seen
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _coalescing_key(
+        endpoint: str,
+        headers: dict[str, str] | None,
+        params: dict | None,
+        retry_ratelimits: bool,
+        kwargs: dict[str, Any],
+    ) -> Hashable:
+        return (
+            endpoint.format(**kwargs),
+            tuple(sorted((headers or {}).items())),
+            tuple(sorted((params or {}).items())),
+            retry_ratelimits,
+        )
+
+    @classmethod
+    async def _send(
+        cls,
+        endpoint: str,
+        method: str,
+        headers: dict[str, str] | None,
+        json: dict | None,
+        params: dict | None,
+        priority: Priority,
+        retry_ratelimits: bool,
+        deadline: float,
+        kwargs: dict[str, Any],
+    ) -> httpx.Response:
+        """
+        Send a request, giving up at `deadline` (an event loop time, or infinity
+        for no deadline). See `request` for the other arguments.
+        """
+        try:
+            async with asyncio.timeout_at(None if math.isinf(deadline) else deadline):
+                return await cls._send_with_retries(
+                    endpoint,
+                    method,
+                    headers,
+                    json,
+                    params,
+                    priority,
+                    retry_ratelimits,
+                    deadline,
+                    kwargs,
+                )
+        except TimeoutError as e:
+            cls.metrics.deadlines += 1
+            raise DiscordUnavailableError(
+                "No response from Discord before the deadline"
+            ) from e
+
+    @classmethod
+    async def _send_with_retries(
+        cls,
+        endpoint: str,
+        method: str,
+        headers: dict[str, str] | None,
+        json: dict | None,
+        params: dict | None,
+        priority: Priority,
+        retry_ratelimits: bool,
+        deadline: float,
+        kwargs: dict[str, Any],
+    ) -> httpx.Response:
+        """Send a request, waiting out ratelimits. See `_send` for the arguments."""
+        client = cls.get_client()
+        loop = asyncio.get_running_loop()
 
         # We account for "top-level" resources by tacking the ids onto the end of the endpoints.
         # This is why we specifically need `guild_id` and `channel_id` spelled like that
@@ -346,24 +1155,65 @@ class DiscordRequester:
 
         bucket = cls.get_bucket(route)
 
+        metrics = cls.metrics
+
+        attempts = 0
+
         # We keep trying requests until they work
         while True:
+            attempts += 1
+            queued_at = time.monotonic()
+
+            if not cls.breaker.allow():
+                metrics.short_circuited += 1
+                raise DiscordCircuitOpenError(cls.breaker.retry_after)
+
             # Make sure the bucket isn't on cooldown
-            with bucket:
+            async with bucket.slot(priority):
                 # Make sure we're under the global rate limit
-                cls._global_lock.wait()
+                await cls._global_limiter.acquire(priority)
+
+                sent_at = time.monotonic()
+                metrics.queue_wait.observe(sent_at - queued_at)
+                metrics.requests += 1
+                if attempts > 1:
+                    metrics.retries += 1
 
                 # The star of the show, the one we've all been waiting for,
                 # the actual request to discord
-                response = requests.request(
-                    method=method,
-                    url=cls.DISCORD_API_BASE + endpoint.format(**kwargs),
-                    headers=headers_with_auth,
-                    json=json,
-                    params=params,
-                )
-
-                logging.debug(
+                try:
+                    response = await client.request(
+                        method=method,
+                        url=endpoint.format(**kwargs),
+                        headers=headers,
+                        json=json,
+                        params=params,
+                    )
+                except httpx.TransportError as e:
+                    metrics.errors += 1
+                    cls.breaker.record_failure()
+                    raise DiscordUnavailableError(
+                        f"Failed to reach Discord: {e!r}"
+                    ) from e
+                except httpx.HTTPError:
+                    metrics.errors += 1
+                    raise
+                except asyncio.CancelledError:
+                    if loop.time() >= deadline:
+                        # The deadline ran out while Discord was answering, so it's too slow
+                        metrics.errors += 1
+                        cls.breaker.record_failure()
+                    raise
+
+                if response.is_server_error:
+                    cls.breaker.record_failure()
+                else:
+                    cls.breaker.record_success()
+
+                metrics.upstream_latency.observe(time.monotonic() - sent_at)
+                metrics.observe_status(response.status_code)
+
+                logger.debug(
                     f"Requested {endpoint.format(**kwargs)}, received code {response.status_code}"
                 )
 
@@ -375,40 +1225,61 @@ class DiscordRequester:
                     body: dict[str, bool | float | str] = response.json()
 
                     if body.get("global", False):
+                        scope = "global"
                         # We hit a global rate limit (bad)
                         logger.warning(
                             f"A global ratelimit was reached! Locking all requests for {body.get('retry_after')} seconds."
                         )
-                        cls._global_lock.set_reset_time(body.get("retry_after"))  # type: ignore
+                        cls._global_limiter.set_reset_time(body.get("retry_after"))  # type: ignore
 
                     elif body.get("message") == "The resource is being rate limited.":
+                        scope = "resource"
                         # We hit a resource limit
                         logger.warning(
                             f"A resource ratelimit was reached! Locking route `{route}` for {body.get('retry_after')} seconds."
                         )
-                        bucket.lock_for(body.get("retry_after"), block=True)  # type: ignore
+                        bucket.lock_for(body.get("retry_after"))  # type: ignore
+                        metrics.bucket_locks += 1
 
                     else:
+                        scope = "endpoint"
                         # We hit an endpoint ratelimit
                         logger.warning(
                             f"An endpoint ratelimit was reached! Locking route `{route}` (bucket {bucket.hash}) for {body.get('retry_after')} seconds."
                         )
-                        bucket.lock_for(body.get("retry_after"), block=True)  # type: ignore
+                        bucket.lock_for(body.get("retry_after"))  # type: ignore
+                        metrics.bucket_locks += 1
+
+                    metrics.ratelimits[scope] += 1
+
+                    if not retry_ratelimits:
+                        raise DiscordRateLimitError(
+                            float(body.get("retry_after", 0)), scope
+                        )
+
+                    retry_after = float(body.get("retry_after", 0))
+                    if loop.time() + retry_after > deadline:
+                        # Waiting it out would blow the deadline anyway, so give up now
+                        metrics.deadlines += 1
+                        raise DiscordUnavailableError(
+                            f"Ratelimited for {retry_after} seconds, longer than the time left for the request"
+                        )
 
-                    # Retry the request
+                    # Retry the request once the cooldown is over
                     continue
 
                 if bucket.remaining == 0:
                     # We just did the last request before the cooldown,
                     # so we pause future requests until it's ready again.
                     # However, we don't need to wait for it ourselves
-                    logging.info(
+                    logger.info(
                         f"Exhausted the ratelimit for `{route}` (bucket {bucket.hash}, limit {bucket.limit}). Cooling down for {response.headers.get('X-RateLimit-Reset-After')} seconds."
                     )
 
                     bucket.lock_for(
-                        int(response.headers.get("X-RateLimit-Reset-After", 0))
+                        float(response.headers.get("X-RateLimit-Reset-After", 0))
                     )
+                    metrics.bucket_locks += 1
 
                 # We got the data, so we return it
                 return response
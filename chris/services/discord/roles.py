@@ -0,0 +1,189 @@
+"""
+Keeping Discord roles in line with CHRIS.
+
+Each member should have the Discord roles mapped from their CHRIS roles (see
+`settings.discord_role_map`) and their team's role, if it has one. Rather than
+rewriting everyone's roles on a schedule, a member is synced when something
+that affects their roles changes: only the roles that differ are added or
+removed, and roles CHRIS doesn't manage are never touched.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import select
+
+from chris.core.config import settings
+from chris.models.team import Team
+from chris.models.user import User
+from chris.services.jobs import enqueue_unique_job
+
+from .client import get_discord_member, member_cache, set_member_role
+from .members import upsert_guild_members
+from .request import Priority
+
+__all__ = [
+    "SYNC_ROLES_JOB",
+    "RoleChanges",
+    "diff_roles",
+    "enqueue_role_sync",
+    "sync_member_roles",
+]
+
+logger = logging.getLogger("discord")
+
+SYNC_ROLES_JOB = "discord.sync_roles"
+
+
+@dataclass
+class RoleChanges:
+    """The roles that were added to and removed from a member."""
+
+    added: set[str] = field(default_factory=set)
+    removed: set[str] = field(default_factory=set)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed)
+
+
+def diff_roles(
+    current: Iterable[str], desired: Iterable[str], managed: Iterable[str]
+) -> RoleChanges:
+    """
+    Work out the fewest role changes to get a member from `current` to `desired`.
+    Only `managed` roles are ever removed, so roles given by hand are left alone.
+    """
+    current, desired, managed = set(current), set(desired), set(managed)
+
+    return RoleChanges(
+        added=desired - current,
+        removed=(current & managed) - desired,
+    )
+
+
+async def managed_roles(session: AsyncSession) -> set[str]:
+    """Every Discord role CHRIS gives out: the mapped roles and every team's role."""
+    result = await session.execute(
+        select(Team.discord_role_id).where(
+            Team.discord_role_id.is_not(None)  # type: ignore[union-attr]
+        )
+    )
+    team_roles = {role_id for role_id in result.scalars().all() if role_id}
+
+    return set(settings.discord_role_map.values()) | team_roles
+
+
+async def desired_roles(session: AsyncSession, discord_id: str) -> set[str]:
+    """The Discord roles a user should have. Users we don't know shouldn't have any."""
+    result = await session.execute(
+        select(User.roles, Team.discord_role_id)
+        .outerjoin(Team, Team.id == User.team_id)  # type: ignore[arg-type]
+        .where(User.discord_id == discord_id)
+    )
+
+    desired: set[str] = set()
+    for roles, team_role_id in result.all():
+        desired.update(
+            settings.discord_role_map[role]
+            for role in roles or []
+            if role in settings.discord_role_map
+        )
+        if team_role_id:
+            desired.add(team_role_id)
+
+    return desired
+
+
+async def sync_member_roles(
+    session: AsyncSession,
+    guild_id: str,
+    discord_id: str,
+    retry_ratelimits: bool = True,
+    stale_roles: Iterable[str] = (),
+) -> RoleChanges | None:
+    """
+    Bring a member's managed roles in line with CHRIS.
+
+    The member's current roles are fetched from Discord so the diff is exact,
+    and only the roles that differ are changed, at background priority.
+
+    Args:
+        session (AsyncSession): The database session
+        guild_id (str): The id of the server
+        discord_id (str): The id of the user
+        retry_ratelimits (bool): Whether to wait out ratelimits, or raise a `DiscordRateLimitError`
+        stale_roles (Iterable[str]): Roles CHRIS no longer gives out but should still remove,
+                                     e.g. the role of a deleted team
+
+    Returns the changes that were made, or None if the user isn't in the server.
+    """
+    managed = await managed_roles(session) | set(stale_roles)
+    if not managed:
+        # No roles are set up, so there's nothing to sync
+        return RoleChanges()
+
+    desired = await desired_roles(session, discord_id)
+
+    member_cache.invalidate((guild_id, discord_id))
+    member = await get_discord_member(guild_id, discord_id, Priority.BACKGROUND)
+    if member is None:
+        return None
+
+    changes = diff_roles(member.get("roles", []), desired, managed)
+
+    for role_id in sorted(changes.added):
+        await set_member_role(
+            guild_id,
+            discord_id,
+            role_id,
+            add=True,
+            retry_ratelimits=retry_ratelimits,
+        )
+    for role_id in sorted(changes.removed):
+        await set_member_role(
+            guild_id,
+            discord_id,
+            role_id,
+            add=False,
+            retry_ratelimits=retry_ratelimits,
+        )
+
+    if changes:
+        member["roles"] = sorted(
+            (set(member.get("roles", [])) | changes.added) - changes.removed
+        )
+        await upsert_guild_members(session, guild_id, [member])
+        await session.commit()
+
+        logger.info(
+            f"Synced the roles of user `{discord_id}`: added {sorted(changes.added)}, removed {sorted(changes.removed)}"
+        )
+
+    return changes
+
+
+async def enqueue_role_sync(
+    session: AsyncSession,
+    discord_ids: Iterable[str],
+    stale_roles: Iterable[str | None] = (),
+) -> None:
+    """
+    Queue a role sync for each of the given users. Call this after changing
+    anything that affects which Discord roles a user should have.
+
+    Roles that CHRIS stops giving out (a deleted team's role, or a team's old
+    role) must be passed as `stale_roles`, otherwise they'd be left in place.
+    """
+    payload: dict = {"guild_id": settings.discord_server_id}
+
+    stale = sorted({role_id for role_id in stale_roles if role_id})
+    if stale:
+        payload["stale_roles"] = stale
+
+    for discord_id in dict.fromkeys(discord_ids):
+        if discord_id:
+            await enqueue_unique_job(
+                session, SYNC_ROLES_JOB, {**payload, "discord_id": discord_id}
+            )
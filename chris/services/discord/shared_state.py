@@ -0,0 +1,247 @@
+"""
+Ratelimit state shared between processes.
+
+Every uvicorn worker (and every replica) has its own requester, and on their
+own each would spend the whole global limit and learn every bucket the hard
+way. Instead, each process heartbeats into the `discord_worker` table, and the
+global limit and every bucket's limit are split evenly between the processes
+that are alive. A global 429 seen by one process pauses the others too.
+
+The buckets each process learns are saved to the `discord_bucket` table, and
+loaded by the others, so a process that starts or restarts knows the limits and
+which buckets are still cooling down before it sends a single request.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from chris.database.db import get_async_engine
+from chris.models.discord_ratelimit import DiscordBucket, DiscordWorker
+
+from .request import AsyncDiscordRequester
+
+__all__ = [
+    "WORKER_ID",
+    "heartbeat",
+    "load_buckets",
+    "run_ratelimit_sync",
+    "save_buckets",
+]
+
+logger = logging.getLogger("discord")
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+"""Identifies this process in the `discord_worker` table."""
+
+MISSED_HEARTBEATS = 3
+"""How many heartbeats a process can miss before it's assumed to be gone."""
+
+_saved: dict[str, tuple[str, int, int, float]] = {}
+"""The state of each route as we last saved it, so unchanged buckets aren't rewritten."""
+
+
+async def heartbeat(session: AsyncSession, interval_seconds: float) -> int:
+    """
+    Mark this process as alive, forget processes that stopped heartbeating,
+    and split the ratelimits between the rest.
+
+    A global ratelimit any process is waiting out is also applied here.
+
+    Returns how many processes are sending requests.
+    """
+    now = datetime.now(timezone.utc)
+    limiter = AsyncDiscordRequester._global_limiter
+
+    blocked_for = limiter.snapshot()["blocked_for"]
+    blocked_until = now + timedelta(seconds=blocked_for) if blocked_for else None
+
+    statement = insert(DiscordWorker).values(
+        worker_id=WORKER_ID, heartbeat_at=now, global_blocked_until=blocked_until
+    )
+    await session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[DiscordWorker.worker_id],
+            set_={
+                "heartbeat_at": statement.excluded.heartbeat_at,
+                "global_blocked_until": statement.excluded.global_blocked_until,
+            },
+        )
+    )
+    await session.execute(
+        delete(DiscordWorker).where(
+            DiscordWorker.heartbeat_at  # type: ignore[arg-type]
+            < now - timedelta(seconds=interval_seconds * MISSED_HEARTBEATS)
+        )
+    )
+
+    result = await session.execute(
+        select(
+            func.count(),
+            # Every process sees the same workers, so ordering them by id gives
+            # each one a distinct place in the split
+            func.count().filter(DiscordWorker.worker_id < WORKER_ID),  # type: ignore[call-overload]
+            func.max(DiscordWorker.global_blocked_until).filter(  # type: ignore[call-overload]
+                DiscordWorker.worker_id != WORKER_ID
+            ),
+        )
+    )
+    workers, rank, global_blocked_until = result.one()
+    await session.commit()
+
+    AsyncDiscordRequester.set_process_count(workers, rank)
+
+    if global_blocked_until is not None:
+        delta = (global_blocked_until - now).total_seconds()
+        if delta > blocked_for:
+            logger.warning(
+                f"Another process reached a global ratelimit! Locking all requests for {delta:.2f} seconds."
+            )
+            limiter.set_reset_time(delta)
+
+    return workers
+
+
+async def save_buckets(session: AsyncSession) -> int:
+    """
+    Save the buckets that changed since they were last saved.
+
+    When processes disagree about a route, the newest window wins, and within
+    a window the lowest remaining count does.
+
+    Returns how many routes were saved.
+    """
+    rows = []
+    for bucket in AsyncDiscordRequester.buckets:
+        if not bucket.hash:
+            # Temporary buckets for routes we haven't had a response from yet
+            continue
+
+        state = (
+            bucket.hash,
+            bucket.limit,
+            # Our remaining count is only our share of what's left, unless the
+            # limit is too small to split
+            bucket.remaining * bucket.share if bucket.is_split else bucket.remaining,
+            bucket.resets_at,
+        )
+        for route in bucket.routes:
+            if _saved.get(route) != state:
+                rows.append((route, state))
+
+    if not rows:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    statement = insert(DiscordBucket).values(
+        [
+            {
+                "route": route,
+                "bucket_hash": bucket_hash,
+                "limit": limit,
+                "remaining": remaining,
+                "resets_at": resets_at,
+                "updated_at": now,
+            }
+            for route, (bucket_hash, limit, remaining, resets_at) in rows
+        ]
+    )
+    excluded = statement.excluded
+    await session.execute(
+        statement.on_conflict_do_update(
+            index_elements=[DiscordBucket.route],
+            set_={
+                "bucket_hash": excluded.bucket_hash,
+                "limit": excluded.limit,
+                "remaining": case(
+                    (
+                        excluded.resets_at == DiscordBucket.resets_at,
+                        func.least(excluded.remaining, DiscordBucket.remaining),
+                    ),
+                    else_=excluded.remaining,
+                ),
+                "resets_at": excluded.resets_at,
+                "updated_at": excluded.updated_at,
+            },
+            where=excluded.resets_at >= DiscordBucket.resets_at,
+        )
+    )
+    await session.commit()
+
+    _saved.update(rows)
+    return len(rows)
+
+
+async def load_buckets(session: AsyncSession) -> int:
+    """
+    Load the saved buckets of routes this process hasn't sent requests to yet.
+
+    Returns how many routes were learned.
+    """
+    result = await session.execute(select(DiscordBucket))
+
+    loaded = 0
+    for row in result.scalars().all():
+        bucket = AsyncDiscordRequester.buckets.restore(
+            row.route, row.bucket_hash, row.limit, row.remaining, row.resets_at
+        )
+        if bucket is not None:
+            _saved[row.route] = (
+                row.bucket_hash,
+                row.limit,
+                row.remaining,
+                row.resets_at,
+            )
+            loaded += 1
+
+    return loaded
+
+
+async def _remove_worker() -> None:
+    async with AsyncSession(get_async_engine()) as session:
+        await session.execute(
+            delete(DiscordWorker).where(
+                DiscordWorker.worker_id == WORKER_ID  # type: ignore[arg-type]
+            )
+        )
+        await session.commit()
+
+
+async def run_ratelimit_sync(interval_seconds: float) -> None:
+    """
+    Keep this process's ratelimits in line with every other process's, every
+    `interval_seconds`. This is meant to be run as a background task, and
+    takes this process out of the split when it's cancelled.
+    """
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                async with AsyncSession(get_async_engine()) as session:
+                    workers = await heartbeat(session, interval_seconds)
+                    loaded = await load_buckets(session)
+                    await save_buckets(session)
+
+                if loaded:
+                    logger.info(
+                        f"Loaded {loaded} ratelimit buckets, sharing the limits between {workers} processes"
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Failed to sync the shared ratelimit state")
+
+            await asyncio.sleep(max(interval_seconds - (time.monotonic() - started), 0))
+    finally:
+        try:
+            await asyncio.shield(_remove_worker())
+        except Exception:
+            logger.exception("Failed to remove this process from the ratelimit split")
@@ -0,0 +1,134 @@
+"""
+Discord side effects that run on the job queue instead of inside request handlers.
+"""
+
+import logging
+from typing import Any
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from chris.services.jobs import JobFailed, RetryLater, job_handler
+
+from .avatars import AVATAR_REFRESH_BATCH_SIZE, refresh_avatars
+from .client import add_user_to_server
+from .members import sync_guild_members, upsert_guild_members
+from .request import DiscordCircuitOpenError, DiscordRateLimitError, Priority
+from .roles import SYNC_ROLES_JOB, sync_member_roles
+
+__all__ = [
+    "JOIN_GUILD_JOB",
+    "REFRESH_AVATARS_JOB",
+    "SYNC_MEMBERS_JOB",
+]
+
+logger = logging.getLogger("discord")
+
+JOIN_GUILD_JOB = "discord.join_guild"
+REFRESH_AVATARS_JOB = "discord.refresh_avatars"
+SYNC_MEMBERS_JOB = "discord.sync_members"
+
+
+@job_handler(JOIN_GUILD_JOB)
+async def join_guild(session: AsyncSession, payload: dict[str, Any]) -> dict:
+    """
+    Join a user to a server with their OAuth access token.
+
+    Payload:
+        server_id (str): The id of the server
+        user_id (str): The id of the user to join
+        access_token (str): The user's OAuth access token
+        roles (list[str]): Role ids to give the user on joining
+    """
+    try:
+        member = await add_user_to_server(
+            server_id=payload["server_id"],
+            user_id=payload["user_id"],
+            access_token=payload["access_token"],
+            roles=payload.get("roles"),
+            priority=Priority.NORMAL,
+            retry_ratelimits=False,
+        )
+    except (DiscordRateLimitError, DiscordCircuitOpenError) as e:
+        raise RetryLater(e.retry_after) from e
+    except httpx.HTTPStatusError as e:
+        # Discord won't change its mind about a 4xx, e.g. an expired access
+        # token, so don't retry it. Server errors are retried as usual
+        if e.response.is_client_error:
+            raise JobFailed(
+                f"Discord refused to join user `{payload['user_id']}` "
+                f"with status {e.response.status_code}"
+            ) from e
+        raise
+
+    if member is not None:
+        await upsert_guild_members(session, payload["server_id"], [member])
+        await session.commit()
+
+    return {"joined": member is not None}
+
+
+@job_handler(REFRESH_AVATARS_JOB)
+async def refresh_all_avatars(session: AsyncSession, payload: dict[str, Any]) -> dict:
+    """Refresh stored avatar urls, batch by batch, until none are stale."""
+    total = 0
+
+    while True:
+        refreshed = await refresh_avatars(session, AVATAR_REFRESH_BATCH_SIZE)
+        total += refreshed
+
+        if refreshed < AVATAR_REFRESH_BATCH_SIZE:
+            break
+
+    if total:
+        logger.info(f"Refreshed the avatars of {total} users")
+
+    return {"refreshed": total}
+
+
+@job_handler(SYNC_MEMBERS_JOB)
+async def sync_members(session: AsyncSession, payload: dict[str, Any]) -> dict:
+    """
+    Sync the local member table of a server.
+
+    Payload:
+        guild_id (str): The id of the server
+    """
+    count = await sync_guild_members(session, payload["guild_id"])
+
+    if count is not None:
+        logger.info(f"Synced {count} members of server `{payload['guild_id']}`")
+
+    return {"members": count}
+
+
+@job_handler(SYNC_ROLES_JOB)
+async def sync_roles(session: AsyncSession, payload: dict[str, Any]) -> dict:
+    """
+    Sync a member's Discord roles with their CHRIS roles and team.
+
+    Payload:
+        guild_id (str): The id of the server
+        discord_id (str): The id of the user
+        stale_roles (list[str]): Roles that are no longer given out but should be removed
+    """
+    try:
+        changes = await sync_member_roles(
+            session,
+            payload["guild_id"],
+            payload["discord_id"],
+            retry_ratelimits=False,
+            stale_roles=payload.get("stale_roles", []),
+        )
+    except (DiscordRateLimitError, DiscordCircuitOpenError) as e:
+        # Whatever was already changed is picked up by the diff on the next run
+        raise RetryLater(e.retry_after) from e
+
+    if changes is None:
+        return {"member": False}
+
+    return {
+        "member": True,
+        "added": sorted(changes.added),
+        "removed": sorted(changes.removed),
+    }
@@ -0,0 +1,356 @@
+"""
+A job queue stored in Postgres.
+
+Work that talks to Discord (joining the server, refreshing avatars, syncing
+members) can be slow or ratelimited, so instead of doing it inside a request
+handler it is written to the `job` table and picked up by workers running in
+the background. Jobs survive restarts, are claimed with `FOR UPDATE SKIP LOCKED`
+so any number of workers (and processes) can share the table, and are retried
+with a backoff when they fail.
+"""
+
+import asyncio
+import base64
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from functools import cache
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from chris.core.config import settings
+from chris.database.db import get_async_engine
+from chris.models.job import Job, JobStatus
+
+if TYPE_CHECKING:
+    from cryptography.fernet import Fernet
+
+logger = logging.getLogger("jobs")
+
+JobHandler = Callable[[AsyncSession, dict[str, Any]], Awaitable[dict[str, Any] | None]]
+
+JOB_HANDLERS: dict[str, JobHandler] = {}
+"""Every kind of job the workers know how to run."""
+
+JOB_LEASE = timedelta(minutes=10)
+"""How long a job can be running before it's assumed its worker died."""
+
+BACKOFF_BASE = 5.0
+"""The delay in seconds before the first retry. Each retry after that waits twice as long."""
+
+BACKOFF_MAX = 60 * 60.0
+"""The longest delay in seconds between retries."""
+
+SECRET_PAYLOAD_KEYS = ("access_token",)
+"""
+Payload keys that hold secrets. Their values are encrypted in the table for as
+long as the job is queued or being retried, and removed once it's done.
+"""
+
+_wakeup = asyncio.Event()
+"""Set when a job is enqueued so local workers don't wait out their poll interval."""
+
+
+class RetryLater(Exception):
+    """
+    Raised by a job handler to run the job again later without counting it as
+    a failed attempt, e.g. when Discord tells us to back off.
+    """
+
+    delay: float
+    """How many seconds to wait before running the job again."""
+
+    def __init__(self, delay: float) -> None:
+        super().__init__(f"Retry in {delay} seconds")
+        self.delay = delay
+
+
+@cache
+def _payload_cipher() -> "Fernet":
+    """
+    The cipher for secrets in payloads. Its key is derived from the JWT secret,
+    so there's no other key to manage, but changing the JWT secret leaves the
+    secrets in queued jobs unreadable and those jobs fail.
+    """
+    from cryptography.fernet import Fernet
+
+    key = hashlib.sha256(f"chris-job-payload:{settings.jwt_secret_key}".encode())
+    return Fernet(base64.urlsafe_b64encode(key.digest()))
+
+
+def _encrypt_secrets(payload: dict[str, Any]) -> dict[str, Any]:
+    return {
+        key: (
+            _payload_cipher().encrypt(value.encode()).decode()
+            if key in SECRET_PAYLOAD_KEYS
+            else value
+        )
+        for key, value in payload.items()
+    }
+
+
+def _decrypt_secrets(payload: dict[str, Any]) -> dict[str, Any]:
+    return {
+        key: (
+            _payload_cipher().decrypt(value.encode()).decode()
+            if key in SECRET_PAYLOAD_KEYS
+            else value
+        )
+        for key, value in payload.items()
+    }
+
+
+class JobFailed(Exception):
+    """
+    Raised by a job handler to fail the job straight away, for failures that
+    retrying won't fix, e.g. Discord rejecting a user's access token.
+    """
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    """
+    Register a function as the handler for a kind of job.
+
+    The handler is given a session and the job's payload, and may return a
+    JSON-able dict that is stored as the job's result.
+    """
+
+    def decorator(func: JobHandler) -> JobHandler:
+        JOB_HANDLERS[kind] = func
+        return func
+
+    return decorator
+
+
+async def enqueue_job(
+    session: AsyncSession,
+    kind: str,
+    payload: dict[str, Any] | None = None,
+    *,
+    user_id: int | None = None,
+    run_at: datetime | None = None,
+    max_attempts: int = 5,
+) -> Job:
+    """
+    Add a job to the queue and commit it. Values under `SECRET_PAYLOAD_KEYS`
+    are encrypted, and handlers are given them decrypted.
+
+    Args:
+        session (AsyncSession): The session to write the job with
+        kind (str): Which handler runs the job
+        payload (dict): The arguments for the handler
+        user_id (int): The user the job was started for, if any. They can see its status
+        run_at (datetime): The earliest time to run the job. Defaults to now
+        max_attempts (int): How many times to try the job before giving up
+    """
+    job = Job(
+        kind=kind,
+        payload=_encrypt_secrets(payload or {}),
+        user_id=user_id,
+        run_at=run_at or datetime.now(timezone.utc),
+        max_attempts=max_attempts,
+    )
+    session.add(job)
+    await session.commit()
+
+    _wakeup.set()
+    return job
+
+
+async def enqueue_unique_job(
+    session: AsyncSession,
+    kind: str,
+    payload: dict[str, Any] | None = None,
+    **kwargs,
+) -> Job:
+    """
+    Add a job to the queue unless a job of the same kind and payload is
+    already waiting to run, in which case that job is returned instead.
+    Either way the session is committed, like `enqueue_job` does.
+
+    Encrypted secrets never compare equal, so jobs with them aren't deduplicated.
+    """
+    existing = await session.scalar(
+        select(Job)
+        .where(
+            Job.kind == kind,  # type: ignore[arg-type]
+            Job.status == JobStatus.QUEUED.value,  # type: ignore[arg-type]
+            Job.payload == (payload or {}),  # type: ignore[arg-type]
+        )
+        .limit(1)
+    )
+    if existing is not None:
+        # Callers rely on this to commit whatever they changed before queuing
+        await session.commit()
+        return existing
+
+    return await enqueue_job(session, kind, payload, **kwargs)
+
+
+async def claim_job(session: AsyncSession) -> Job | None:
+    """
+    Claim the next job that is due and mark it as running.
+
+    Jobs that have been running for longer than `JOB_LEASE` are claimed again,
+    since the worker that had them most likely died.
+    """
+    now = datetime.now(timezone.utc)
+
+    due = (
+        select(Job.id)  # type: ignore[call-overload]
+        .where(
+            or_(
+                and_(
+                    Job.status == JobStatus.QUEUED.value,  # type: ignore[arg-type]
+                    Job.run_at <= now,  # type: ignore[arg-type]
+                ),
+                and_(
+                    Job.status == JobStatus.RUNNING.value,  # type: ignore[arg-type]
+                    Job.locked_at < now - JOB_LEASE,  # type: ignore[operator, arg-type]
+                ),
+            )
+        )
+        .order_by(Job.run_at)  # type: ignore[arg-type]
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+
+    job = await session.scalar(
+        update(Job)
+        .where(Job.id == due)  # type: ignore[arg-type]
+        .values(
+            status=JobStatus.RUNNING.value,
+            locked_at=now,
+            attempts=Job.attempts + 1,
+            updated_at=now,
+        )
+        .returning(Job)
+    )
+    await session.commit()
+
+    return job
+
+
+def _backoff(attempts: int) -> float:
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+async def _reset(session: AsyncSession, job: Job) -> None:
+    # Throw away whatever the handler left behind and reload the claimed job
+    await session.rollback()
+    await session.refresh(job)
+
+
+def _finish(job: Job, status: JobStatus, now: datetime) -> None:
+    job.status = status.value
+    job.locked_at = None
+    job.updated_at = now
+    job.payload = {
+        key: value
+        for key, value in job.payload.items()
+        if key not in SECRET_PAYLOAD_KEYS
+    }
+
+
+async def run_job(session: AsyncSession, job: Job) -> None:
+    """Run a claimed job and record how it went."""
+    handler = JOB_HANDLERS.get(job.kind)
+
+    try:
+        if handler is None:
+            raise LookupError(f"No handler for jobs of kind `{job.kind}`")
+
+        result = await handler(session, _decrypt_secrets(job.payload))
+
+    except asyncio.CancelledError:
+        raise
+
+    except RetryLater as e:
+        # Waiting on Discord isn't the job's fault, so the attempt doesn't count
+        await _reset(session, job)
+        now = datetime.now(timezone.utc)
+        job.status = JobStatus.QUEUED.value
+        job.attempts -= 1
+        job.run_at = now + timedelta(seconds=e.delay)
+        job.locked_at = None
+        job.updated_at = now
+        logger.info(f"Job {job.id} ({job.kind}) will be retried in {e.delay} seconds")
+
+    except Exception as e:
+        await _reset(session, job)
+        now = datetime.now(timezone.utc)
+        job.last_error = f"{type(e).__name__}: {e}"
+
+        if isinstance(e, JobFailed):
+            _finish(job, JobStatus.FAILED, now)
+            logger.error(f"Job {job.id} ({job.kind}) failed: {job.last_error}")
+        elif job.attempts >= job.max_attempts:
+            _finish(job, JobStatus.FAILED, now)
+            logger.exception(
+                f"Job {job.id} ({job.kind}) failed after {job.attempts} attempts"
+            )
+        else:
+            delay = _backoff(job.attempts)
+            job.status = JobStatus.QUEUED.value
+            job.run_at = now + timedelta(seconds=delay)
+            job.locked_at = None
+            job.updated_at = now
+            logger.warning(
+                f"Job {job.id} ({job.kind}) failed on attempt {job.attempts}, retrying in {delay} seconds: {job.last_error}"
+            )
+
+    else:
+        _finish(job, JobStatus.SUCCEEDED, datetime.now(timezone.utc))
+        job.result = result
+        job.last_error = None
+
+    session.add(job)
+    await session.commit()
+
+
+async def run_job_worker(poll_seconds: float = 1.0) -> None:
+    """
+    Claim and run jobs forever. This is meant to be run as a background task
+    for the lifetime of the application, and several can run side by side.
+    """
+    while True:
+        try:
+            async with AsyncSession(
+                get_async_engine(), expire_on_commit=False
+            ) as session:
+                job = await claim_job(session)
+                if job is not None:
+                    await run_job(session, job)
+                    continue
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("The job worker hit an error")
+
+        _wakeup.clear()
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=poll_seconds)
+        except TimeoutError:
+            pass
+
+
+async def run_periodic_job(
+    kind: str, payload: dict[str, Any], interval_minutes: float
+) -> None:
+    """
+    Enqueue a job every `interval_minutes`, unless the last one is still waiting
+    to run. This is meant to be run as a background task.
+    """
+    while True:
+        try:
+            async with AsyncSession(get_async_engine()) as session:
+                await enqueue_unique_job(session, kind, payload, max_attempts=1)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Failed to schedule a `{kind}` job")
+
+        await asyncio.sleep(interval_minutes * 60)
@@ -0,0 +1,171 @@
+"""
+Finishing a login once Keycloak redirects the user back.
+
+The code exchange has to come first, but saving the user and checking whether
+they're in the Discord server only need the claims it returns, so those two
+run at the same time. Each stage has its own timeout and is timed, so a slow
+login can be traced to the stage that held it up.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator
+
+from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from chris.auth.schemas import UserInfo
+from chris.auth.services import AuthService
+from chris.core.config import settings
+from chris.database.db import get_async_engine
+from chris.models.user import User
+from chris.services.discord import is_guild_member
+from chris.services.discord.metrics import Histogram
+from chris.services.discord.request import DiscordUnavailableError
+from chris.services.user import get_or_create_user
+
+logger = logging.getLogger("auth")
+
+EXCHANGE_TIMEOUT = 10.0
+"""The most seconds to wait on Keycloak for the code exchange."""
+
+SAVE_USER_TIMEOUT = 5.0
+"""The most seconds to wait on the database to save the user."""
+
+MEMBERSHIP_CHECK_TIMEOUT = 3.0
+"""The most seconds a login waits to check if the user is in the server."""
+
+LOGIN_STAGES = ("exchange", "save_user", "membership")
+
+stage_durations = {stage: Histogram() for stage in LOGIN_STAGES}
+"""How long each stage of every login took, in seconds."""
+
+
+@dataclass
+class LoginResult:
+    """Everything the callback needs to finish a login."""
+
+    access_token: str
+    """The CHRIS JWT to set as the auth cookie."""
+
+    expires_in: int
+    """Seconds until the access token expires."""
+
+    user: User
+    """The user, as saved in the database."""
+
+    in_server: bool
+    """Whether the user is in the Discord server, or is assumed to be if Discord couldn't be asked."""
+
+    timings: dict[str, float] = field(default_factory=dict)
+    """How many seconds each stage took."""
+
+    def server_timing(self) -> str:
+        """The timings as a `Server-Timing` header, in milliseconds."""
+        return ", ".join(
+            f"{stage};dur={seconds * 1000:.1f}"
+            for stage, seconds in self.timings.items()
+        )
+
+
+@asynccontextmanager
+async def _stage(
+    name: str, timeout: float, timings: dict[str, float]
+) -> AsyncIterator[None]:
+    """Run a stage with a timeout, recording how long it took even if it failed."""
+    started = time.perf_counter()
+    try:
+        async with asyncio.timeout(timeout):
+            yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timings[name] = elapsed
+        stage_durations[name].observe(elapsed)
+
+
+async def _save_user(
+    session: AsyncSession, user_info: UserInfo, timings: dict[str, float]
+) -> User:
+    async with _stage("save_user", SAVE_USER_TIMEOUT, timings):
+        return await get_or_create_user(session=session, user_info=user_info)
+
+
+async def _check_membership(discord_id: str, timings: dict[str, float]) -> bool:
+    try:
+        # The request's session is busy saving the user, and a session
+        # can't run two statements at once
+        async with (
+            _stage("membership", MEMBERSHIP_CHECK_TIMEOUT, timings),
+            AsyncSession(get_async_engine()) as session,
+        ):
+            return await is_guild_member(
+                session,
+                settings.discord_server_id,
+                discord_id,
+                timeout=MEMBERSHIP_CHECK_TIMEOUT,
+            )
+    except (DiscordUnavailableError, TimeoutError) as e:
+        # Don't hold up logging in while Discord is struggling,
+        # users that aren't in the server can still join later
+        logger.warning(f"Skipping the Discord membership check: {e!r}")
+        return True
+
+
+async def complete_login(
+    code: str, request: Request, session: AsyncSession
+) -> LoginResult:
+    """
+    Exchange an authorization code for the user's claims, then save the user
+    and check if they're in the Discord server at the same time.
+
+    Args:
+        code (str): The authorization code Keycloak redirected back with
+        request (Request): The callback request
+        session (AsyncSession): The request's database session, used to save the user
+    """
+    started = time.perf_counter()
+    timings: dict[str, float] = {}
+
+    async with _stage("exchange", EXCHANGE_TIMEOUT, timings):
+        (
+            access_token,
+            expires_in,
+            user_info,
+        ) = await AuthService.a_authenticate_user(code, request)
+
+    membership = asyncio.create_task(_check_membership(user_info.discord_id, timings))
+    try:
+        user = await _save_user(session, user_info, timings)
+    except BaseException:
+        # The login failed, so there's no one to check the membership of
+        membership.cancel()
+        raise
+
+    in_server = await membership
+
+    elapsed = time.perf_counter() - started
+    logger.debug(
+        f"Logged in `{user_info.username}` in {elapsed * 1000:.0f}ms: {timings}"
+    )
+
+    return LoginResult(
+        access_token=access_token,
+        expires_in=expires_in,
+        user=user,
+        in_server=in_server,
+        timings=timings,
+    )
+
+
+def render_login_metrics() -> list[str]:
+    """The stage timings in the Prometheus text format."""
+    lines = []
+    for stage, histogram in stage_durations.items():
+        lines += histogram.render(
+            f"login_{stage}_seconds", f"Time the {stage} stage of a login took."
+        )
+
+    return lines
@@ -1,4 +1,6 @@
 from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy import exists, literal, null, or_, true, union_all
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
 
@@ -6,8 +8,89 @@ from chris.auth.schemas import UserInfo
 from chris.auth.services import AuthService
 from chris.core.config import settings
 from chris.database.db import get_async_session
+from chris.models.team import Team
 from chris.models.user import User
 from chris.schemas.user import UserUpdate
+from chris.services.discord import enqueue_role_sync
+
+AUTH_SYNCED_FIELDS = ("username", "discord_id", "roles")
+"""The user fields that always follow the auth provider. Users can edit the rest."""
+
+
+def claims_differ(user: User, user_info: UserInfo) -> bool:
+    """Whether the fields synced from the auth provider are out of date on a user."""
+    return (
+        user.username != user_info.username
+        or user.discord_id != user_info.discord_id
+        or user.roles != (user_info.roles or [])
+    )
+
+
+def _upsert_user_statement(user_info: UserInfo):
+    """
+    Insert a user, or update their auth synced fields if they already exist,
+    in one statement. It returns the user, their Discord id and roles from
+    before the statement, and whether anything was written.
+
+    The update only happens if an auth synced field changed. Otherwise the
+    existing row is selected instead, so nothing is written.
+    """
+    table = User.__table__  # type: ignore[attr-defined]
+    new_user = User(
+        sub=user_info.sub,
+        username=user_info.username,
+        discord_id=user_info.discord_id,
+        # Only used if the user is new, but the columns can't be null even
+        # in the rows a conflict turns into an update
+        email=user_info.email or "",
+        name=user_info.name or "",
+        roles=user_info.roles or [],
+    )
+
+    # Every statement in the query sees the table as it was before the insert
+    previous = (
+        select(table.c.discord_id, table.c.roles)
+        .where(table.c.sub == user_info.sub)
+        .cte("previous")
+    )
+
+    statement = insert(User).values(**new_user.model_dump(exclude={"id"}))
+    excluded = statement.excluded
+    upsert = (
+        statement.on_conflict_do_update(
+            index_elements=[User.sub],
+            set_={field: excluded[field] for field in AUTH_SYNCED_FIELDS},
+            where=or_(
+                *(
+                    table.c[field].is_distinct_from(excluded[field])
+                    for field in AUTH_SYNCED_FIELDS
+                )
+            ),
+        )
+        .returning(*table.c)
+        .cte("upsert")
+    )
+
+    query = union_all(
+        select(  # type: ignore[call-overload]
+            upsert,
+            previous.c.discord_id.label("previous_discord_id"),
+            previous.c.roles.label("previous_roles"),
+            literal(True).label("written"),
+        ).outerjoin(previous, true()),
+        select(table, null(), null(), literal(False)).where(
+            table.c.sub == user_info.sub, ~exists(select(upsert.c.id))
+        ),
+    )
+    columns = query.selected_columns
+
+    return (
+        select(  # type: ignore[call-overload]
+            User, columns.previous_discord_id, columns.previous_roles, columns.written
+        )
+        .from_statement(query)
+        .execution_options(populate_existing=True)
+    )
 
 
 async def get_or_create_user(session: AsyncSession, user_info: UserInfo) -> User:
@@ -16,38 +99,57 @@ async def get_or_create_user(session: AsyncSession, user_info: UserInfo) -> User
     If the user exists, it only updates fields that should be synced from auth provider.
     If the user does not exist, it creates a new one.
     This preserves user-editable fields while keeping auth data in sync.
-    """
-    # Select the user based on the immutable Keycloak subject ID.
-    result = await session.execute(select(User).where(User.sub == user_info.sub))
-    user = result.scalar_one_or_none()
-
-    if user:
-        # Only update fields that should always sync from auth provider
-        user.username = user_info.username
-        user.discord_id = user_info.discord_id
-        user.roles = user_info.roles or []
-        # Do NOT overwrite email and name - these can be edited by users
-        # and should persist independently of auth provider data
-    else:
-        # For new users, initialize with auth provider data
-        user = User(
-            sub=user_info.sub,
-            username=user_info.username,
-            discord_id=user_info.discord_id,
-            email=user_info.email,
-            name=user_info.name,
-            roles=user_info.roles or [],
-        )
 
-    session.add(user)
-    await session.commit()
+    This is a single `INSERT ... ON CONFLICT` statement. Two first logins at
+    once can't both insert the user, since the second one updates the first's
+    row. It still locks the user's row and uses up an id even when nothing
+    changed, so it's only for logins and users whose claims are out of date.
+    """
+    statement = _upsert_user_statement(user_info)
+
+    row = (await session.execute(statement)).one_or_none()
+    if row is None:
+        # A login that inserted the user at the same time committed after our
+        # statement started, so the row it wrote wasn't visible to us yet
+        row = (await session.execute(statement)).one()
+
+    user, previous_discord_id, previous_roles, written = row
+    if not written:
+        return user
+
+    # Discord roles follow CHRIS roles, so they need a sync if these change.
+    # A changed Discord account also needs the old account's roles removed
+    role_sync_ids = []
+    if previous_discord_id is None:
+        role_sync_ids = [user.discord_id]
+    elif previous_roles != user.roles or previous_discord_id != user.discord_id:
+        role_sync_ids = [previous_discord_id, user.discord_id]
+
+    if not role_sync_ids:
+        await session.commit()
+        return user
+
+    # Queuing the jobs commits the user with them, which expires the user
+    await enqueue_role_sync(session, role_sync_ids)
     await session.refresh(user)
+
     return user
 
 
 async def get_current_user(
     request: Request, session: AsyncSession = Depends(get_async_session)
 ) -> User:
+    """
+    Get the user the auth cookie belongs to. The user is only written to if
+    their auth provider fields changed, and is loaded once per request.
+
+    Almost every request is from a user who is already in sync, so this is a
+    single SELECT by `sub` unless their claims changed.
+    """
+    current_user: User | None = getattr(request.state, "current_user", None)
+    if current_user is not None:
+        return current_user
+
     token = request.cookies.get(settings.auth_cookie_name)
 
     if not token:
@@ -59,8 +161,13 @@ async def get_current_user(
 
     try:
         user_info = AuthService.verify_token(token)
-        db_user = await get_or_create_user(session, user_info)
 
+        result = await session.execute(select(User).where(User.sub == user_info.sub))
+        db_user = result.scalar_one_or_none()
+        if db_user is None or claims_differ(db_user, user_info):
+            db_user = await get_or_create_user(session, user_info)
+
+        request.state.current_user = db_user
         return db_user
     except HTTPException as e:
         raise HTTPException(
@@ -78,12 +185,21 @@ async def update_user(
     """
     update_data = user_update.model_dump(exclude_unset=True)
 
-    # Normalize team names across the board
+    # Users are linked to their team by id, the name is only kept for display
     if "team_name" in update_data:
-        team_val = update_data["team_name"]
-        if team_val is not None:
-            normalized = team_val.strip()
-            update_data["team_name"] = normalized.lower() if normalized else None
+        team_name = (update_data["team_name"] or "").strip().lower()
+        team = None
+        if team_name:
+            result = await session.execute(select(Team).where(Team.name == team_name))
+            team = result.scalar_one_or_none()
+            if team is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Team '{team_name}' not found",
+                )
+
+        update_data["team_id"] = team.id if team else None
+        update_data["team_name"] = team.name if team else None
 
     for key, value in update_data.items():
         setattr(db_user, key, value)
@@ -92,4 +208,7 @@ async def update_user(
     await session.commit()
     await session.refresh(db_user)
 
+    if "team_name" in update_data:
+        await enqueue_role_sync(session, [db_user.discord_id])
+
     return db_user
@@ -0,0 +1,61 @@
+"""
+Fixtures shared by the tests.
+
+Tests that use the database run against the one the app is configured with,
+through the same environment variables. They're skipped if it isn't configured
+or can't be reached, and everything they write is rolled back.
+"""
+
+from collections.abc import AsyncIterator
+
+import pytest
+from pydantic import ValidationError
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture
+async def db_engine() -> AsyncIterator[AsyncEngine]:
+    """The app's engine, on a database migrated to the latest version."""
+    try:
+        from chris.database.db import get_async_engine
+        from chris.database.migrate import migrate
+    except ValidationError:
+        pytest.skip("The database isn't configured")
+
+    engine = get_async_engine()
+    try:
+        await migrate()
+    except (OSError, DBAPIError) as e:
+        pytest.skip(f"The database can't be reached: {e!r}")
+
+    yield engine
+
+    # Each test has its own event loop, and pooled connections can't be
+    # shared between them
+    await engine.dispose()
+
+
+@pytest.fixture
+async def db_session(db_engine: AsyncEngine) -> AsyncIterator[AsyncSession]:
+    """
+    A session inside a transaction that is rolled back after the test. Commits
+    only release a savepoint, so code under test can commit as usual.
+    """
+    async with db_engine.connect() as connection:
+        transaction = await connection.begin()
+        session = AsyncSession(
+            bind=connection,
+            expire_on_commit=False,
+            join_transaction_mode="create_savepoint",
+        )
+        try:
+            yield session
+        finally:
+            await session.close()
+            await transaction.rollback()
@@ -0,0 +1,208 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Any
+
+import pytest
+from jose import JWTError, jwt
+
+from chris.auth.schemas import UserInfo
+from chris.auth.tokens import HMACTokenVerifier, TokenCache
+
+SECRET = "test-secret"
+
+
+def b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def sign(
+    payload: Any,
+    header: Any = None,
+    secret: str = SECRET,
+    digestmod: Any = hashlib.sha256,
+) -> str:
+    """Build a token by hand, so it can be as broken as a test needs."""
+    if header is None:
+        header = {"alg": "HS256", "typ": "JWT"}
+
+    signing_input = ".".join(
+        b64encode(json.dumps(segment).encode()) for segment in (header, payload)
+    )
+    signature = hmac.new(secret.encode(), signing_input.encode(), digestmod).digest()
+    return f"{signing_input}.{b64encode(signature)}"
+
+
+def claims(**overrides: Any) -> dict[str, Any]:
+    now = int(time.time())
+    return {
+        "sub": "sub",
+        "username": "user",
+        "discord_id": "1",
+        "roles": ["staff"],
+        "iat": now,
+        "exp": now + 3600,
+        "iss": "chris-backend",
+        **overrides,
+    }
+
+
+@pytest.fixture
+def verifier() -> HMACTokenVerifier:
+    return HMACTokenVerifier(SECRET, "HS256")
+
+
+@pytest.mark.parametrize("algorithm", ["HS256", "HS384", "HS512"])
+@pytest.mark.parametrize(
+    "payload",
+    [
+        claims(),
+        claims(nbf=int(time.time()) - 10, email="a@b.c", name="Ünïcode"),
+        claims(exp=time.time() + 60.5, roles=[]),
+    ],
+)
+def test_matches_jose_on_valid_tokens(algorithm: str, payload: dict[str, Any]):
+    token = jwt.encode(payload, SECRET, algorithm=algorithm)
+
+    assert HMACTokenVerifier(SECRET, algorithm).decode(token) == jwt.decode(
+        token, SECRET, algorithms=[algorithm], options={"verify_aud": False}
+    )
+
+
+def test_rejects_a_bad_signature(verifier: HMACTokenVerifier):
+    with pytest.raises(JWTError):
+        verifier.decode(sign(claims(), secret="another-secret"))
+
+    header, payload, signature = sign(claims()).split(".")
+    tampered = b64encode(json.dumps(claims(roles=["admin"])).encode())
+    with pytest.raises(JWTError):
+        verifier.decode(f"{header}.{tampered}.{signature}")
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        {"alg": "HS512", "typ": "JWT"},
+        {"alg": "none", "typ": "JWT"},
+        {"typ": "JWT"},
+        ["HS256"],
+    ],
+)
+def test_rejects_other_algorithms(verifier: HMACTokenVerifier, header: Any):
+    # Correctly signed with our key, so only the header is wrong
+    with pytest.raises(JWTError):
+        verifier.decode(sign(claims(), header=header))
+
+
+def test_rejects_an_unsigned_token(verifier: HMACTokenVerifier):
+    header = b64encode(json.dumps({"alg": "none"}).encode())
+    payload = b64encode(json.dumps(claims()).encode())
+
+    with pytest.raises(JWTError):
+        verifier.decode(f"{header}.{payload}.")
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        "",
+        "abc",
+        "abc.def",
+        "a.b.c.d",
+        sign(claims()) + ".extra",
+        "!!!.???.***",
+    ],
+)
+def test_rejects_malformed_tokens(verifier: HMACTokenVerifier, token: str):
+    with pytest.raises(JWTError):
+        verifier.decode(token)
+
+
+def test_rejects_segments_that_arent_json(verifier: HMACTokenVerifier):
+    header = b64encode(json.dumps({"alg": "HS256"}).encode())
+    for payload in (b64encode(b"not json"), b64encode(b"\xff\xfe"), "a"):
+        signing_input = f"{header}.{payload}"
+        signature = hmac.new(
+            SECRET.encode(), signing_input.encode(), hashlib.sha256
+        ).digest()
+
+        with pytest.raises(JWTError):
+            verifier.decode(f"{signing_input}.{b64encode(signature)}")
+
+    with pytest.raises(JWTError):
+        verifier.decode(sign(["not", "a", "dict"]))
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        claims(exp=int(time.time()) - 1),
+        claims(exp=None),
+        claims(exp="tomorrow"),
+        claims(exp=True),
+        claims(nbf=int(time.time()) + 3600),
+        claims(nbf="yesterday"),
+        claims(nbf=False),
+    ],
+)
+def test_rejects_bad_time_claims(verifier: HMACTokenVerifier, payload: dict):
+    with pytest.raises(JWTError):
+        verifier.decode(sign(payload))
+
+
+def test_requires_an_expiry(verifier: HMACTokenVerifier):
+    payload = claims()
+    del payload["exp"]
+
+    with pytest.raises(JWTError):
+        verifier.decode(sign(payload))
+
+
+def user_info() -> UserInfo:
+    return UserInfo(sub="sub", username="user", discord_id="1", roles=["staff"])
+
+
+def test_cache_returns_a_copy():
+    cache = TokenCache()
+    cache.set("token", user_info(), time.time() + 60)
+
+    cached = cache.get("token")
+    assert cached == user_info()
+
+    assert cached is not None
+    cached.roles.append("admin")
+    assert cache.get("token") == user_info()
+
+
+def test_cache_never_returns_an_expired_token(monkeypatch: pytest.MonkeyPatch):
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+
+    cache = TokenCache()
+    cache.set("token", user_info(), now + 60)
+    assert cache.get("token") is not None
+
+    # Exactly at `exp` the token is no longer valid
+    monkeypatch.setattr(time, "time", lambda: now + 60)
+    assert cache.get("token") is None
+    assert len(cache) == 0
+
+    cache.set("expired", user_info(), now - 1)
+    assert cache.get("expired") is None
+
+
+def test_cache_evicts_the_least_recently_used():
+    cache = TokenCache(maxsize=2)
+    expires_at = time.time() + 60
+
+    cache.set("first", user_info(), expires_at)
+    cache.set("second", user_info(), expires_at)
+    cache.get("first")
+    cache.set("third", user_info(), expires_at)
+
+    assert len(cache) == 2
+    assert cache.get("second") is None
+    assert cache.get("first") is not None
+    assert cache.get("third") is not None
@@ -0,0 +1,100 @@
+import time
+
+import pytest
+from pydantic import ValidationError
+
+try:
+    from chris.services.discord.cache import MISSING, TTLCache
+except ValidationError:
+    pytest.skip("The app isn't configured", allow_module_level=True)
+
+
+class Clock:
+    """A monotonic clock that only moves when told to."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
+
+
+def test_entries_expire_after_their_ttl(clock: Clock):
+    cache: TTLCache[str, str] = TTLCache("test", maxsize=10, ttl=60)
+    cache.set("key", "value")
+
+    clock.now += 59
+    assert cache.get("key") == "value"
+    assert "key" in cache
+
+    clock.now += 1
+    assert cache.get("key") is MISSING
+    assert "key" not in cache
+    assert len(cache) == 0
+    assert cache.stats.expirations == 1
+
+
+def test_none_is_cached_for_the_negative_ttl(clock: Clock):
+    cache: TTLCache[str, str | None] = TTLCache(
+        "test", maxsize=10, ttl=60, negative_ttl=5
+    )
+    cache.set("missing", None)
+    cache.set("longer", None, ttl=30)
+
+    # A cached None is a hit, not a miss
+    assert cache.get("missing", "default") is None
+    assert cache.stats.hits == 1
+
+    clock.now += 5
+    assert cache.get("missing", "default") == "default"
+    assert cache.get("longer", "default") is None
+
+
+def test_least_recently_used_entry_is_evicted(clock: Clock):
+    cache: TTLCache[str, int] = TTLCache("test", maxsize=2, ttl=60)
+    cache.set("first", 1)
+    cache.set("second", 2)
+
+    cache.get("first")
+    cache.set("third", 3)
+
+    assert cache.get("second") is MISSING
+    assert cache.get("first") == 1
+    assert cache.get("third") == 3
+    assert cache.stats.evictions == 1
+
+
+def test_setting_a_key_again_refreshes_it(clock: Clock):
+    cache: TTLCache[str, int] = TTLCache("test", maxsize=2, ttl=60)
+    cache.set("first", 1)
+    cache.set("second", 2)
+
+    clock.now += 50
+    cache.set("first", 10)
+    cache.set("third", 3)
+
+    clock.now += 50
+    assert cache.get("first") == 10
+    assert cache.get("second") is MISSING
+
+
+def test_invalidate_and_clear(clock: Clock):
+    cache: TTLCache[str, int] = TTLCache("test", maxsize=10, ttl=60)
+    cache.set("first", 1)
+    cache.set("second", 2)
+
+    cache.invalidate("first")
+    cache.invalidate("unknown")
+    assert cache.get("first") is MISSING
+    assert cache.get("second") == 2
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats.misses == 1
@@ -0,0 +1,335 @@
+import asyncio
+import time
+
+import pytest
+from pydantic import ValidationError
+
+try:
+    from chris.services.discord.request import (
+        Bucket,
+        BucketRegistry,
+        CircuitBreaker,
+        GlobalRateLimiter,
+        Priority,
+    )
+except ValidationError:
+    pytest.skip("The app isn't configured", allow_module_level=True)
+
+
+def split_bucket(limit: int, share: int, rank: int) -> Bucket:
+    bucket = Bucket("hash", limit, limit, 0)
+    bucket.share = share
+    bucket.rank = rank
+    return bucket
+
+
+@pytest.mark.parametrize(
+    ("limit", "share"), [(5, 1), (5, 2), (10, 3), (7, 7), (50, 4), (3, 3)]
+)
+def test_local_limits_add_up_to_the_limit(limit: int, share: int):
+    local_limits = [
+        split_bucket(limit, share, rank).local_limit for rank in range(share)
+    ]
+
+    assert sum(local_limits) == limit
+    assert max(local_limits) - min(local_limits) <= 1
+    # The remainder goes to the processes ranked first
+    assert local_limits == sorted(local_limits, reverse=True)
+
+
+def test_limit_smaller_than_share_falls_back_to_discords_count():
+    buckets = [split_bucket(2, 5, rank) for rank in range(5)]
+
+    for bucket in buckets:
+        assert not bucket.is_split
+        assert bucket.local_limit == 1
+
+        # What Discord reports is left is what every process counts down
+        bucket.update_from_headers(
+            {"X-RateLimit-Remaining": "1", "X-RateLimit-Reset": "10"}
+        )
+        assert bucket.remaining == 1
+
+
+def test_remaining_from_headers_is_split():
+    first, second = split_bucket(5, 2, 0), split_bucket(5, 2, 1)
+
+    for bucket in (first, second):
+        bucket.update_from_headers(
+            {"X-RateLimit-Remaining": "3", "X-RateLimit-Reset": "10"}
+        )
+
+    assert (first.remaining, second.remaining) == (2, 1)
+
+
+def test_set_share_splits_known_buckets():
+    registry = BucketRegistry()
+    bucket = registry.update(
+        "GET /users/{id}",
+        {
+            "X-RateLimit-Bucket": "hash",
+            "X-RateLimit-Limit": "5",
+            "X-RateLimit-Remaining": "5",
+            "X-RateLimit-Reset": "10",
+        },
+    )
+    assert bucket.local_limit == 5
+
+    registry.set_share(2, rank=1)
+    assert (bucket.share, bucket.rank, bucket.local_limit) == (2, 1, 2)
+
+    # New buckets are split too
+    assert registry.get_or_create("GET /guilds/{id}").share == 2
+
+
+def test_restored_bucket_takes_its_part_of_what_is_left():
+    registry = BucketRegistry()
+    registry.set_share(3, rank=0)
+
+    bucket = registry.restore("GET /users/{id}", "hash", 10, 10, 0)
+
+    assert bucket is not None
+    assert (bucket.local_limit, bucket.remaining) == (4, 4)
+
+
+async def admitted_in_order(
+    acquire, release, priorities: list[Priority]
+) -> list[Priority]:
+    """Queue a waiter for each priority, then let them through one at a time."""
+    order: list[Priority] = []
+
+    async def wait(priority: Priority):
+        await acquire(priority)
+        order.append(priority)
+
+    tasks = [asyncio.create_task(wait(priority)) for priority in priorities]
+    await asyncio.sleep(0)
+
+    for _ in priorities:
+        release()
+        await asyncio.sleep(0.03)
+
+    await asyncio.gather(*tasks)
+    return order
+
+
+@pytest.mark.anyio
+async def test_bucket_keeps_requests_in_flight_under_the_limit():
+    bucket = Bucket("hash", 2, 2, 0)
+
+    await bucket.acquire()
+    await bucket.acquire()
+
+    third = asyncio.create_task(bucket.acquire())
+    await asyncio.sleep(0)
+    assert not third.done()
+
+    # A new window has room, but both slots are still taken
+    bucket.update_from_headers(
+        {"X-RateLimit-Remaining": "2", "X-RateLimit-Reset": "10"}
+    )
+    await asyncio.sleep(0)
+    assert bucket.remaining == 1
+    assert not third.done()
+
+    bucket.release()
+    await asyncio.wait_for(third, 1)
+
+
+@pytest.mark.anyio
+async def test_bucket_lets_the_highest_priority_through_first():
+    bucket = Bucket("hash", 1, 1, 0)
+    await bucket.acquire()
+
+    order = await admitted_in_order(
+        bucket.acquire,
+        bucket.release,
+        [Priority.BACKGROUND, Priority.NORMAL, Priority.INTERACTIVE, Priority.NORMAL],
+    )
+
+    assert order == [
+        Priority.INTERACTIVE,
+        Priority.NORMAL,
+        Priority.NORMAL,
+        Priority.BACKGROUND,
+    ]
+
+
+@pytest.mark.anyio
+async def test_bucket_waits_out_its_cooldown():
+    bucket = Bucket("hash", 3, 3, 0)
+    bucket.lock_for(0.05)
+
+    started = time.monotonic()
+    async with bucket.slot():
+        assert time.monotonic() - started >= 0.04
+
+        # The window reset, so the whole limit is available again
+        assert bucket.remaining == 2
+
+
+@pytest.mark.anyio
+async def test_bucket_lets_one_request_ask_when_out_of_requests():
+    bucket = Bucket("hash", 5, 0, 0)
+
+    await asyncio.wait_for(bucket.acquire(), 1)
+
+    second = asyncio.create_task(bucket.acquire())
+    await asyncio.sleep(0)
+    assert not second.done()
+
+    bucket.update_from_headers(
+        {"X-RateLimit-Remaining": "4", "X-RateLimit-Reset": "10"}
+    )
+    bucket.release()
+    await asyncio.wait_for(second, 1)
+
+
+@pytest.mark.anyio
+async def test_bucket_gets_the_slot_of_a_cancelled_waiter_back():
+    bucket = Bucket("hash", 1, 5, 0)
+    await bucket.acquire()
+
+    waiter = asyncio.create_task(bucket.acquire())
+    await asyncio.sleep(0)
+
+    # The slot is handed to the waiter before it gets to run
+    bucket.release()
+    waiter.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    await asyncio.wait_for(bucket.acquire(), 1)
+    assert bucket.snapshot()["in_flight"] == 1
+
+
+@pytest.mark.anyio
+async def test_global_limiter_bursts_up_to_its_capacity():
+    limiter = GlobalRateLimiter(rate=20, capacity=2)
+
+    started = time.monotonic()
+    await limiter.acquire()
+    await limiter.acquire()
+    assert time.monotonic() - started < 0.02
+
+    # The next token takes 1/20th of a second to refill
+    await limiter.acquire()
+    assert time.monotonic() - started >= 0.04
+
+
+@pytest.mark.anyio
+async def test_global_limiter_waits_out_a_global_ratelimit():
+    limiter = GlobalRateLimiter(rate=1000, capacity=10)
+    limiter.set_reset_time(0.05)
+
+    started = time.monotonic()
+    await limiter.acquire()
+    assert time.monotonic() - started >= 0.04
+
+
+@pytest.mark.anyio
+async def test_global_limiter_lets_the_highest_priority_through_first():
+    limiter = GlobalRateLimiter(rate=50, capacity=1)
+    await limiter.acquire()
+
+    # Tokens refill on their own, so there's nothing to release
+    order = await admitted_in_order(
+        limiter.acquire,
+        lambda: None,
+        [Priority.BACKGROUND, Priority.NORMAL, Priority.INTERACTIVE],
+    )
+
+    assert order == [Priority.INTERACTIVE, Priority.NORMAL, Priority.BACKGROUND]
+
+
+@pytest.mark.anyio
+async def test_global_limiter_gives_back_the_token_of_a_cancelled_waiter():
+    limiter = GlobalRateLimiter(rate=1, capacity=1)
+    await limiter.acquire()
+
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+
+    # The token is handed to the waiter before it gets to run
+    limiter.tokens = 1
+    limiter._dispatch()
+    waiter.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    started = time.monotonic()
+    await limiter.acquire()
+    assert time.monotonic() - started < 0.02
+
+
+class Clock:
+    """A monotonic clock that only moves when told to."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(time, "monotonic", clock)
+    return clock
+
+
+def open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(threshold=3, cooldown=30)
+    for _ in range(3):
+        breaker.record_failure()
+
+    return breaker
+
+
+def test_breaker_opens_after_failures_in_a_row(clock: Clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=30)
+    for _ in range(2):
+        breaker.record_failure()
+        assert breaker.allow()
+
+    # A success in between starts the count over
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.is_open
+    assert not breaker.allow()
+    assert breaker.retry_after == 30
+
+
+def test_breaker_lets_one_trial_through_per_cooldown(clock: Clock):
+    breaker = open_breaker()
+
+    clock.now += 30
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # The trial failed, so wait out another cooldown
+    breaker.record_failure()
+    clock.now += 29
+    assert not breaker.allow()
+
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_breaker_closes_once_a_trial_succeeds(clock: Clock):
+    breaker = open_breaker()
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+
+    assert not breaker.is_open
+    assert breaker.retry_after == 0
+    assert all(breaker.allow() for _ in range(5))
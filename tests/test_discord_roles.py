@@ -0,0 +1,51 @@
+import pytest
+from pydantic import ValidationError
+
+try:
+    from chris.services.discord.roles import RoleChanges, diff_roles
+except ValidationError:
+    pytest.skip("The app isn't configured", allow_module_level=True)
+
+
+def test_adds_missing_and_removes_stale_managed_roles():
+    changes = diff_roles(
+        current=["staff", "team-a"],
+        desired=["staff", "team-b"],
+        managed=["staff", "team-a", "team-b"],
+    )
+
+    assert changes == RoleChanges(added={"team-b"}, removed={"team-a"})
+
+
+def test_leaves_unmanaged_roles_alone():
+    changes = diff_roles(
+        current=["booster", "moderator", "team-a"], desired=[], managed=["team-a"]
+    )
+
+    assert changes == RoleChanges(removed={"team-a"})
+
+
+def test_no_changes_when_roles_match():
+    changes = diff_roles(
+        current=["booster", "staff"], desired=["staff"], managed=["staff", "team-a"]
+    )
+
+    assert not changes
+    assert changes == RoleChanges()
+
+
+def test_desired_roles_are_added_even_if_not_managed():
+    # e.g. a team's role that was only just created
+    changes = diff_roles(current=[], desired=["team-new"], managed=[])
+
+    assert changes == RoleChanges(added={"team-new"})
+
+
+def test_accepts_any_iterables_with_duplicates():
+    changes = diff_roles(
+        current=iter(["team-a", "team-a"]),
+        desired=("team-b", "team-b"),
+        managed={"team-a", "team-b"},
+    )
+
+    assert changes == RoleChanges(added={"team-b"}, removed={"team-a"})
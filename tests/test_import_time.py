@@ -0,0 +1,56 @@
+import subprocess
+import sys
+
+import pytest
+from pydantic import ValidationError
+
+from benchmarks.import_time import parse_import_times, top_level
+
+MODULE = "chris.main"
+
+BUDGET_MS = 2500
+"""
+How long importing the app may take. It takes about 1.4s locally, so this
+leaves room for slower machines while still catching a heavy new import.
+"""
+
+RUNS = 3
+"""How many fresh imports to time. The fastest counts, since the rest is noise."""
+
+
+@pytest.fixture(scope="module")
+def import_times() -> dict[str, int]:
+    """The cumulative import time of every module, from the fastest of `RUNS` imports."""
+    try:
+        import chris.core.config  # noqa: F401
+    except ValidationError:
+        pytest.skip("The app isn't configured")
+
+    runs = []
+    for _ in range(RUNS):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {MODULE}"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        runs.append(parse_import_times(result.stderr))
+
+    return min(runs, key=lambda run: run[MODULE])
+
+
+def test_import_is_within_budget(import_times: dict[str, int]):
+    total = import_times[MODULE] / 1000
+    slowest = sorted(top_level(import_times).items(), key=lambda item: -item[1])[:5]
+
+    assert total <= BUDGET_MS, (
+        f"Importing {MODULE} took {total:.0f}ms, over the {BUDGET_MS}ms budget. "
+        f"Slowest packages: {', '.join(f'{name} {micros / 1000:.0f}ms' for name, micros in slowest)}"
+    )
+
+
+@pytest.mark.parametrize("package", ["keycloak", "psycopg2"])
+def test_import_skips_clients_made_on_first_use(
+    import_times: dict[str, int], package: str
+):
+    assert package not in top_level(import_times)
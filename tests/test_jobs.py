@@ -0,0 +1,37 @@
+import pytest
+from pydantic import ValidationError
+
+try:
+    from chris.services.jobs import (
+        BACKOFF_BASE,
+        BACKOFF_MAX,
+        _backoff,
+        _decrypt_secrets,
+        _encrypt_secrets,
+    )
+except ValidationError:
+    pytest.skip("The app isn't configured", allow_module_level=True)
+
+
+def test_backoff_doubles_with_each_attempt():
+    assert [_backoff(attempts) for attempts in range(1, 5)] == [
+        BACKOFF_BASE,
+        BACKOFF_BASE * 2,
+        BACKOFF_BASE * 4,
+        BACKOFF_BASE * 8,
+    ]
+
+
+def test_backoff_is_capped():
+    assert _backoff(100) == BACKOFF_MAX
+    assert max(_backoff(attempts) for attempts in range(1, 1000)) == BACKOFF_MAX
+
+
+def test_secrets_are_encrypted_in_the_payload():
+    payload = {"discord_id": "1", "access_token": "secret-token"}
+
+    encrypted = _encrypt_secrets(payload)
+    assert encrypted["discord_id"] == "1"
+    assert "secret-token" not in encrypted["access_token"]
+
+    assert _decrypt_secrets(encrypted) == payload
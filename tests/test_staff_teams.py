@@ -0,0 +1,117 @@
+from collections.abc import AsyncIterator
+from uuid import uuid4
+
+import httpx
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+pytestmark = pytest.mark.anyio
+
+
+async def add_teams(session: AsyncSession, count: int, members: int = 3) -> None:
+    """Add teams with a few members each, the first of whom created the team."""
+    from chris.models.team import Team
+    from chris.models.user import User
+
+    for _ in range(count):
+        team = Team(name=f"team-{uuid4().hex}", password_hash="x")
+        session.add(team)
+        await session.flush()
+
+        for i in range(members):
+            user = User(
+                sub=f"{team.name}-{i}",
+                username=f"{team.name}-{i}",
+                discord_id=f"{team.id}{i}",
+                email="",
+                name="",
+                team_id=team.id,
+                team_name=team.name,
+            )
+            session.add(user)
+            await session.flush()
+
+            if team.created_by_id is None:
+                team.created_by_id = user.id
+
+    await session.flush()
+
+
+@pytest.fixture
+async def staff_client(db_session: AsyncSession) -> AsyncIterator[httpx.AsyncClient]:
+    """A client logged in as a staff member, using the test's session."""
+    from chris.database.db import get_async_session
+    from chris.main import app
+    from chris.models.user import User
+    from chris.services.user import get_current_user
+
+    staff = User(
+        sub="staff",
+        username="staff",
+        discord_id="1",
+        email="",
+        name="",
+        roles=["staff"],
+    )
+    db_session.add(staff)
+    await db_session.flush()
+
+    async def session_override() -> AsyncIterator[AsyncSession]:
+        yield db_session
+
+    app.dependency_overrides[get_async_session] = session_override
+    app.dependency_overrides[get_current_user] = lambda: staff
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+    app.dependency_overrides.clear()
+
+
+async def count_team_queries(client: httpx.AsyncClient, engine: AsyncEngine) -> int:
+    """How many statements one request for every team runs."""
+    statements = []
+
+    def record(conn, cursor, statement, *args) -> None:
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        response = await client.get("/staff/teams")
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    return len(statements)
+
+
+async def test_team_roster_queries_dont_grow_with_teams(
+    staff_client: httpx.AsyncClient, db_session: AsyncSession, db_engine: AsyncEngine
+) -> None:
+    await add_teams(db_session, 1)
+    one_team = await count_team_queries(staff_client, db_engine)
+
+    await add_teams(db_session, 19)
+    many_teams = await count_team_queries(staff_client, db_engine)
+
+    assert many_teams == one_team
+
+
+async def test_team_roster_lists_members_and_creator(
+    staff_client: httpx.AsyncClient, db_session: AsyncSession
+) -> None:
+    await add_teams(db_session, 2, members=2)
+
+    response = await staff_client.get("/staff/teams")
+    teams = [team for team in response.json() if team["name"].startswith("team-")]
+
+    assert len(teams) == 2
+    for team in teams:
+        members = team["members"]
+        assert [member["username"] for member in members] == [
+            f"{team['name']}-0",
+            f"{team['name']}-1",
+        ]
+        assert team["created_by"] == members[0]["discord_id"]